@@ -0,0 +1,206 @@
+"""
+Benchmarks de las rutas calientes de STRIKELOG sobre journals sintéticos.
+
+Uso:
+    python benchmarks/run_benchmarks.py                       # 1k / 10k / 100k patas
+    python benchmarks/run_benchmarks.py --sizes 1000 10000 --repeat 5
+    python benchmarks/run_benchmarks.py --json resultados.json
+    python benchmarks/run_benchmarks.py --baseline resultados.json --tolerance 0.25
+
+Cada tamaño se ejecuta en un directorio temporal (el journal real no se toca). Se mide el mejor
+tiempo de `repeat` repeticiones; las cachés de proceso se vacían antes de cada medición "en frío".
+Con --baseline, el proceso termina con código 1 si algún caso es más lento que la referencia en
+más de `tolerance` (fracción).
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic_journal import generate_journal  # noqa: E402
+
+import strikelog.core as sl  # noqa: E402  (synthetic_journal ya añadió la raíz del repo al path)
+from strikelog.core import analytics, campaigns, probability, storage, strategies  # noqa: E402
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+CAMPAIGN_SAMPLE = 200   # IDs consultados en get_campaign_steps
+SAVE_EDITS = 10         # Posiciones cerradas por cada guardado medido
+
+
+def reset_process_caches():
+    """Vacía las cachés de proceso (motor, índice de campañas, KPIs, resúmenes, costo base, POP)."""
+    with storage._JOURNAL_STORES_LOCK:
+        storage._JOURNAL_STORES.clear()
+    campaigns._CAMPAIGN_INDEX_CACHE.update({"ref": None, "key": None, "index": None})
+    for cache in (storage._WHEEL_COST_CACHE, analytics._DASHBOARD_KPI_CACHE, analytics._HISTORY_SUMMARY_CACHE,
+                  analytics._ACTIVE_SUMMARY_CACHE, probability._POP_CACHE):
+        cache.clear()
+
+
+def timed(fn, repeat, setup=None):
+    """Mejor tiempo (s) de fn(setup()) en `repeat` repeticiones; setup no se cronometra."""
+    best = float("inf")
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        fn(arg) if setup else fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def close_some_positions(df, rng):
+    """Cierra SAVE_EDITS posiciones abiertas (mutación típica antes de un guardado)."""
+    df = df.copy()
+    open_idx = df.index[df["Estado"] == "Abierta"]
+    for idx in rng.choice(open_idx, size=min(SAVE_EDITS, len(open_idx)), replace=False):
+        df.at[idx, "Estado"] = "Cerrada"
+        df.at[idx, "FechaCierre"] = pd.Timestamp.now().floor("s")
+        df.at[idx, "CostoCierre"] = 0.0
+    return df
+
+
+def bench_size(n_rows, repeat, seed):
+    results = {}
+    rng = np.random.default_rng(seed)
+    journal = generate_journal(n_rows, seed=seed)
+    journal.to_csv(sl.FILE_NAME, index=False, encoding="utf-8")
+    raw = pd.read_csv(sl.FILE_NAME, encoding="utf-8")
+
+    results["normalize_df"] = timed(sl.JournalManager.normalize_df, repeat, setup=raw.copy)
+
+    # Primer arranque: importa el CSV al motor
+    reset_process_caches()
+    start = time.perf_counter()
+    df = sl.JournalManager.load_data()
+    results["load_data (import CSV)"] = time.perf_counter() - start
+
+    def cold_load():
+        reset_process_caches()
+        sl.JournalManager.load_data()
+    results["load_data (frío)"] = timed(cold_load, repeat)
+    results["load_data (caché de proceso)"] = timed(sl.JournalManager.load_data, repeat)
+    df = sl.JournalManager.load_data()
+
+    ids = df.loc[rng.choice(len(df), size=min(CAMPAIGN_SAMPLE, len(df)), replace=False), "ID"].tolist()
+    def campaign_cold():
+        campaigns._CAMPAIGN_INDEX_CACHE.update({"ref": None, "key": None, "index": None})
+        for trade_id in ids:
+            sl.get_campaign_steps(df, trade_id)
+    results[f"get_campaign_steps x{len(ids)} (con índice)"] = timed(campaign_cold, repeat)
+
+    stocks = [row for _, row in df[df["Estrategia"] == "Long Stock (Asignación)"].iterrows()]
+    def stock_be():
+        storage._WHEEL_COST_CACHE.clear()
+        for row in stocks:
+            sl.JournalManager.calculate_stock_dynamic_be(df, row)
+    results[f"calculate_stock_dynamic_be x{len(stocks)}"] = timed(stock_be, repeat)
+
+    def kpis_cold():
+        analytics._DASHBOARD_KPI_CACHE.clear()
+        sl.compute_dashboard_kpis(df)
+    results["compute_dashboard_kpis (frío)"] = timed(kpis_cold, repeat)
+    results["compute_dashboard_kpis (caché)"] = timed(lambda: sl.compute_dashboard_kpis(df), repeat)
+
+    def history_cold():
+        analytics._HISTORY_SUMMARY_CACHE.clear()
+        sl.history_chain_summaries(df)
+    results["history_chain_summaries (frío)"] = timed(history_cold, repeat)
+
+    def active_cold():
+        analytics._ACTIVE_SUMMARY_CACHE.clear()
+        sl.build_active_chain_summaries(df)
+    results["build_active_chain_summaries (frío)"] = timed(active_cold, repeat)
+
+    open_legs = df[df["Estado"] == "Abierta"]
+    quotes = {
+        ticker: {"spot": float(strikes.median()), "iv": 0.3}
+        for ticker, strikes in pd.to_numeric(open_legs["Strike"], errors="coerce").groupby(open_legs["Ticker"])
+    }
+    open_net = open_legs.groupby("ChainID")["PrimaRecibida"].first()
+    def classify_cold():
+        strategies._SIGNATURE_CACHE.clear()
+        sl.classify_chains(open_legs)
+    results[f"classify_chains x{len(open_net)} cadenas (frío)"] = timed(classify_cold, repeat)
+    results[f"payoff_table x{len(open_net)} cadenas"] = timed(lambda: sl.payoff_table(open_legs, open_net), repeat)
+    def pop_cold():
+        probability._POP_CACHE.clear()
+        sl.portfolio_pop(open_legs, open_net, quotes)
+    results[f"portfolio_pop x{len(open_net)} cadenas (≤{sl.POP_TIME_BUDGET}s)"] = timed(pop_cold, repeat)
+    results[f"portfolio_greeks x{len(open_legs)} patas"] = timed(lambda: sl.portfolio_greeks(open_legs, quotes), repeat)
+    moves = np.linspace(-0.2, 0.2, sl.SCENARIO_PRICE_STEPS)
+    shifts = np.linspace(-0.2, 0.2, sl.SCENARIO_IV_STEPS)
+    results[f"scenario_grid {len(moves)}x{len(shifts)} x{len(open_legs)} patas"] = timed(
+        lambda: sl.scenario_grid(open_legs, moves, shifts, quotes), repeat)
+    store = sl.QuoteStore()
+    marks_provider = sl.FakeMarkProvider({ticker: quote["spot"] for ticker, quote in quotes.items()})
+    results["refresh_marks (proveedor fake)"] = timed(lambda: sl.refresh_marks(open_legs, marks_provider, store), repeat)
+    open_chains = sl.build_active_chain_summaries(df)
+    results[f"mark_to_market x{len(open_chains)} cadenas"] = timed(
+        lambda: sl.mark_to_market(open_legs, open_chains, store, quotes), repeat)
+    expire_all = {chain_id: "OTM" for chain_id in open_chains["ChainID"]}
+    results[f"expire_chains x{len(expire_all)} cadenas"] = timed(
+        lambda: sl.JournalManager.expire_chains(df, expire_all), repeat)
+
+    results[f"save_with_backup ({SAVE_EDITS} cierres)"] = timed(
+        sl.JournalManager.save_with_backup, repeat, setup=lambda: close_some_positions(sl.JournalManager.load_data(), rng)
+    )
+    return len(journal), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de STRIKELOG sobre journals sintéticos.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--backend", choices=["sqlite", "parquet"], default=storage.STORAGE_BACKEND)
+    parser.add_argument("--json", help="Guarda los resultados en este archivo")
+    parser.add_argument("--baseline", help="Resultados previos (--json) con los que comparar")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    storage.STORAGE_BACKEND = args.backend
+
+    report = {}
+    cwd = os.getcwd()
+    for n_rows in args.sizes:
+        with tempfile.TemporaryDirectory(prefix="strikelog_bench_") as workdir:
+            os.chdir(workdir)
+            try:
+                actual, results = bench_size(n_rows, args.repeat, args.seed)
+            finally:
+                os.chdir(cwd)
+                reset_process_caches()
+        report[str(n_rows)] = results
+        print(f"\n== {actual} filas ({args.backend}) ==")
+        for name, seconds in results.items():
+            print(f"  {name:<45} {seconds * 1000:>10.1f} ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"backend": args.backend, "results": report}, f, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = []
+        for size, results in report.items():
+            for name, seconds in results.items():
+                ref = baseline.get(size, {}).get(name)
+                if ref and seconds > ref * (1 + args.tolerance):
+                    regressions.append(f"{size} filas · {name}: {ref * 1000:.1f} → {seconds * 1000:.1f} ms")
+        if regressions:
+            print("\n⚠️ Regresiones respecto a la referencia:")
+            for line in regressions:
+                print("  " + line)
+            sys.exit(1)
+        print("\n✅ Sin regresiones respecto a la referencia.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+Generador de journals sintéticos para los benchmarks de STRIKELOG.
+
+generate_journal(n_rows, seed) construye un DataFrame con las columnas de COLUMNS y las mismas
+convenciones que escribe la app: prima neta y Buying Power consolidados en la pata principal,
+rolls enlazados por ParentID (la posición rolada queda en "Rolada") y campañas de La Rueda
+enlazadas por WheelParentChainID / ParentID / WheelLeg. Mezcla de campañas:
+- Iron Condors y spreads verticales (2-4 patas)
+- cadenas de rolls de profundidad 1..roll_depth (CSP y Put Credit Spread)
+- campañas de La Rueda: PCS asignado, acciones, Covered Calls y spreads defensivos
+- ráfagas 0DTE sobre SPY (varias operaciones abiertas y cerradas el mismo día)
+Con la misma semilla el resultado es idéntico (IDs incluidos).
+"""
+import os
+import sys
+import uuid
+from datetime import date, datetime, time, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from strikelog.core import COLUMNS, SETUPS, get_fee_rate  # noqa: E402
+
+TICKERS = {"SPY": 560.0, "QQQ": 480.0, "IWM": 215.0, "AAPL": 225.0, "MSFT": 420.0, "NVDA": 125.0,
+           "AMD": 150.0, "NFLX": 700.0, "BAC": 42.0, "NU": 13.0, "ONDS": 9.0, "SOFI": 10.0}
+WHEEL_TICKERS = ["NU", "BAC", "SOFI", "ONDS", "AMD"]
+
+# Peso relativo de cada tipo de campaña en la mezcla
+CAMPAIGN_WEIGHTS = {"iron_condor": 0.25, "vertical": 0.20, "roll_chain": 0.20, "wheel": 0.15, "zero_dte": 0.20}
+
+
+class _JournalBuilder:
+    def __init__(self, seed: int, end: date, years: float, open_ratio: float):
+        self.rng = np.random.default_rng(seed)
+        self.end = end
+        self.span_days = int(365 * years)
+        self.open_ratio = open_ratio
+        self.rows = []
+
+    # --- utilidades ---
+    def new_id(self) -> str:
+        return str(uuid.UUID(bytes=self.rng.bytes(16), version=4))
+
+    def open_date(self) -> date:
+        return self.end - timedelta(days=int(self.rng.integers(0, self.span_days)))
+
+    def stamp(self, d: date, hour: int = 16) -> str:
+        return datetime.combine(d, time(hour, int(self.rng.integers(0, 60)))).strftime("%Y-%m-%d %H:%M:%S")
+
+    def strike(self, ticker: str, pct: float) -> float:
+        spot = TICKERS[ticker]
+        step = 5.0 if spot >= 200 else (1.0 if spot >= 20 else 0.5)
+        return round(spot * (1 + pct) / step) * step
+
+    def leg(self, **fields) -> dict:
+        row = {
+            "ID": self.new_id(), "ParentID": pd.NA, "Setup": SETUPS[int(self.rng.integers(0, len(SETUPS)))],
+            "Tags": "", "Delta": 0.0, "PrimaRecibida": 0.0, "CostoCierre": 0.0, "Contratos": 1,
+            "BuyingPower": 0.0, "BreakEven": 0.0, "BreakEven_Upper": 0.0, "POP": 0.0, "Estado": "Abierta",
+            "Notas": "", "FechaCierre": pd.NA, "MaxProfitUSD": 0.0, "ProfitPct": 0.0, "PnL_Capital_Pct": 0.0,
+            "PrecioAccionCierre": 0.0, "PnL_USD_Realizado": 0.0, "Comisiones": 0.0,
+            "EarningsDate": pd.NA, "DividendosDate": pd.NA, "Broker": "IB",
+            "WheelParentChainID": pd.NA, "CostBaseReal": 0.0, "CoveredCallChainID": pd.NA,
+            "CoveredCallPrima": 0.0, "WheelLeg": pd.NA,
+        }
+        row.update(fields)
+        row["Comisiones"] = round(get_fee_rate(row["Broker"], row["Ticker"]) * row["Contratos"], 2)
+        row["UpdatedAt"] = datetime.combine(self.end, time(12)).isoformat()
+        self.rows.append(row)
+        return row
+
+    def close(self, legs, close_day: date, cost: float, estado: str = "Cerrada", credit: bool = True):
+        """Cierra las patas de una posición; el PnL y el coste de cierre van a la pata principal."""
+        main = legs[0]
+        sign = 1 if credit else -1
+        pnl = sign * (main["PrimaRecibida"] - cost) * main["Contratos"] * 100 - sum(l["Comisiones"] for l in legs)
+        for l in legs:
+            l["Estado"] = estado
+            l["FechaCierre"] = self.stamp(close_day)
+        main["CostoCierre"] = round(cost, 2)
+        main["PnL_USD_Realizado"] = round(pnl, 2)
+        if main["MaxProfitUSD"]:
+            main["ProfitPct"] = round(pnl / main["MaxProfitUSD"] * 100, 2)
+        if main["BuyingPower"]:
+            main["PnL_Capital_Pct"] = round(pnl / main["BuyingPower"] * 100, 2)
+
+    def settle(self, legs, opened: date, expiry: date, credit: bool = True):
+        """Cierra la posición si venció; si sigue viva, la deja abierta con probabilidad open_ratio."""
+        if expiry >= self.end and self.rng.random() < self.open_ratio:
+            return
+        last_day = min(expiry, self.end)
+        close_day = opened + timedelta(days=int(self.rng.integers(0, max((last_day - opened).days, 0) + 1)))
+        prima = legs[0]["PrimaRecibida"]
+        cost = prima * float(self.rng.choice([0.0, 0.2, 0.5, 1.0, 1.8, 2.5], p=[0.3, 0.25, 0.2, 0.1, 0.1, 0.05]))
+        self.close(legs, close_day, cost, credit=credit)
+
+    # --- campañas ---
+    def iron_condor(self, ticker=None, opened=None, dte=None):
+        ticker = ticker or str(self.rng.choice(list(TICKERS)[:7]))
+        opened = opened or self.open_date()
+        dte = int(self.rng.integers(14, 60)) if dte is None else dte
+        expiry = opened + timedelta(days=dte)
+        chain, contratos = self.new_id(), int(self.rng.integers(1, 5))
+        width = self.strike(ticker, 0.01) - self.strike(ticker, 0.0) or 1.0
+        sp, sc = self.strike(ticker, -0.04), self.strike(ticker, 0.04)
+        prima = round(float(self.rng.uniform(0.15, 0.45)) * width, 2)
+        common = dict(ChainID=chain, Ticker=ticker, FechaApertura=opened.isoformat(), Expiry=expiry.isoformat(),
+                      Estrategia="Iron Condor", Contratos=contratos)
+        legs = [
+            self.leg(**common, Side="Sell", OptionType="Put", Strike=sp, Delta=-0.16, PrimaRecibida=prima,
+                     BuyingPower=round((width - prima) * contratos * 100, 2), MaxProfitUSD=round(prima * contratos * 100, 2),
+                     BreakEven=sp - prima, BreakEven_Upper=sc + prima, POP=round(float(self.rng.uniform(55, 80)), 1)),
+            self.leg(**common, Side="Buy", OptionType="Put", Strike=sp - width),
+            self.leg(**common, Side="Sell", OptionType="Call", Strike=sc),
+            self.leg(**common, Side="Buy", OptionType="Call", Strike=sc + width),
+        ]
+        self.settle(legs, opened, expiry)
+        return legs
+
+    def vertical(self):
+        ticker = str(self.rng.choice(list(TICKERS)))
+        opened = self.open_date()
+        expiry = opened + timedelta(days=int(self.rng.integers(7, 50)))
+        chain, contratos = self.new_id(), int(self.rng.integers(1, 6))
+        strategy = str(self.rng.choice(["Put Credit Spread", "Call Credit Spread", "Put Debit Spread", "Call Debit Spread"]))
+        opt = "Put" if "Put" in strategy else "Call"
+        credit = "Credit" in strategy
+        width = self.strike(ticker, 0.02) - self.strike(ticker, 0.0) or 1.0
+        short = self.strike(ticker, -0.03 if opt == "Put" else 0.03)
+        long_ = short - width if (opt == "Put") == credit else short + width
+        prima = round(float(self.rng.uniform(0.2, 0.5)) * width, 2)
+        common = dict(ChainID=chain, Ticker=ticker, FechaApertura=opened.isoformat(), Expiry=expiry.isoformat(),
+                      Estrategia=strategy, OptionType=opt, Contratos=contratos)
+        main_side, other_side = ("Sell", "Buy") if credit else ("Buy", "Sell")
+        max_profit = (prima if credit else width - prima) * contratos * 100
+        legs = [
+            self.leg(**common, Side=main_side, Strike=short if credit else long_, PrimaRecibida=prima,
+                     BuyingPower=round((width - prima if credit else prima) * contratos * 100, 2),
+                     MaxProfitUSD=round(max_profit, 2), POP=round(float(self.rng.uniform(40, 75)), 1)),
+            self.leg(**common, Side=other_side, Strike=long_ if credit else short),
+        ]
+        self.settle(legs, opened, expiry, credit=credit)
+        return legs
+
+    def roll_chain(self, depth: int):
+        ticker = str(self.rng.choice(list(TICKERS)))
+        opened = self.open_date() - timedelta(days=21 * depth)
+        strategy = str(self.rng.choice(["CSP (Cash Secured Put)", "Put Credit Spread"]))
+        strike, contratos, parent = self.strike(ticker, -0.05), int(self.rng.integers(1, 4)), None
+        width = self.strike(ticker, 0.02) - self.strike(ticker, 0.0) or 1.0
+        for k in range(depth + 1):
+            expiry = opened + timedelta(days=int(self.rng.integers(21, 45)))
+            chain = self.new_id()
+            prima = round(float(self.rng.uniform(0.01, 0.03)) * TICKERS[ticker], 2)
+            common = dict(ChainID=chain, Ticker=ticker, FechaApertura=opened.isoformat(), Expiry=expiry.isoformat(),
+                          Estrategia=strategy, OptionType="Put", Contratos=contratos)
+            bp = strike * 100 * contratos if strategy.startswith("CSP") else (width - prima) * 100 * contratos
+            legs = [self.leg(**common, Side="Sell", Strike=strike, PrimaRecibida=prima, BuyingPower=round(bp, 2),
+                             MaxProfitUSD=round(prima * contratos * 100, 2), BreakEven=strike - prima,
+                             ParentID=parent["ID"] if parent else pd.NA, Notas=f"Roll {k}" if k else "")]
+            if strategy == "Put Credit Spread":
+                legs.append(self.leg(**common, Side="Buy", Strike=strike - width))
+            if k < depth:
+                roll_day = min(opened + timedelta(days=int(self.rng.integers(5, 21))), self.end)
+                self.close(legs, roll_day, prima * float(self.rng.uniform(1.1, 2.0)), estado="Rolada")
+                opened, parent = roll_day, legs[0]
+                strike = strike - (width if self.rng.random() < 0.6 else 0.0)
+            else:
+                self.settle(legs, opened, expiry)
+
+    def wheel(self):
+        ticker = str(self.rng.choice(WHEEL_TICKERS))
+        opened = self.open_date() - timedelta(days=60)
+        expiry = opened + timedelta(days=int(self.rng.integers(21, 45)))
+        contratos = int(self.rng.integers(1, 4))
+        sp_strike = self.strike(ticker, -0.05)
+        bp_strike = sp_strike - (self.strike(ticker, 0.1) - self.strike(ticker, 0.0) or 1.0)
+        prima = round(float(self.rng.uniform(0.03, 0.06)) * TICKERS[ticker], 2)
+        pcs = self.new_id()
+        common = dict(ChainID=pcs, Ticker=ticker, FechaApertura=opened.isoformat(), Expiry=expiry.isoformat(),
+                      Estrategia="Put Credit Spread", OptionType="Put", Contratos=contratos)
+        sell_put = self.leg(**common, Side="Sell", Strike=sp_strike, PrimaRecibida=prima, WheelLeg="sell_put",
+                            BuyingPower=round((sp_strike - bp_strike - prima) * contratos * 100, 2),
+                            MaxProfitUSD=round(prima * contratos * 100, 2))
+        buy_put = self.leg(**common, Side="Buy", Strike=bp_strike, WheelLeg="buy_put_open", WheelParentChainID=pcs,
+                           PrimaRecibida=round(prima * 0.2, 2))
+        assigned = min(expiry, self.end)
+        sell_put.update(Estado="Asignada", FechaCierre=self.stamp(assigned), PnL_USD_Realizado=0.0)
+        if self.rng.random() < 0.5:
+            self.close([buy_put], assigned + timedelta(days=int(self.rng.integers(0, 10))), buy_put["PrimaRecibida"] * 0.5, credit=False)
+
+        stock_chain = self.new_id()
+        stock = self.leg(ChainID=stock_chain, ParentID=sell_put["ID"], Ticker=ticker, FechaApertura=assigned.isoformat(),
+                         Expiry=pd.NA, Estrategia="Long Stock (Asignación)", Side="Buy", OptionType="Stock",
+                         Strike=sp_strike, Delta=1.0, Contratos=contratos, BuyingPower=sp_strike * contratos * 100,
+                         WheelLeg="long_stock", WheelParentChainID=pcs, CostBaseReal=round(sp_strike - prima, 4),
+                         Notas=f"Acciones por asignación de Put Credit Spread. Costo base: ${sp_strike - prima:.2f}")
+        stock["Comisiones"] = 0.0
+        cc_open = assigned
+        cc_total = 0.0
+        for _ in range(int(self.rng.integers(1, 6))):
+            cc_exp = cc_open + timedelta(days=int(self.rng.integers(7, 35)))
+            cc_prima = round(float(self.rng.uniform(0.01, 0.03)) * TICKERS[ticker], 2)
+            cc = self.leg(ChainID=self.new_id(), ParentID=stock["ID"], Ticker=ticker, FechaApertura=cc_open.isoformat(),
+                          Expiry=cc_exp.isoformat(), Estrategia="CC (Covered Call)", Side="Sell", OptionType="Call",
+                          Strike=self.strike(ticker, 0.05), PrimaRecibida=cc_prima, Contratos=contratos,
+                          MaxProfitUSD=round(cc_prima * contratos * 100, 2), WheelLeg="covered_call",
+                          WheelParentChainID=stock_chain)
+            cc_total += cc_prima * contratos * 100
+            stock["CoveredCallChainID"] = cc["ChainID"]
+            if cc_exp >= self.end:
+                break
+            self.close([cc], cc_exp, 0.0 if self.rng.random() < 0.7 else cc_prima * 1.5)
+            cc_open = cc_exp
+        stock["CoveredCallPrima"] = round(cc_total, 2)
+        if self.rng.random() < 0.4:
+            # Spread defensivo sobre las acciones
+            d_open = assigned + timedelta(days=int(self.rng.integers(1, 20)))
+            d_exp = d_open + timedelta(days=int(self.rng.integers(14, 40)))
+            d_chain = self.new_id()
+            d_common = dict(ChainID=d_chain, Ticker=ticker, FechaApertura=d_open.isoformat(), Expiry=d_exp.isoformat(),
+                            Estrategia="Put Debit Spread", OptionType="Put", Contratos=contratos,
+                            WheelParentChainID=stock_chain)
+            d_prima = round(float(self.rng.uniform(0.01, 0.03)) * TICKERS[ticker], 2)
+            d_legs = [self.leg(**d_common, Side="Buy", Strike=sp_strike, PrimaRecibida=d_prima, ParentID=stock["ID"],
+                               BuyingPower=round(d_prima * contratos * 100, 2)),
+                      self.leg(**d_common, Side="Sell", Strike=bp_strike)]
+            self.settle(d_legs, d_open, d_exp, credit=False)
+
+    def zero_dte_burst(self):
+        day = self.open_date()
+        while day.weekday() >= 5:
+            day -= timedelta(days=1)
+        for _ in range(int(self.rng.integers(3, 9))):
+            legs = self.iron_condor("SPY", opened=day, dte=0) if self.rng.random() < 0.6 else self.vertical_0dte(day)
+            for l in legs:
+                l["Tags"] = "0dte"
+
+    def vertical_0dte(self, day: date):
+        chain = self.new_id()
+        opt = str(self.rng.choice(["Put", "Call"]))
+        short = self.strike("SPY", -0.005 if opt == "Put" else 0.005)
+        width = 1.0
+        prima = round(float(self.rng.uniform(0.15, 0.45)), 2)
+        common = dict(ChainID=chain, Ticker="SPY", FechaApertura=day.isoformat(), Expiry=day.isoformat(),
+                      Estrategia=f"{opt} Credit Spread", OptionType=opt, Contratos=int(self.rng.integers(1, 10)))
+        legs = [self.leg(**common, Side="Sell", Strike=short, PrimaRecibida=prima,
+                         BuyingPower=round((width - prima) * common["Contratos"] * 100, 2),
+                         MaxProfitUSD=round(prima * common["Contratos"] * 100, 2)),
+                self.leg(**common, Side="Buy", Strike=short - width if opt == "Put" else short + width)]
+        self.settle(legs, day, day)
+        return legs
+
+
+def generate_journal(n_rows: int, seed: int = 0, end: date = None, years: float = 3.0,
+                     roll_depth: int = 4, open_ratio: float = 0.3) -> pd.DataFrame:
+    """
+    Journal sintético de ~n_rows patas (se completa la última campaña, así que puede pasarse
+    unas pocas filas). end es la fecha "de hoy" del journal (por defecto, hoy) y las aperturas
+    se reparten en los `years` años anteriores.
+    """
+    builder = _JournalBuilder(seed, end or date.today(), years, open_ratio)
+    kinds = list(CAMPAIGN_WEIGHTS)
+    weights = np.array(list(CAMPAIGN_WEIGHTS.values()))
+    while len(builder.rows) < n_rows:
+        kind = kinds[int(builder.rng.choice(len(kinds), p=weights / weights.sum()))]
+        if kind == "iron_condor":
+            builder.iron_condor()
+        elif kind == "vertical":
+            builder.vertical()
+        elif kind == "roll_chain":
+            builder.roll_chain(int(builder.rng.integers(1, roll_depth + 1)))
+        elif kind == "wheel":
+            builder.wheel()
+        else:
+            builder.zero_dte_burst()
+    return pd.DataFrame(builder.rows).reindex(columns=COLUMNS)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Genera un journal sintético en CSV.")
+    parser.add_argument("rows", type=int, help="Número aproximado de patas")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bitacora_sintetica.csv")
+    args = parser.parse_args()
+    journal = generate_journal(args.rows, seed=args.seed)
+    journal.to_csv(args.out, index=False, encoding="utf-8")
+    print(f"{len(journal)} filas escritas en {args.out}")
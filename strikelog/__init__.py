@@ -0,0 +1 @@
+"""STRIKELOG: bitácora de opciones. La lógica de negocio vive en strikelog.core."""
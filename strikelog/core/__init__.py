@@ -0,0 +1,54 @@
+"""
+Núcleo de STRIKELOG sin dependencias de interfaz: se puede importar desde scripts, tareas
+programadas o benchmarks sin cargar Streamlit ni plotly.
+"""
+from .config import (
+    FILE_NAME, DB_FILE, PARQUET_FILE, STORAGE_BACKEND, BACKUP_DIR, PROFILE_DIR, JOURNAL_SCHEMA_VERSION,
+    WAL_FILE, WAL_ARCHIVE_FILE, WAL_COMPACT_EVERY, WAL_ARCHIVE_MAX_BYTES, WAL_ARCHIVE_SEGMENTS,
+    CALENDAR_CACHE_FILE, CALENDAR_CACHE_TTL_HOURS,
+    CALENDAR_SYNC_WORKERS, CALENDAR_FETCH_TIMEOUT, QUOTES_FILE, RISK_FREE_RATE, DEFAULT_IV,
+    MARKS_DB_FILE, MARKS_DROP_DIR,
+    POP_PATHS, POP_SEED, POP_TIME_BUDGET,
+    BACKUP_RETENTION, COLUMNS, SETUPS, ESTADOS, EXPIRY_ACTIONS, ESTRATEGIAS, SIDES, OPTION_TYPES, DUAL_BE_STRATEGIES,
+    COVERED_STRATEGIES, MULTI_EXPIRY_STRATEGIES, LEG_DEFAULTS, DATE_COLUMNS, NUMERIC_COLUMNS, INT_COLUMNS, INDEXED_COLUMNS,
+    DASHBOARD_COLUMNS, INDICES,
+)
+from .cache import LRUCache, record_cache_event, cache_stats
+from .profiling import RenderProfile, current_profile, render_profile, profile_section, profiled
+from .accounting import (
+    get_fee_rate, CREDIT_STRATEGIES, is_option_expired, detect_strategy_direction,
+    calculate_pnl_metrics, is_time_spread, signed_net_premium, suggest_breakeven, pop_legs, suggest_pop, leg_color_label, detect_strategy_from_legs,
+)
+from .strategies import STRATEGY_RULES, chain_signature, classify_signature, classify_chains
+from .storage import (
+    set_error_handler, report_error, diff_journal_cells, apply_mutations, MutationLog, BackupStore,
+    get_backup_store, SQLiteJournal, journal_arrow_schema, ParquetJournal, get_journal_store,
+    WHEEL_COST_CACHE_SIZE, JournalManager,
+)
+from .campaigns import CampaignIndex, get_campaign_index, get_campaign_steps, get_roll_history
+from .analytics import (
+    DASHBOARD_KPI_CACHE_SIZE, filter_dashboard_view, compute_dashboard_kpis,
+    HISTORY_SUMMARY_CACHE_SIZE, HISTORY_PAGE_SIZES, HISTORY_SORT_OPTIONS, CHAIN_SUMMARY_COLUMNS,
+    filter_history_rows, build_chain_summaries, history_chain_summaries, filter_chain_summaries,
+    sort_chain_summaries, paginate_frame, chain_summary_kpis, chain_summaries_export,
+    ACTIVE_SUMMARY_CACHE_SIZE, summarize_active_chain, resolve_chain_breakevens, build_active_chain_summaries,
+    ACTIVE_RISK_CACHE_SIZE, active_portfolio_greeks, active_mark_to_market, active_portfolio_pop,
+)
+from .calendars import (
+    YahooCalendarProvider, StaticCalendarProvider, set_calendar_provider, get_calendar_provider,
+    CalendarCache, fetch_calendars,
+)
+from .statements import (
+    STATEMENT_ACTIONS, parse_option_symbol, iter_statement_fills, pair_statement_fills,
+)
+from .pricing import (
+    norm_cdf, norm_pdf, black_scholes, years_to_expiry, LocalQuoteSource, StaticQuoteSource,
+    set_quote_source, get_quote_source, GREEK_COLUMNS, leg_greeks, portfolio_greeks,
+    SCENARIO_PRICE_STEPS, SCENARIO_IV_STEPS, SCENARIO_WORST_COLUMNS, scenario_grid,
+)
+from .payoff import PAYOFF_GRID_POINTS, PAYOFF_COLUMNS, payoff_table, payoff_profile
+from .probability import POP_COLUMNS, simulate_terminal_prices, pop_table, portfolio_pop
+from .marks import (
+    MARK_KEY, MTM_COLUMNS, QuoteStore, get_quote_store, YahooMarkProvider, CsvDropMarkProvider, FakeMarkProvider,
+    set_mark_provider, get_mark_provider, refresh_marks, mark_to_market, mark_to_market_totals,
+)
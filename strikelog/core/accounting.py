@@ -0,0 +1,220 @@
+"""Contabilidad de opciones: comisiones, dirección crédito/débito, PnL, Break Even, POP y detección de estrategia por patas."""
+import pandas as pd
+from datetime import date, datetime
+
+from .config import COVERED_STRATEGIES, DEFAULT_IV, INDICES, MULTI_EXPIRY_STRATEGIES
+from .payoff import payoff_profile
+from .probability import pop_table
+from .strategies import _leg_tuple, chain_signature, classify_signature
+
+def get_fee_rate(broker: str, ticker: str) -> float:
+    """
+    Retorna la comisión por contrato según el broker y el subyacente (ticker).
+    Tradier cobra comisiones ($0.65) solo para índices.
+    IB cobra $0.65 para todo.
+    """
+    if not isinstance(ticker, str):
+        ticker = str(ticker)
+    if broker == "Tradier":
+        return 0.65 if ticker.upper() in INDICES else 0.0
+    return 0.65
+
+
+# Estrategias cuya prima neta es un CRÉDITO recibido (estrategias vendedoras / neutrales)
+CREDIT_STRATEGIES = [
+    "CSP (Cash Secured Put)", "CC (Covered Call)", "Collar",
+    "Put Credit Spread", "Call Credit Spread",
+    "Iron Condor", "Iron Fly",
+    "Strangle", "Straddle",
+    "Ratio Spread",
+]
+def is_option_expired(expiry_val) -> bool:
+    """
+    Determina si una opción ha vencido, considerando la zona horaria de Nueva York
+    y el cierre del mercado americano (16:00 EST/EDT).
+    """
+    if pd.isna(expiry_val):
+        return False
+    try:
+        from zoneinfo import ZoneInfo
+        ny_tz = ZoneInfo("America/New_York")
+        ny_now = datetime.now(ny_tz)
+        expiry_date = pd.to_datetime(expiry_val).date()
+        if expiry_date < ny_now.date():
+            return True
+        elif expiry_date == ny_now.date():
+            return ny_now.hour >= 16
+        else:
+            return False
+    except Exception:
+        return (pd.to_datetime(expiry_val).date() - date.today()).days < 0
+
+def detect_strategy_direction(strategy, side_first_leg="Sell"):
+    """
+    Detecta si una estrategia opera en CRÉDITO (Sell) o DÉBITO (Buy).
+    Devuelve 'Sell' para crédito, 'Buy' para débito.
+    """
+    if strategy in CREDIT_STRATEGIES:
+        return "Sell"
+    # Para estrategias dual/ambiguas, usar la dirección de la primera pata
+    if strategy in ["Custom / Other", "Calendar", "Diagonal"]:
+        return side_first_leg
+    return "Buy"
+
+def calculate_pnl_metrics(prima_neta, costo_cierre_neto, contracts, strategy, bp=0.0, side_first_leg="Sell", comisiones_totales=0.0):
+    """
+    Calcula métricas de PnL de forma estandarizada.
+    
+    TODOS los precios son POR ACCIÓN (ej: 1.50, NO 150).
+    Para multi-pata (Iron Condor, Spreads, etc.), tanto prima_neta como 
+    costo_cierre_neto representan el NETO de todas las patas combinadas.
+    
+    Args:
+        prima_neta: Prima neta recibida/pagada por acción (valor del contrato)
+        costo_cierre_neto: Costo neto para cerrar por acción
+        contracts: Número de contratos
+        strategy: Nombre de la estrategia (para detectar crédito/débito)
+        bp: Buying Power reservado (para calcular RoC)
+        side_first_leg: Side de la primera pata (fallback para estrategias ambiguas)
+        comisiones_totales: Total de comisiones a restar del PnL
+    
+    Returns:
+        (pnl_usd, profit_pct, pnl_capital_pct)
+    """
+    direction = detect_strategy_direction(strategy, side_first_leg)
+    
+    if direction == "Sell":
+        # Crédito: ganas si el costo de cierre es menor que la prima cobrada
+        pnl_usd = (prima_neta - costo_cierre_neto) * contracts * 100 - comisiones_totales
+        profit_pct = ((prima_neta - costo_cierre_neto) / prima_neta * 100) if prima_neta > 0 else 0.0
+    else:
+        # Débito: ganas si el precio de cierre es mayor que lo que pagaste
+        pnl_usd = (costo_cierre_neto - prima_neta) * contracts * 100 - comisiones_totales
+        profit_pct = ((costo_cierre_neto - prima_neta) / prima_neta * 100) if prima_neta > 0 else 0.0
+        
+    pnl_capital_pct = (pnl_usd / bp * 100) if bp > 0 else 0.0
+    return pnl_usd, profit_pct, pnl_capital_pct
+
+def is_time_spread(strategy, legs_data) -> bool:
+    """
+    Calendar / Diagonal / Flyagonal, o cualquier combinación en la que una pata comprada vence
+    después que una vendida: la pata larga vale más, así que la prima siempre se paga (débito)
+    aunque la primera pata del formulario sea la vendida.
+    """
+    if strategy in MULTI_EXPIRY_STRATEGIES:
+        return True
+    sold, bought = [], []
+    for leg in legs_data or []:
+        if (leg.get("OptionType") or leg.get("Type")) == "Stock":
+            continue
+        expiry = pd.to_datetime(leg.get("Expiry"), errors="coerce")
+        if pd.notna(expiry):
+            (sold if leg.get("Side") == "Sell" else bought).append(expiry)
+    return bool(sold and bought) and max(bought) > min(sold)
+
+def signed_net_premium(strategy, legs_data, total_premium) -> float:
+    """
+    Prima neta por acción con signo para el payoff: + crédito, − débito (según la dirección).
+    Los time spreads (is_time_spread) son siempre débito.
+    """
+    if is_time_spread(strategy, legs_data):
+        return -abs(float(total_premium))
+    side_first_leg = legs_data[0].get("Side", "Sell") if legs_data else "Sell"
+    if detect_strategy_direction(strategy, side_first_leg) == "Sell":
+        return float(total_premium)
+    return -abs(float(total_premium))
+
+def suggest_breakeven(strategy, legs_data, total_premium):
+    """
+    Calcula Break Even(s) con el motor de payoff (payoff_table) sobre las patas reales,
+    sin fórmulas por estrategia. Devuelve una tupla (be_lower, be_upper).
+    - Con un solo BE: be_upper será 0.0
+    - Con dos o más (IC, Iron Fly, Butterfly, Strangle, Calendar...): el menor y el mayor
+
+    total_premium es la prima neta por acción; su signo sigue la dirección de la estrategia
+    (crédito / débito), como en calculate_pnl_metrics, salvo en los time spreads (Calendar,
+    Diagonal...), que siempre son débito. Cada pata puede traer Contratos y
+    Expiry para ratios y vencimientos distintos.
+    """
+    if not legs_data:
+        return (0.0, 0.0)
+    try:
+        breakevens = payoff_profile(legs_data, signed_net_premium(strategy, legs_data, total_premium))["breakevens"]
+    except Exception:
+        return (0.0, 0.0)
+    if not breakevens:
+        return (0.0, 0.0)
+    return (breakevens[0], breakevens[-1] if len(breakevens) >= 2 else 0.0)
+
+def pop_legs(strategy, legs_data, expiry, stock_cost=None):
+    """
+    Patas con las que se simula el POP (vencimiento por defecto = expiry). En las estructuras
+    cubiertas (CC, Collar) las acciones forman parte del payoff: si las patas no las traen se
+    añade una pata Stock con el costo base stock_cost; sin él devuelve None (simular sólo la
+    opción sería una call desnuda).
+    """
+    if not legs_data:
+        return None
+    legs = [{**leg, "Expiry": leg.get("Expiry") or expiry} for leg in legs_data]
+    if strategy in COVERED_STRATEGIES and not any(leg.get("OptionType") == "Stock" for leg in legs):
+        if not stock_cost or stock_cost <= 0:
+            return None
+        calls = [leg for leg in legs if leg.get("OptionType", leg.get("Type")) == "Call"]
+        legs.append({"Side": "Buy", "OptionType": "Stock", "Strike": float(stock_cost), "Expiry": expiry,
+                     "Contratos": (calls or legs)[0].get("Contratos", 1)})
+    return legs
+
+def suggest_pop(delta, side, delta2=0.0, strategy=None, legs_data=None, total_premium=0.0,
+                spot=None, iv=None, expiry=None, stock_cost=None):
+    """
+    Probabilidad de éxito (%) de la operación.
+
+    Con patas, spot y vencimiento se simula por Monte Carlo (pop_table): precios finales
+    lognormales con la IV indicada, puntuados con el payoff real de las patas (pop_legs, que
+    incluye las acciones de un CC / Collar) y la prima neta. Vale para spreads, mariposas,
+    calendars y débitos. Sin esos datos se recurre al atajo por Delta:
+      POP = (1 - |Δ_short|) × 100, o (1 - |Δ_short_put| - |Δ_short_call|) × 100 con dos cortas
+    """
+    legs = pop_legs(strategy, legs_data, expiry, stock_cost) if spot and spot > 0 and expiry is not None else None
+    if legs:
+        try:
+            result = pop_table(legs, signed_net_premium(strategy, legs_data, total_premium), spot,
+                               iv if iv and iv > 0 else DEFAULT_IV)
+            if pd.notna(result["POP"].iloc[0]):
+                return round(float(result["POP"].iloc[0]), 1)
+        except Exception:
+            pass
+    abs_delta = abs(delta)
+    if side == "Sell":
+        if abs(delta2) > 0:
+            # Iron Condor / Strangle: combinar ambas patas cortas
+            pop = (1.0 - abs_delta - abs(delta2)) * 100
+            return round(max(pop, 0.0), 1)   # mínimo 0%
+        return round((1.0 - abs_delta) * 100, 1)
+    else:
+        return round(abs_delta * 100, 1)
+
+def leg_color_label(side, option_type):
+    """Genera una etiqueta HTML coloreada para identificar visualmente cada pata."""
+    if side == "Sell":
+        bg = "#e74c3c"
+        border = "#c0392b"
+    else:
+        bg = "#27ae60"
+        border = "#1e8449"
+    return (
+        f"<span style='background:{bg}; color:white; padding:4px 12px; "
+        f"border-radius:6px; font-size:13px; font-weight:700; "
+        f"border:1px solid {border}; letter-spacing:0.5px;'"
+        f">{side} {option_type}</span>"
+    )
+
+def detect_strategy_from_legs(legs):
+    """
+    Detecta la estrategia de opción según la configuración de las patas (list de dicts).
+    Cada dict tiene 'Side', 'Type' o 'OptionType', 'Strike' y opcionalmente 'Contratos' y 'Expiry'.
+    Cualquier número de patas y vencimientos: la forma se busca en la tabla de strategies.py.
+    """
+    if not legs:
+        return None
+    return classify_signature(*chain_signature([_leg_tuple(leg) for leg in legs]))
@@ -0,0 +1,581 @@
+"""Agregados de las vistas: KPIs del Cuadro de Mando, resúmenes del Historial y de la Cartera Activa."""
+import pandas as pd
+import numpy as np
+from datetime import date, timedelta
+
+from .config import COVERED_STRATEGIES, DUAL_BE_STRATEGIES
+from .cache import LRUCache
+from .profiling import profiled
+from .accounting import is_time_spread
+from .strategies import classify_chains
+from .payoff import payoff_table
+from .pricing import get_quote_source, portfolio_greeks
+from .probability import portfolio_pop
+from .marks import get_quote_store, mark_to_market
+from .storage import JournalManager
+from .campaigns import get_campaign_index
+
+# Caché de KPIs del Cuadro de Mando (clave: versión de datos + estado de los filtros)
+DASHBOARD_KPI_CACHE_SIZE = 64
+_DASHBOARD_KPI_CACHE = LRUCache(DASHBOARD_KPI_CACHE_SIZE, name="KPIs del dashboard")
+
+
+def filter_dashboard_view(df, ticker="Todos Tickers", periodo="Todos", setup="Todos los Setups",
+                          estado="Todos", filtro_0dte="Todos", excluir=()):
+    """
+    Aplica los filtros del Cuadro de Mando. periodo es el valor resuelto del selector:
+    "Todos", "today", "week", "YYYY-MM" o "YYYY". Añade la columna __is_0dte.
+    """
+    df_view = df.copy()
+    df_view["__is_0dte"] = (
+        pd.to_datetime(df_view["Expiry"], errors="coerce").dt.date ==
+        pd.to_datetime(df_view["FechaApertura"], errors="coerce").dt.date
+    )
+    mask = pd.Series(True, index=df_view.index)
+    if ticker != "Todos Tickers":
+        mask &= df_view["Ticker"] == ticker
+    if periodo != "Todos":
+        apertura = pd.to_datetime(df_view["FechaApertura"], errors="coerce")
+        if periodo == "today":
+            mask &= apertura.dt.date == date.today()
+        elif periodo == "week":
+            week_start = date.today() - timedelta(days=date.today().weekday())  # Lunes
+            mask &= apertura.dt.date >= week_start
+        else:
+            fmt = "%Y-%m" if len(periodo) == 7 else "%Y"
+            mask &= apertura.dt.strftime(fmt) == periodo
+    if setup != "Todos los Setups":
+        mask &= df_view["Setup"] == setup
+    if estado != "Todos":
+        mask &= df_view["Estado"] == estado
+    if filtro_0dte == "⚡ Solo 0DTE":
+        mask &= df_view["__is_0dte"]
+    elif filtro_0dte == "🚫 Sin 0DTE":
+        mask &= ~df_view["__is_0dte"]
+    if excluir:
+        mask &= ~df_view["Ticker"].isin(list(excluir))
+    return df_view[mask.fillna(False).astype(bool)]
+
+
+def _current_streak(pnl_desc: np.ndarray):
+    """Racha actual (n, 'win'/'loss') sobre PnLs ordenados del más reciente al más antiguo, ignorando ceros."""
+    signs = np.sign(pnl_desc[pnl_desc != 0])
+    if len(signs) == 0:
+        return 0, None
+    breaks = np.flatnonzero(signs != signs[0])
+    streak = int(breaks[0]) if len(breaks) else len(signs)
+    return streak, ("win" if signs[0] > 0 else "loss")
+
+
+@profiled("KPIs del dashboard")
+def compute_dashboard_kpis(df, ticker="Todos Tickers", periodo="Todos", setup="Todos los Setups",
+                           estado="Todos", filtro_0dte="Todos", excluir=()) -> dict:
+    """
+    Paquete de KPIs del Cuadro de Mando para un estado de filtros: métricas de alto nivel,
+    drawdown, racha, resumen de cartera activa y agregados para los gráficos.
+    Memoizado (LRU) por versión de datos + filtros; los DataFrames devueltos son de sólo lectura.
+    """
+    excluir = tuple(sorted(excluir))
+    key = (JournalManager.data_version(), len(df), ticker, periodo, setup, estado, filtro_0dte, excluir, date.today())
+    cached = _DASHBOARD_KPI_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    df_view = filter_dashboard_view(df, ticker, periodo, setup, estado, filtro_0dte, excluir)
+    closed_trades = df_view[df_view["Estado"].isin(["Cerrada", "Rolada", "Asignada"])].copy()
+    open_trades = df_view[df_view["Estado"] == "Abierta"]
+
+    pnl = closed_trades["PnL_USD_Realizado"]
+    wins_pnl = pnl[pnl > 0]
+    losses_pnl = pnl[pnl < 0]
+    wins, losses = len(wins_pnl), len(losses_pnl)
+    total_closed = wins + losses
+    win_rate = (wins / total_closed * 100) if total_closed > 0 else 0.0
+
+    total_won = wins_pnl.sum() if wins else 0.0
+    total_lost = abs(losses_pnl.sum()) if losses else 0.0
+    profit_factor = (total_won / total_lost) if total_lost > 0 else (total_won if total_won > 0 else 0.0)
+    pnl_total = pnl.sum() if not closed_trades.empty else 0.0
+    total_comisiones = df_view["Comisiones"].sum() if "Comisiones" in df_view.columns else 0.0
+
+    avg_win = wins_pnl.mean() if wins else 0.0
+    avg_loss = abs(losses_pnl.mean()) if losses else 0.0
+    win_prob = win_rate / 100.0
+    expectancy_trade = (win_prob * avg_win) - ((1.0 - win_prob) * avg_loss) if total_closed > 0 else 0.0
+
+    # Prima pendiente de las patas vendidas abiertas
+    if not open_trades.empty:
+        sell_open = open_trades[open_trades["Side"] == "Sell"]
+        open_primas_pending = float(
+            (sell_open["PrimaRecibida"].fillna(0.0) * sell_open["Contratos"].replace(0, 1).fillna(1.0) * 100).sum()
+        )
+    else:
+        open_primas_pending = 0.0
+
+    # Curva de equidad, drawdown y racha sobre los cierres ordenados
+    equity_df = pd.DataFrame(columns=["FechaCierre", "Equity"])
+    monthly_pnl = pd.DataFrame(columns=["Mes", "PnL_USD_Realizado"])
+    max_dd, streak, streak_type = 0.0, 0, None
+    if not closed_trades.empty:
+        sorted_closed = closed_trades.sort_values("FechaCierre")
+        equity_series = sorted_closed["PnL_USD_Realizado"].cumsum()
+        max_dd = (equity_series.cummax() - equity_series).max()
+        streak, streak_type = _current_streak(
+            closed_trades.sort_values("FechaCierre", ascending=False)["PnL_USD_Realizado"].to_numpy(dtype=float)
+        )
+        equity_df = pd.DataFrame({
+            "FechaCierre": pd.to_datetime(sorted_closed["FechaCierre"]),
+            "Equity": equity_series,
+        })
+        closed_trades["Mes"] = pd.to_datetime(closed_trades["FechaCierre"]).dt.strftime('%b %Y')
+        monthly_pnl = closed_trades.groupby("Mes")["PnL_USD_Realizado"].sum().reset_index()
+
+    strat_data = (
+        df_view.groupby("Estrategia")["PnL_USD_Realizado"].sum().reset_index()
+        .sort_values("PnL_USD_Realizado", ascending=True)
+    )
+    setup_data = (
+        closed_trades.groupby("Setup")["PnL_USD_Realizado"].sum().reset_index()
+        .sort_values("PnL_USD_Realizado", ascending=True)
+    )
+
+    kpis = {
+        "n_rows": len(df_view),
+        "pnl_total": pnl_total,
+        "total_comisiones": total_comisiones,
+        "pnl_neto": pnl_total - total_comisiones,
+        "win_rate": win_rate,
+        "profit_factor": profit_factor,
+        "capture_eff": closed_trades.loc[pnl > 0, "ProfitPct"].mean() if wins else 0.0,
+        "expectancy_trade": expectancy_trade,
+        "max_dd": max_dd,
+        "streak": streak,
+        "streak_type": streak_type,
+        "comisiones_0dte": df_view.loc[df_view["__is_0dte"] == True, "Comisiones"].sum(),
+        "avg_profit": pnl.mean() if not closed_trades.empty else 0,
+        "best_ticker": closed_trades.groupby("Ticker")["PnL_USD_Realizado"].sum().idxmax() if not closed_trades.empty else "-",
+        "open_positions_count": open_trades["ChainID"].nunique() if not open_trades.empty else 0,
+        "open_primas_pending": open_primas_pending,
+        "open_bp_total": open_trades["BuyingPower"].sum() if not open_trades.empty else 0.0,
+        "equity_df": equity_df,
+        "monthly_pnl": monthly_pnl,
+        "strat_data": strat_data,
+        "setup_data": setup_data,
+    }
+    return _DASHBOARD_KPI_CACHE.put(key, kpis)
+
+
+# Caché de resúmenes por cadena del Historial (clave: versión de datos + filtros por fila)
+HISTORY_SUMMARY_CACHE_SIZE = 32
+_HISTORY_SUMMARY_CACHE = LRUCache(HISTORY_SUMMARY_CACHE_SIZE, name="Resúmenes del historial")
+
+# Paginación y orden de la lista del Historial
+HISTORY_PAGE_SIZES = [10, 25, 50, 100]
+HISTORY_SORT_OPTIONS = {
+    "📅 Fecha de cierre": "__dt_sort",
+    "💵 PnL": "PnL_Total",
+    "📊 % Captura": "ProfitPct",
+    "⏳ Días en trade": "DIT",
+}
+
+CHAIN_SUMMARY_COLUMNS = [
+    "ChainID", "Ticker", "Estrategia", "Estado", "FechaCierre", "__dt_sort", "Expiry", "PnL_Total",
+    "ProfitPct", "Prima_Neta", "Contratos", "DIT", "Setup", "Tags", "StrikesStr", "StrikesShort", "_legs",
+]
+
+
+def filter_history_rows(df, ticker="Todos", estrategia="Todos", setup="Todos", estado="Todos", tags="",
+                        filtro_0dte="Todos", excluir=(), date_range=None) -> pd.DataFrame:
+    """Filas cerradas del Historial con los filtros por fila aplicados (añade __dt_sort y __is_0dte)."""
+    hist_df = df[df["Estado"] != "Abierta"].copy()
+    hist_df["__dt_sort"] = pd.to_datetime(hist_df["FechaCierre"], errors='coerce')
+    hist_df["__is_0dte"] = (
+        pd.to_datetime(hist_df["Expiry"], errors="coerce").dt.date ==
+        pd.to_datetime(hist_df["FechaApertura"], errors="coerce").dt.date
+    )
+    mask = pd.Series(True, index=hist_df.index)
+    if ticker != "Todos":      mask &= hist_df["Ticker"] == ticker
+    if setup != "Todos":       mask &= hist_df["Setup"] == setup
+    if estrategia != "Todos":  mask &= hist_df["Estrategia"] == estrategia
+    if estado != "Todos":      mask &= hist_df["Estado"] == estado
+    if tags.strip():
+        mask &= hist_df["Tags"].fillna("").str.contains(tags.strip(), case=False, na=False)
+    if filtro_0dte == "⚡ Solo 0DTE":
+        mask &= hist_df["__is_0dte"]
+    elif filtro_0dte == "🚫 Sin 0DTE":
+        mask &= ~hist_df["__is_0dte"]
+    if excluir:
+        mask &= ~hist_df["Ticker"].isin(list(excluir))
+    if date_range is not None and len(date_range) == 2:
+        start_ts = pd.Timestamp(date_range[0])
+        end_ts = pd.Timestamp(date_range[1]) + pd.Timedelta(hours=23, minutes=59, seconds=59)
+        in_range = (hist_df["__dt_sort"] >= start_ts) & (hist_df["__dt_sort"] <= end_ts)
+        # Con un ticker concreto se muestran también sus cierres sin fecha
+        mask &= (in_range | hist_df["__dt_sort"].isna()) if ticker != "Todos" else in_range
+    return hist_df[mask.fillna(False).astype(bool)]
+
+
+def build_chain_summaries(hist_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Una fila por ChainID (una operación) con un solo groupby: pata principal (mayor PnL),
+    PnL y prima totales, % de captura, días en trade y strikes resumidos. Ordenado por
+    fecha de cierre descendente (sin fecha al final).
+    """
+    if hist_df.empty:
+        return pd.DataFrame(columns=CHAIN_SUMMARY_COLUMNS)
+    if "__dt_sort" not in hist_df.columns:
+        hist_df = hist_df.assign(__dt_sort=pd.to_datetime(hist_df["FechaCierre"], errors='coerce'))
+
+    # Textos de patas precalculados en bloque (Side/Tipo@Strike y strikes cortos)
+    hist_df = hist_df.reset_index(drop=True)
+    legs = hist_df.assign(
+        __leg=hist_df["Side"].astype(str).str[0] + hist_df["OptionType"].astype(str).str[0] + "@"
+              + hist_df["Strike"].map("{:.0f}".format),
+        __strike=hist_df["Strike"].astype(float).map("{:g}".format),
+    )
+    grouped = legs.groupby("ChainID", sort=True)
+    agg = grouped.agg(
+        PnL_Total=("PnL_USD_Realizado", "sum"),
+        Prima_Neta=("PrimaRecibida", "sum"),
+        MaxProfit=("MaxProfitUSD", "max"),
+        _legs=("ID", "size"),
+        StrikesStr=("__leg", " / ".join),
+        StrikesShort=("__strike", " / ".join),
+    )
+    agg["PnL_Total"] = agg["PnL_Total"].round(2)
+
+    # Pata principal: la de mayor PnL de cada cadena; la primera pata aporta el vencimiento del título
+    main = legs.loc[grouped["PnL_USD_Realizado"].idxmax()].set_index("ChainID")
+    first_expiry = grouped["Expiry"].first()
+
+    out = main[["Ticker", "Estrategia", "Estado", "FechaCierre", "__dt_sort", "Setup", "Tags"]].copy()
+    out["Setup"] = out["Setup"].fillna("")
+    out["Tags"] = out["Tags"].fillna("")
+    out["Contratos"] = main["Contratos"].astype(int)
+    out["Expiry"] = first_expiry
+    out = out.join(agg)
+
+    # % de captura: MaxProfitUSD guardado; si no, prima neta × contratos de la pata principal
+    mp_calc = out["Prima_Neta"] * out["Contratos"] * 100
+    out["ProfitPct"] = np.where(
+        out["MaxProfit"] > 0, out["PnL_Total"] / out["MaxProfit"].where(out["MaxProfit"] > 0) * 100,
+        np.where((out["Prima_Neta"] > 0) & (mp_calc > 0), out["PnL_Total"] / mp_calc.where(mp_calc > 0) * 100, 0.0),
+    )
+
+    # Días en trade (hasta hoy si la pata principal no tiene fecha de cierre)
+    apertura = pd.to_datetime(main["FechaApertura"], errors="coerce").dt.normalize()
+    cierre = pd.to_datetime(main["FechaCierre"], errors="coerce").dt.normalize().fillna(pd.Timestamp(date.today()))
+    out["DIT"] = (cierre - apertura).dt.days.fillna(0).astype(int)
+
+    out = out.reset_index().sort_values("__dt_sort", ascending=False, na_position="last", kind="stable")
+    return out[CHAIN_SUMMARY_COLUMNS].reset_index(drop=True)
+
+
+@profiled("Resúmenes del historial")
+def history_chain_summaries(df, **filters):
+    """
+    Filas filtradas del Historial, su resumen por cadena y las posiciones de las patas de cada
+    cadena ({ChainID: posiciones en las filas}). Memoizado por versión de datos + filtros.
+    """
+    key = (JournalManager.data_version(), len(df),
+           tuple(sorted((k, tuple(v) if isinstance(v, (list, tuple)) else v) for k, v in filters.items())))
+    cached = _HISTORY_SUMMARY_CACHE.get(key)
+    if cached is not None:
+        return cached
+    rows = filter_history_rows(df, **filters)
+    summary = build_chain_summaries(rows)
+    leg_positions = rows.groupby("ChainID").indices if not rows.empty else {}
+    return _HISTORY_SUMMARY_CACHE.put(key, (rows, summary, leg_positions))
+
+
+def filter_chain_summaries(summary: pd.DataFrame, pnl_range=None, resultado="Todos") -> pd.DataFrame:
+    """Filtros sobre el resumen por cadena: rango de PnL y ganadoras / perdedoras."""
+    mask = pd.Series(True, index=summary.index)
+    if pnl_range is not None:
+        pnl = summary["PnL_Total"].round(2)
+        mask &= (pnl >= pnl_range[0]) & (pnl <= pnl_range[1])
+    if resultado == "✅ Ganadoras":
+        mask &= summary["PnL_Total"] >= 0
+    elif resultado == "❌ Perdedoras":
+        mask &= summary["PnL_Total"] < 0
+    return summary[mask]
+
+
+def sort_chain_summaries(summary: pd.DataFrame, by: str = "__dt_sort", ascending: bool = False) -> pd.DataFrame:
+    """Ordena el resumen por cadena (orden estable; sin valor siempre al final)."""
+    return summary.sort_values(by, ascending=ascending, na_position="last", kind="stable")
+
+
+def paginate_frame(df: pd.DataFrame, page: int, page_size: int):
+    """Devuelve (filas de la página, página ajustada a rango, número de páginas); page empieza en 1."""
+    n_pages = max(1, -(-len(df) // page_size))
+    page = min(max(1, int(page)), n_pages)
+    start = (page - 1) * page_size
+    return df.iloc[start:start + page_size], page, n_pages
+
+
+def chain_summary_kpis(summary: pd.DataFrame) -> dict:
+    """KPIs del Historial sobre el resumen por cadena."""
+    total_ops = len(summary)
+    total_pnl = float(summary["PnL_Total"].sum()) if total_ops else 0.0
+    ganadoras = int((summary["PnL_Total"] >= 0).sum())
+    return {
+        "total_ops": total_ops,
+        "total_pnl": total_pnl,
+        "ganadoras": ganadoras,
+        "win_rate": (ganadoras / total_ops * 100) if total_ops > 0 else 0.0,
+        "avg_pnl": total_pnl / total_ops if total_ops > 0 else 0.0,
+    }
+
+
+def chain_summaries_export(summary: pd.DataFrame) -> pd.DataFrame:
+    """Tabla de exportación CSV del Historial a partir del resumen por cadena."""
+    return pd.DataFrame({
+        "Ticker":      summary["Ticker"],
+        "Estrategia":  summary["Estrategia"],
+        "Estado":      summary["Estado"],
+        "FechaCierre": pd.to_datetime(summary["FechaCierre"], errors="coerce").dt.strftime("%Y-%m-%d").fillna(""),
+        "PnL_USD":     summary["PnL_Total"].round(2),
+        "Captura_%":   summary["ProfitPct"].round(2),
+        "Prima_Neta":  summary["Prima_Neta"].round(2),
+        "Contratos":   summary["Contratos"],
+        "DIT":         summary["DIT"],
+        "Setup":       summary["Setup"],
+        "Tags":        summary["Tags"],
+        "Strikes":     summary["StrikesStr"],
+    })
+
+
+# Caché del resumen por cadena de Cartera Activa (clave: versión de datos + día)
+ACTIVE_SUMMARY_CACHE_SIZE = 8
+_ACTIVE_SUMMARY_CACHE = LRUCache(ACTIVE_SUMMARY_CACHE_SIZE, name="Resúmenes de cartera activa")
+
+
+def _campaign_totals(frame: pd.DataFrame, labels: np.ndarray) -> pd.DataFrame:
+    """
+    Crédito neto en $ (vendidas cobran prima y pagan cierre; compradas al revés), PnL realizado
+    y número de pasos (ChainIDs) de cada campaña, con un solo groupby sobre sus etiquetas.
+    """
+    prima = frame["PrimaRecibida"].astype(float).fillna(0.0).to_numpy()
+    cierre = frame["CostoCierre"].astype(float).fillna(0.0).to_numpy()
+    qty = frame["Contratos"].replace(0, 1).astype(float).fillna(1.0).to_numpy()
+    sign = np.where((frame["Side"] == "Sell").to_numpy(), 1.0, -1.0)
+    is_closed = (frame["Estado"] != "Abierta").to_numpy()
+    realized = frame["PnL_USD_Realizado"].astype(float).fillna(0.0).to_numpy()
+    return pd.DataFrame({
+        "net": sign * (prima - np.where(is_closed, cierre, 0.0)) * qty,
+        "realized": np.where(is_closed, realized, 0.0),
+        "ChainID": frame["ChainID"].to_numpy(),
+    }).groupby(labels).agg(net=("net", "sum"), realized=("realized", "sum"), steps=("ChainID", "nunique"))
+
+
+def summarize_active_chain(df, group, resolve_be: bool = True, strategies: pd.Series = None,
+                           campaign_totals: pd.DataFrame = None) -> dict:
+    """
+    Datos de cabecera de una cadena abierta: DTE, DIT, rolls, crédito neto de la campaña
+    (rolls + actual, por contrato activo), PnL realizado y Break Even recalculado. Con
+    resolve_be=False el BE queda pendiente de resolve_chain_breakevens (modo por lotes);
+    strategies (classify_chains de todas las cadenas) evita clasificar la cadena por separado
+    y campaign_totals (_campaign_totals por etiqueta del índice de campañas) recorrer su campaña.
+    """
+    first_row = group.iloc[0]
+    strategy = first_row["Estrategia"]
+    today = date.today()
+    is_stock_position = (first_row.get("OptionType", "") == "Stock")
+
+    expiry = first_row["Expiry"]
+    expiry_dt = pd.to_datetime(expiry).date() if pd.notna(expiry) else today
+    apertura_dt = pd.to_datetime(first_row["FechaApertura"]).date() if pd.notna(first_row["FechaApertura"]) else today
+
+    # Campaña completa (rolls + actual): totales precalculados o, sueltos, sólo las filas de la campaña
+    qty_active = float(first_row.get("Contratos", 1.0) or 1.0)
+    index = get_campaign_index(df)
+    positions = index.positions_of(first_row["ID"])
+    if campaign_totals is not None and len(positions):
+        campaign = index.campaign[positions[0]]
+    else:
+        positions = index.campaign_positions(first_row["ID"])
+        steps = df.iloc[positions] if len(positions) else group
+        campaign_totals = _campaign_totals(steps, np.zeros(len(steps), dtype=np.int64))
+        campaign = 0
+    net_credit_dollars, realized_pnl_chain, num_steps = campaign_totals.loc[campaign, ["net", "realized", "steps"]]
+    net_credit_chain = net_credit_dollars / qty_active if qty_active > 0 else net_credit_dollars
+
+    # Recálculo dinámico del Break Even
+    # Si la estrategia tiene patas activas parciales, detectamos la estrategia real actual
+    legs_for_be = []
+    if not is_stock_position:
+        legs_for_be = [{"Side": side, "Type": opt, "OptionType": opt, "Strike": float(strike)}
+                       for side, opt, strike in zip(group["Side"], group["OptionType"], group["Strike"])]
+        if strategies is None:
+            strategies = classify_chains(group)
+        detected_strat = strategies.get(first_row["ChainID"])
+        effective_strategy = detected_strat if detected_strat else strategy
+    else:
+        effective_strategy = strategy
+
+    # Prima con signo para el motor de payoff / POP: los time spreads (Calendar...) son débito
+    payoff_premium = net_credit_chain
+    if not is_stock_position and is_time_spread(
+            effective_strategy, group[["Side", "OptionType", "Expiry"]].to_dict("records")):
+        payoff_premium = -abs(net_credit_chain)
+
+    is_dual_be = effective_strategy in DUAL_BE_STRATEGIES
+    calculated_be = 0.0
+    calculated_be_upper = 0.0
+
+    # Detectar si es un Covered Call vinculado a La Rueda
+    is_cc_rueda = (
+        effective_strategy == "CC (Covered Call)" and
+        ("la-rueda" in str(first_row.get("Tags", "")) or
+         "covered-call" in str(first_row.get("Tags", "")) or
+         pd.notna(first_row.get("ParentID")))
+    )
+
+    # Long Stock: no tiene lógica de opciones — usar el BE guardado (CostBaseReal)
+    if is_stock_position:
+        calculated_be = float(first_row.get("BreakEven", 0) or 0)
+    elif is_cc_rueda:
+        # CC vinculado a acciones: BE = Strike + prima de ESTA pata únicamente.
+        strike_cc = float(first_row.get("Strike", 0) or 0)
+        calculated_be = strike_cc + abs(float(first_row.get("PrimaRecibida", 0) or 0))
+        legs_for_be = [{"Side": first_row["Side"], "Type": first_row["OptionType"],
+                        "OptionType": first_row["OptionType"], "Strike": strike_cc}]
+    else:
+        # BE guardado como respaldo; el motor de payoff lo sustituye (resolve_chain_breakevens)
+        calculated_be = float(first_row["BreakEven"] or 0)
+        calculated_be_upper = float(first_row.get("BreakEven_Upper", 0) or 0)
+
+    try:
+        exp_str_title = pd.to_datetime(first_row["Expiry"]).strftime("%d %b")
+    except Exception:
+        exp_str_title = ""
+
+    summary = {
+        "ChainID": first_row["ChainID"],
+        "dte": (expiry_dt - today).days,
+        "dit": (today - apertura_dt).days,
+        "is_stock_position": is_stock_position,
+        "num_rolls": int(num_steps) - 1,  # El actual no cuenta como roll
+        "net_credit_chain": float(net_credit_chain),
+        "payoff_premium": float(payoff_premium),
+        "realized_pnl_chain": float(realized_pnl_chain),
+        "qty_active": qty_active,
+        "effective_strategy": effective_strategy,
+        "is_dual_be": is_dual_be,
+        "is_cc_rueda": is_cc_rueda,
+        "calculated_be": calculated_be,
+        "calculated_be_upper": calculated_be_upper,
+        "max_profit": np.nan,
+        "max_loss": np.nan,
+        "legs_for_be": legs_for_be,
+        "exp_str_title": exp_str_title,
+        "strikes_short": " / ".join(f"{float(x):g}" for x in group["Strike"]),
+        "total_bp": group["BuyingPower"].sum(),
+    }
+    if resolve_be:
+        resolve_chain_breakevens([summary], group)
+    return summary
+
+
+def resolve_chain_breakevens(summaries, legs: pd.DataFrame):
+    """
+    Break Evens, beneficio y pérdida máximos de todas las cadenas de opciones de `summaries`
+    en una sola llamada a payoff_table, con el crédito neto de la campaña (con signo; débito en los
+    time spreads) como prima.
+    Si el motor no encuentra ningún BE se conserva el BE guardado en el journal.
+    """
+    pending = {s["ChainID"]: s for s in summaries if not s["is_stock_position"] and not s["is_cc_rueda"]}
+    if not pending:
+        return
+    payoffs = payoff_table(
+        legs[legs["ChainID"].isin(list(pending))],
+        {chain_id: s["payoff_premium"] for chain_id, s in pending.items()},
+    )
+    for chain_id, row in payoffs.iterrows():
+        summary = pending[chain_id]
+        breakevens = row["BreakEvens"]
+        if breakevens:
+            summary["calculated_be"] = row["BE_Lower"]
+            summary["calculated_be_upper"] = row["BE_Upper"]
+        summary["is_dual_be"] = summary["is_dual_be"] or len(breakevens) >= 2
+        summary["max_profit"] = row["MaxProfit"]
+        summary["max_loss"] = row["MaxLoss"]
+
+
+@profiled("Resúmenes de cartera activa")
+def build_active_chain_summaries(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Tabla resumen de las cadenas abiertas (una fila por ChainID, ordenada por DTE) para las
+    cabeceras de Cartera Activa. Memoizada por versión de datos y día; el desglose pesado de
+    cada tarjeta se calcula sólo al abrirla.
+    """
+    key = (JournalManager.data_version(), len(df), date.today())
+    cached = _ACTIVE_SUMMARY_CACHE.get(key)
+    if cached is not None:
+        return cached
+    active_df = df[df["Estado"] == "Abierta"]
+    # Estrategia real de todas las cadenas de opciones en una sola pasada (firmas memoizadas)
+    strategies = classify_chains(active_df[active_df["OptionType"] != "Stock"])
+    # Totales de todas las campañas en una pasada (el desglose paso a paso queda para la tarjeta)
+    totals = _campaign_totals(df, get_campaign_index(df).campaign)
+    rows = [summarize_active_chain(df, group, resolve_be=False, strategies=strategies, campaign_totals=totals)
+            for _, group in active_df.groupby("ChainID")]
+    resolve_chain_breakevens(rows, active_df)
+    table = pd.DataFrame(rows)
+    if not table.empty:
+        table = table.sort_values("dte", kind="stable").reset_index(drop=True)
+    return _ACTIVE_SUMMARY_CACHE.put(key, table)
+
+
+# Caché de griegas / mark-to-market / POP de Cartera Activa (clave: versión de datos + día + cotizaciones)
+ACTIVE_RISK_CACHE_SIZE = 8
+_ACTIVE_RISK_CACHE = LRUCache(ACTIVE_RISK_CACHE_SIZE, name="Riesgo de cartera activa")
+
+
+def _active_risk_key(kind: str, df: pd.DataFrame, active_df: pd.DataFrame) -> tuple:
+    """Clave barata: versión de datos, día, spot / IV de la fuente activa y huella del almacén de marks."""
+    source = get_quote_source()
+    quotes = source.get_quotes(active_df["Ticker"].dropna().unique().tolist())
+    return (kind, JournalManager.data_version(), len(df), date.today(), id(source),
+            repr(sorted(quotes.items())), get_quote_store().storage_token())
+
+
+def active_portfolio_greeks(df: pd.DataFrame):
+    """portfolio_greeks de las patas abiertas, calculado una vez por versión de datos y cotizaciones."""
+    active_df = df[df["Estado"] == "Abierta"]
+    key = _active_risk_key("griegas", df, active_df)
+    cached = _ACTIVE_RISK_CACHE.get(key)
+    if cached is not None:
+        return cached
+    return _ACTIVE_RISK_CACHE.put(key, portfolio_greeks(active_df))
+
+
+def active_mark_to_market(df: pd.DataFrame) -> pd.DataFrame:
+    """mark_to_market de las cadenas abiertas, calculado una vez por versión de datos y cotizaciones / marks."""
+    active_df = df[df["Estado"] == "Abierta"]
+    key = _active_risk_key("mtm", df, active_df)
+    cached = _ACTIVE_RISK_CACHE.get(key)
+    if cached is not None:
+        return cached
+    return _ACTIVE_RISK_CACHE.put(key, mark_to_market(active_df, build_active_chain_summaries(df)))
+
+
+def active_portfolio_pop(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    POP por Monte Carlo de las cadenas de opciones abiertas en un solo lote, una vez por versión de
+    datos y cotizaciones. Las cubiertas (CC, Collar) no traen las acciones en la cadena: simularlas
+    sería una call desnuda, así que quedan fuera.
+    """
+    active_df = df[df["Estado"] == "Abierta"]
+    key = _active_risk_key("pop", df, active_df)
+    cached = _ACTIVE_RISK_CACHE.get(key)
+    if cached is not None:
+        return cached
+    chain_table = build_active_chain_summaries(df)
+    if chain_table.empty:
+        return _ACTIVE_RISK_CACHE.put(key, portfolio_pop(active_df.iloc[:0], pd.Series(dtype=float)))
+    option_chains = chain_table[~chain_table["is_stock_position"] & ~chain_table["is_cc_rueda"]
+                                & ~chain_table["effective_strategy"].isin(COVERED_STRATEGIES)]
+    return _ACTIVE_RISK_CACHE.put(key, portfolio_pop(active_df[active_df["ChainID"].isin(option_chains["ChainID"])],
+                                                     option_chains.set_index("ChainID")["payoff_premium"]))
@@ -0,0 +1,55 @@
+"""Cachés de proceso compartidas entre sesiones."""
+import threading
+from collections import OrderedDict
+
+_CACHE_STATS = {}  # nombre -> [aciertos, fallos]
+_CACHE_STATS_LOCK = threading.Lock()
+
+
+def record_cache_event(name: str, hit: bool):
+    """Cuenta un acierto o fallo de una caché con nombre (se muestra en el panel de rendimiento)."""
+    with _CACHE_STATS_LOCK:
+        counters = _CACHE_STATS.setdefault(name, [0, 0])
+        counters[0 if hit else 1] += 1
+
+
+def cache_stats() -> dict:
+    """Instantánea {nombre: (aciertos, fallos)} de todas las cachés con nombre del proceso."""
+    with _CACHE_STATS_LOCK:
+        return {name: tuple(counters) for name, counters in _CACHE_STATS.items()}
+
+
+class LRUCache:
+    """Caché LRU acotada y segura entre hilos (las sesiones de Streamlit comparten el proceso)."""
+
+    _MISSING = object()
+
+    def __init__(self, maxsize: int, name: str = None):
+        self.maxsize = maxsize
+        self.name = name
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._data.get(key, self._MISSING)
+            if value is not self._MISSING:
+                self._data.move_to_end(key)
+        if self.name:
+            record_cache_event(self.name, value is not self._MISSING)
+        return default if value is self._MISSING else value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
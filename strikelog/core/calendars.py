@@ -0,0 +1,181 @@
+"""Calendarios de earnings / ex-dividend: proveedores intercambiables, caché con TTL y consulta concurrente."""
+import pandas as pd
+import os
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+from datetime import datetime, timedelta
+
+from .config import (
+    CALENDAR_CACHE_FILE, CALENDAR_CACHE_TTL_HOURS, CALENDAR_FETCH_TIMEOUT, CALENDAR_SYNC_WORKERS,
+)
+from .profiling import profiled
+
+# --- Calendarios (earnings / ex-dividend) ---
+class YahooCalendarProvider:
+    """Proveedor de fechas de earnings y ex-dividend sobre yfinance (importación diferida)."""
+    name = "yahoo"
+
+    def fetch(self, ticker_symbol: str):
+        """Devuelve (earnings, ex_dividend) como fechas o None."""
+        import yfinance as yf
+
+        ticker = yf.Ticker(ticker_symbol)
+        earn_date, div_date = None, None
+
+        # El calendario contiene earnings y a veces ex-dividend
+        cal = None
+        try:
+            cal = ticker.calendar
+        except Exception:
+            pass
+        if isinstance(cal, dict) and cal:
+            earn_list = cal.get('Earnings Date')
+            if isinstance(earn_list, list) and len(earn_list) > 0:
+                earn_date = earn_list[0]
+            elif earn_list:
+                earn_date = earn_list
+            div_date = cal.get('Ex-Dividend Date')
+
+        # Si no hay ex-dividend en calendar, ticker.info trae exDividendDate en unix timestamp
+        if not div_date:
+            try:
+                ex_div_timestamp = ticker.info.get('exDividendDate')
+                if ex_div_timestamp:
+                    div_date = pd.to_datetime(ex_div_timestamp, unit='s').date()
+            except Exception:
+                pass
+        return earn_date, div_date
+
+
+class StaticCalendarProvider:
+    """Proveedor local sin red ({ticker: (earnings, ex_dividend)}), para pruebas o uso offline."""
+    name = "static"
+
+    def __init__(self, calendars: dict = None, delay: float = 0.0):
+        self.calendars = calendars or {}
+        self.delay = delay
+        self.calls = 0
+
+    def fetch(self, ticker_symbol: str):
+        self.calls += 1
+        if self.delay:
+            threading.Event().wait(self.delay)
+        return self.calendars.get(ticker_symbol, (None, None))
+
+
+_CALENDAR_PROVIDER = {"provider": YahooCalendarProvider()}
+
+def set_calendar_provider(provider):
+    """Sustituye el proveedor de calendarios (cualquier objeto con fetch(ticker) -> (earn, div))."""
+    _CALENDAR_PROVIDER["provider"] = provider
+
+def get_calendar_provider():
+    return _CALENDAR_PROVIDER["provider"]
+
+
+class CalendarCache:
+    """
+    Caché en disco (JSON) de fechas de earnings y ex-dividend por ticker con caducidad (TTL).
+    También guarda los tickers sin fechas, así una segunda sincronización del día no consulta la red.
+    """
+
+    def __init__(self, path: str = CALENDAR_CACHE_FILE, ttl_hours: float = CALENDAR_CACHE_TTL_HOURS):
+        self.path = path
+        self.ttl = timedelta(hours=ttl_hours)
+        self.lock = threading.Lock()
+        self._entries = None
+
+    def _load(self) -> dict:
+        if self._entries is None:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._entries = {}
+        return self._entries
+
+    def get(self, ticker_symbol: str, provider_name: str, now: datetime = None):
+        """Entrada vigente (earnings, ex_dividend) o None si falta o caducó."""
+        with self.lock:
+            entry = self._load().get(ticker_symbol)
+        if not entry or entry.get("provider") != provider_name:
+            return None
+        fetched_at = pd.to_datetime(entry.get("fetched_at"), errors="coerce")
+        if pd.isna(fetched_at) or (now or datetime.now()) - fetched_at.to_pydatetime() > self.ttl:
+            return None
+        return entry.get("earnings"), entry.get("dividend")
+
+    def put_many(self, results: dict, provider_name: str, now: datetime = None):
+        """Guarda {ticker: (earnings, ex_dividend)} y reescribe el fichero de forma atómica."""
+        stamp = (now or datetime.now()).isoformat(timespec="seconds")
+
+        def _iso(v):
+            ts = pd.to_datetime(v, errors="coerce") if v is not None else pd.NaT
+            return None if pd.isna(ts) else ts.date().isoformat()
+
+        with self.lock:
+            entries = self._load()
+            for ticker_symbol, (earn, div) in results.items():
+                entries[ticker_symbol] = {
+                    "provider": provider_name, "fetched_at": stamp,
+                    "earnings": _iso(earn), "dividend": _iso(div),
+                }
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+
+
+@profiled("Calendarios (earnings / dividendos)")
+def fetch_calendars(tickers, provider=None, cache: CalendarCache = None,
+                    workers: int = CALENDAR_SYNC_WORKERS, timeout: float = CALENDAR_FETCH_TIMEOUT,
+                    on_progress=None):
+    """
+    Fechas de earnings / ex-dividend para varios tickers. Primero la caché; el resto se consulta
+    en paralelo (pool acotado) con un plazo de timeout por tanda de workers. Devuelve
+    (resultados {ticker: (earn, div)}, fallidos [ticker]). on_progress(hechos, total, ticker)
+    se llama desde el hilo que invoca.
+    """
+    provider = provider or get_calendar_provider()
+    cache = cache if cache is not None else CalendarCache()
+    tickers = list(dict.fromkeys(tickers))
+    total = len(tickers)
+    results, failed = {}, []
+
+    pending = []
+    for t in tickers:
+        cached = cache.get(t, provider.name)
+        if cached is not None:
+            results[t] = cached
+        else:
+            pending.append(t)
+    done = len(results)
+    if on_progress and done:
+        on_progress(done, total, None)
+    if not pending:
+        return results, failed
+
+    fetched = {}
+    batches = -(-len(pending) // max(1, workers))
+    pool = ThreadPoolExecutor(max_workers=max(1, min(workers, len(pending))))
+    futures = {pool.submit(provider.fetch, t): t for t in pending}
+    try:
+        for fut in as_completed(futures, timeout=timeout * batches):
+            t = futures[fut]
+            try:
+                fetched[t] = fut.result()
+            except Exception:
+                failed.append(t)
+            done += 1
+            if on_progress:
+                on_progress(done, total, t)
+    except FuturesTimeoutError:
+        failed.extend(t for f, t in futures.items() if not f.done())
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    if fetched:
+        cache.put_many(fetched, provider.name)
+    results.update(fetched)
+    return results, failed
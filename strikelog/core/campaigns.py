@@ -0,0 +1,151 @@
+"""Grafo de campañas (rolls, La Rueda): índice por versión de datos y consultas de pasos / historial de rolls."""
+import pandas as pd
+import numpy as np
+import weakref
+
+from .cache import record_cache_event
+from .profiling import profiled
+from .storage import JournalManager
+
+def _valid_link(value) -> bool:
+    return pd.notna(value) and str(value) != ""
+
+
+class CampaignIndex:
+    """
+    Índice del grafo de campañas construido una vez por versión de datos.
+    Guarda listas de posiciones por ID / ParentID / ChainID / WheelParentChainID y
+    un identificador de campaña por fila calculado con union-find vectorizado sobre
+    las aristas hijo→padre (ParentID) y entre hermanos del mismo ChainID.
+    Sólo indexa las columnas de enlace: los valores de las filas se leen siempre del df.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.n = len(df)
+        self.by_id = self._postings(df["ID"])
+        self.by_parent = self._postings(df["ParentID"])
+        self.by_chain = self._postings(df["ChainID"])
+        self.by_wheel_parent = self._postings(df["WheelParentChainID"])
+        self.campaign = self._components(df)
+        self._members = None
+
+    @staticmethod
+    def _postings(col: pd.Series) -> dict:
+        """Valor -> posiciones (ordenadas) de las filas con ese valor, ignorando nulos y vacíos."""
+        valid = (col.notna() & (col.astype(str) != "")).to_numpy()
+        positions = np.flatnonzero(valid)
+        if len(positions) == 0:
+            return {}
+        groups = pd.Series(positions).groupby(col.to_numpy()[valid], sort=False).indices
+        return {k: positions[v] for k, v in groups.items()}
+
+    def _components(self, df: pd.DataFrame) -> np.ndarray:
+        edges_u, edges_v = [], []
+        # Hermanos del mismo ChainID: cada pata se une a la primera de su cadena
+        for positions in self.by_chain.values():
+            if len(positions) > 1:
+                edges_u.append(positions[1:])
+                edges_v.append(np.full(len(positions) - 1, positions[0]))
+        # Hijo -> padre (sólo si el padre existe como fila)
+        first_pos_by_id = {k: v[0] for k, v in self.by_id.items()}
+        parent_pos = df["ParentID"].map(first_pos_by_id)
+        has_parent = parent_pos.notna().to_numpy()
+        if has_parent.any():
+            edges_u.append(np.flatnonzero(has_parent))
+            edges_v.append(parent_pos.to_numpy()[has_parent].astype(np.int64))
+        # Filas con el mismo ID comparten nodo
+        for positions in self.by_id.values():
+            if len(positions) > 1:
+                edges_u.append(positions[1:])
+                edges_v.append(np.full(len(positions) - 1, positions[0]))
+
+        labels = np.arange(self.n)
+        if not edges_u:
+            return labels
+        u = np.concatenate(edges_u).astype(np.int64)
+        v = np.concatenate(edges_v).astype(np.int64)
+        while True:
+            # Enganche: cada raíz apunta a la menor de las raíces de sus aristas
+            lu, lv = labels[u], labels[v]
+            low = np.minimum(lu, lv)
+            np.minimum.at(labels, lu, low)
+            np.minimum.at(labels, lv, low)
+            # Compresión de caminos
+            while True:
+                jumped = labels[labels]
+                if np.array_equal(jumped, labels):
+                    break
+                labels = jumped
+            if np.array_equal(labels[u], labels[v]):
+                return labels
+
+    def positions_of(self, row_id) -> np.ndarray:
+        return self.by_id.get(row_id, np.empty(0, dtype=np.int64))
+
+    def campaign_positions(self, start_id) -> np.ndarray:
+        """Posiciones (en orden del df) de todas las filas conectadas a start_id. O(tamaño de campaña)."""
+        pos = self.positions_of(start_id)
+        if len(pos) == 0:
+            return pos
+        if self._members is None:
+            order = np.argsort(self.campaign, kind="stable")
+            bounds = np.flatnonzero(np.diff(self.campaign[order])) + 1
+            self._members = {int(self.campaign[g[0]]): g for g in np.split(order, bounds)}
+        return self._members[int(self.campaign[pos[0]])]
+
+    def parent_chain(self, df: pd.DataFrame, current_id) -> list:
+        """Sigue ParentID hacia atrás desde current_id (el primero es el actual)."""
+        history, seen_ids = [], set()
+        curr = current_id
+        while _valid_link(curr) and str(curr) != "nan" and curr not in seen_ids:
+            pos = self.positions_of(curr)
+            if len(pos) == 0:
+                break
+            row = df.iloc[pos[0]]
+            history.append(row)
+            seen_ids.add(curr)
+            curr = row.get("ParentID")
+        return history
+
+
+_CAMPAIGN_INDEX_CACHE = {"ref": None, "key": None, "index": None}
+
+def get_campaign_index(df: pd.DataFrame) -> CampaignIndex:
+    """
+    Devuelve el índice de campañas de df, reconstruyéndolo sólo si cambió la versión de datos
+    o se trata de otro DataFrame (concat, filtrado, etc.).
+    """
+    key = (JournalManager.data_version(), len(df))
+    cached_ref = _CAMPAIGN_INDEX_CACHE["ref"]
+    if cached_ref is not None and cached_ref() is df and _CAMPAIGN_INDEX_CACHE["key"] == key:
+        record_cache_event("Índice de campañas", True)
+        return _CAMPAIGN_INDEX_CACHE["index"]
+    record_cache_event("Índice de campañas", False)
+    index = CampaignIndex(df)
+    _CAMPAIGN_INDEX_CACHE.update({"ref": weakref.ref(df), "key": key, "index": index})
+    return index
+
+
+@profiled("Pasos de campaña")
+def get_campaign_steps(df, start_id):
+    """
+    Rastrea todas las transacciones conectadas a start_id (por ChainID o ParentID/ID)
+    y las devuelve ordenadas por pasos cronológicos de ChainID.
+    Retorna una lista de tuplas: (chain_id, step_df) ordenadas por fecha.
+    """
+    positions = get_campaign_index(df).campaign_positions(start_id)
+    campaign_df = df.iloc[positions]
+    grouped_steps = []
+    for c_id, step_df in campaign_df.groupby("ChainID"):
+        min_date = pd.to_datetime(step_df["FechaApertura"].min())
+        if pd.isna(min_date):
+            min_date = pd.Timestamp.min
+        grouped_steps.append((c_id, step_df, min_date))
+        
+    grouped_steps.sort(key=lambda x: x[2])
+    return [(item[0], item[1]) for item in grouped_steps]
+
+def get_roll_history(df, current_id):
+    """Rastrea hacia atrás todos los padres de un trade para obtener la secuencia de roles."""
+    # El primero en la lista es el actual, el último es el origen original
+    return get_campaign_index(df).parent_chain(df, current_id)
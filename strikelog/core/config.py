@@ -0,0 +1,129 @@
+"""Configuración del journal: archivos, columnas, catálogos (estrategias, setups, estados) y parámetros de las cachés."""
+import os
+
+FILE_NAME = "bitacora_opciones.csv"      # Formato de intercambio (importar / exportar)
+DB_FILE = "bitacora_opciones.db"         # Motor de almacenamiento principal (SQLite)
+PARQUET_FILE = "bitacora_opciones.parquet"  # Motor alternativo columnar (requiere pyarrow)
+STORAGE_BACKEND = os.environ.get("STRIKELOG_STORAGE", "sqlite").strip().lower()  # "sqlite" | "parquet"
+BACKUP_DIR = "backups_journal"
+PROFILE_DIR = "perf_profiles"  # Volcados cProfile (.pstats) del panel de rendimiento
+JOURNAL_SCHEMA_VERSION = 2                               # Versión del esquema normalizado (marca en df.attrs)
+WAL_FILE = "bitacora_opciones.wal.jsonl"                  # Mutaciones pendientes de compactar
+WAL_ARCHIVE_FILE = "bitacora_opciones.wal.archive.jsonl"  # Mutaciones ya compactadas (auditoría / deshacer)
+WAL_COMPACT_EVERY = 200                                   # Mutaciones en el log antes de compactar a la base de datos
+WAL_ARCHIVE_MAX_BYTES = 8 * 1024 * 1024                   # Tamaño del histórico antes de rotarlo a un segmento .gz
+WAL_ARCHIVE_SEGMENTS = 8                                  # Segmentos rotados que se conservan (se descartan los más antiguos)
+
+# Sincronización de calendarios (earnings / ex-dividend)
+CALENDAR_CACHE_FILE = "calendar_cache.json"   # Caché local de fechas por ticker
+CALENDAR_CACHE_TTL_HOURS = 12                 # Antigüedad máxima de una entrada antes de volver a consultar
+CALENDAR_SYNC_WORKERS = 8                     # Consultas simultáneas al proveedor
+CALENDAR_FETCH_TIMEOUT = 10                   # Segundos por consulta (se aplica por tanda de workers)
+
+# Valoración de opciones (Black-Scholes)
+QUOTES_FILE = "quotes_local.json"   # Spot / IV por ticker de la fuente de cotizaciones local
+RISK_FREE_RATE = 0.04               # Tipo libre de riesgo anual (continuo)
+DEFAULT_IV = 0.30                   # Volatilidad implícita si la fuente sólo trae el spot
+
+# Almacén de cotizaciones (mark-to-market de las posiciones abiertas)
+MARKS_DB_FILE = "quotes_marks.db"   # Snapshots con marca de tiempo de spot y marks de opciones (SQLite)
+MARKS_DROP_DIR = "quotes_drop"      # Carpeta de CSV exportados del broker (proveedor "csv")
+
+# Probabilidad de beneficio (Monte Carlo lognormal)
+POP_PATHS = 100_000                 # Precios finales simulados por cadena
+POP_SEED = 7                        # Semilla fija: mismas entradas, mismo resultado
+POP_TIME_BUDGET = 0.5               # Segundos máximos por cálculo; al agotarse se usan las rutas ya simuladas
+
+# Retención de snapshots en BACKUP_DIR: todos los de hoy, uno por hora la última semana, uno por día el último año
+BACKUP_RETENTION = {"all_days": 1, "hourly_days": 7, "daily_days": 365}
+
+# Columnas actualizadas
+COLUMNS = [
+    "ID", "ChainID", "ParentID", "Ticker", "FechaApertura", "Expiry", 
+    "Estrategia", "Setup", "Tags", "Side", "OptionType", "Strike", "Delta", "PrimaRecibida", "CostoCierre", "Contratos", 
+    "BuyingPower", "BreakEven", "BreakEven_Upper", "POP",
+    "Estado", "Notas", "UpdatedAt", "FechaCierre", "MaxProfitUSD", "ProfitPct", "PnL_Capital_Pct",
+    "PrecioAccionCierre", "PnL_USD_Realizado", "Comisiones", "EarningsDate", "DividendosDate",
+    "Broker",
+    # --- Ciclo de La Rueda ---
+    "WheelParentChainID",  # ChainID del PCS original que generó esta posición de acciones
+    "CostBaseReal",        # Costo base real de las acciones (strike - primas netas)
+    "CoveredCallChainID",  # ChainID del Covered Call vinculado a estas acciones
+    "CoveredCallPrima",    # Prima total cobrada por Covered Calls sobre estas acciones
+    "WheelLeg",            # 'sell_put' | 'buy_put_open' | 'long_stock' | 'covered_call'
+]
+
+SETUPS = ["Earnings", "Soporte/Resistencia", "VIX alto", "Tendencial", "Reversión", "Inversión Largo Plazo", "Otro"]
+
+ESTADOS = ["Abierta", "Cerrada", "Rolada", "Asignada"]
+EXPIRY_ACTIONS = ["OTM", "Asignada", "Manual"]  # Resolución de una cadena vencida (procesado por lotes)
+ESTRATEGIAS = [
+    "CSP (Cash Secured Put)", "CC (Covered Call)", "Collar",
+    "Put Credit Spread", "Call Credit Spread", 
+    "Put Debit Spread", "Call Debit Spread",
+    "Iron Condor", "Iron Fly",
+    "Butterfly", "Broken Wing Butterfly (BWB)", "Flyagonal",
+    "Strangle", "Straddle",
+    "Calendar", "Diagonal",
+    "Ratio Spread", "Backspread", 
+    "Long Call", "Long Put",
+    "Long Stock (Asignación)",
+    "Custom / Other"
+]
+SIDES = ["Sell", "Buy"]
+OPTION_TYPES = ["Put", "Call", "Stock"]
+
+# Estrategias que tienen dos Break Even (zona de beneficio entre dos strikes)
+DUAL_BE_STRATEGIES = ["Iron Condor", "Iron Fly", "Iron Butterfly", "Strangle", "Straddle", "Butterfly", "Broken Wing Butterfly (BWB)", "Flyagonal"]
+
+# Estrategias que se abren contra acciones en cartera: su payoff (y su POP) incluye la pata de acciones
+COVERED_STRATEGIES = ["CC (Covered Call)", "Collar"]
+
+# Estrategias complejas que típicamente usan patas con vencimientos independientes
+MULTI_EXPIRY_STRATEGIES = ["Calendar", "Diagonal", "Flyagonal"]
+
+# Auto-populate de patas según estrategia (Side, OptionType por pata)
+LEG_DEFAULTS = {
+    "CSP (Cash Secured Put)": [("Sell", "Put")],
+    "CC (Covered Call)": [("Sell", "Call")],
+    "Put Credit Spread": [("Sell", "Put"), ("Buy", "Put")],
+    "Call Credit Spread": [("Sell", "Call"), ("Buy", "Call")],
+    "Put Debit Spread": [("Buy", "Put"), ("Sell", "Put")],
+    "Call Debit Spread": [("Buy", "Call"), ("Sell", "Call")],
+    "Iron Condor": [("Sell", "Put"), ("Buy", "Put"), ("Sell", "Call"), ("Buy", "Call")],
+    "Iron Fly": [("Sell", "Put"), ("Buy", "Put"), ("Sell", "Call"), ("Buy", "Call")],
+    "Butterfly": [("Buy", "Call"), ("Sell", "Call"), ("Buy", "Call")],
+    "Broken Wing Butterfly (BWB)": [("Buy", "Put"), ("Sell", "Put"), ("Buy", "Put")],
+    "Flyagonal": [("Buy", "Call"), ("Sell", "Call"), ("Sell", "Call"), ("Buy", "Call"), ("Sell", "Put"), ("Buy", "Put")],
+    "Strangle": [("Sell", "Put"), ("Sell", "Call")],
+    "Straddle": [("Sell", "Put"), ("Sell", "Call")],
+    "Collar": [("Sell", "Call"), ("Buy", "Put")],
+    "Long Call": [("Buy", "Call")],
+    "Long Put": [("Buy", "Put")],
+    "Calendar": [("Sell", "Put"), ("Buy", "Put")],
+    "Diagonal": [("Sell", "Put"), ("Buy", "Put")],
+    "Ratio Spread": [("Sell", "Put"), ("Buy", "Put")],
+    "Backspread": [("Buy", "Put"), ("Sell", "Put")],
+}
+
+# Tipos de columna del journal (normalización y esquema SQLite)
+DATE_COLUMNS = ["FechaApertura", "Expiry", "FechaCierre", "EarningsDate", "DividendosDate"]
+NUMERIC_COLUMNS = [
+    "PrimaRecibida", "CostoCierre", "BuyingPower", "BreakEven", "BreakEven_Upper", "POP", "Delta",
+    "MaxProfitUSD", "ProfitPct", "PnL_Capital_Pct", "PrecioAccionCierre", "PnL_USD_Realizado",
+    "Comisiones", "CostBaseReal", "CoveredCallPrima",
+]
+INT_COLUMNS = ["Contratos"]
+
+# Columnas indexadas en SQLite (enlaces de campaña, filtros de estado y cierres)
+INDEXED_COLUMNS = ["ID", "ChainID", "ParentID", "WheelParentChainID", "Estado", "Ticker", "FechaCierre"]
+
+# Columnas que necesita el Cuadro de Mando (sin texto libre: Notas, Tags)
+DASHBOARD_COLUMNS = [
+    "ID", "ChainID", "Ticker", "FechaApertura", "Expiry", "Estrategia", "Setup", "Side",
+    "PrimaRecibida", "Contratos", "BuyingPower", "Estado", "FechaCierre", "ProfitPct",
+    "PnL_USD_Realizado", "Comisiones",
+]
+
+# Índices para cálculo de comisiones en Tradier
+INDICES = {"SPX", "NDX", "RUT", "VIX", "DJX", "XSP"}
@@ -0,0 +1,453 @@
+"""
+Almacén local de cotizaciones para el mark-to-market: snapshots con marca de tiempo del spot de
+cada subyacente y del mark de cada opción (ticker, vencimiento, strike, tipo) en SQLite,
+alimentados por un proveedor intercambiable (yfinance, carpeta de CSV del broker o fake), y PnL
+no realizado de todas las cadenas abiertas en una sola pasada.
+"""
+import os
+import glob
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from .config import DEFAULT_IV, MARKS_DB_FILE, MARKS_DROP_DIR
+from .profiling import profiled
+from .pricing import black_scholes, get_quote_source, leg_greeks, years_to_expiry
+from .payoff import _chain_pnl, _per_chain, _prepare_legs
+from .statements import parse_option_symbol
+
+MARK_KEY = ["Ticker", "Expiry", "Strike", "OptionType"]   # Clave de búsqueda de un contrato
+SPOT_COLUMNS = ["Ticker", "Spot", "IV", "Ts"]
+OPTION_MARK_COLUMNS = MARK_KEY + ["Mark", "IV", "Ts"]
+MTM_COLUMNS = ["Ticker", "Spot", "ValorActual", "PnLNoRealizado", "PnLCampaña", "MaxBeneficioUSD",
+               "PctMaxBeneficio", "BECercano", "DistBEPct", "PatasTeoricas", "MarkTs"]
+
+
+def _stamp(ts=None) -> str:
+    return pd.Timestamp(ts or datetime.now()).isoformat(timespec="seconds")
+
+
+def _numeric(values) -> pd.Series:
+    """Texto de precios del broker ('$1,234.50', '') -> float (NaN si no es un número)."""
+    return pd.to_numeric(pd.Series(values).astype(str).str.replace(r"[$,%\s]", "", regex=True), errors="coerce")
+
+
+def _contract_keys(frame: pd.DataFrame) -> pd.DataFrame:
+    """Clave normalizada (ticker, vencimiento ISO, strike redondeado, tipo) de cada fila, mismo índice."""
+    return pd.DataFrame({
+        "Ticker": frame["Ticker"].astype(str).str.strip().str.upper(),
+        "Expiry": pd.to_datetime(frame["Expiry"], errors="coerce").dt.strftime("%Y-%m-%d"),
+        "Strike": pd.to_numeric(frame["Strike"], errors="coerce").round(4),
+        "OptionType": frame["OptionType"].astype(str).str.strip().str.capitalize(),
+    }, index=frame.index)
+
+
+def _spot_frame(spots, stamp: str) -> pd.DataFrame:
+    """{ticker: {"spot", "iv"}} o DataFrame (Ticker, Spot[, IV, Ts]) -> SPOT_COLUMNS válidas."""
+    if isinstance(spots, dict):
+        spots = pd.DataFrame([{"Ticker": t, "Spot": q.get("spot"), "IV": q.get("iv")} for t, q in spots.items()],
+                             columns=["Ticker", "Spot", "IV"])
+    frame = spots.reindex(columns=SPOT_COLUMNS).copy()
+    frame["Ticker"] = frame["Ticker"].astype(str).str.strip().str.upper()
+    frame["Spot"] = pd.to_numeric(frame["Spot"], errors="coerce")
+    frame["IV"] = pd.to_numeric(frame["IV"], errors="coerce")
+    frame["Ts"] = frame["Ts"].fillna(stamp)
+    return frame[frame["Spot"] > 0]
+
+
+def _mark_frame(marks: pd.DataFrame, stamp: str) -> pd.DataFrame:
+    """DataFrame de marks del proveedor -> OPTION_MARK_COLUMNS con la clave normalizada."""
+    frame = marks.reindex(columns=OPTION_MARK_COLUMNS).copy()
+    frame[MARK_KEY] = _contract_keys(frame)
+    frame["Mark"] = pd.to_numeric(frame["Mark"], errors="coerce")
+    frame["IV"] = pd.to_numeric(frame["IV"], errors="coerce")
+    frame["Ts"] = frame["Ts"].fillna(stamp)
+    valid = frame["Expiry"].notna() & frame["Strike"].notna() & frame["OptionType"].isin(["Call", "Put"])
+    return frame[valid & (frame["Mark"] >= 0)]
+
+
+def _sql_rows(frame: pd.DataFrame, source: str) -> list:
+    out = frame.astype(object).where(frame.notna(), None)
+    return [(*row, source) for row in out.itertuples(index=False, name=None)]
+
+
+class QuoteStore:
+    """
+    Snapshots de cotizaciones en SQLite. Cada refresco añade filas con su marca de tiempo (misma
+    clave y misma hora se sobrescriben, así releer un CSV no duplica nada); la clave primaria
+    (ticker, vencimiento, strike, tipo, hora) hace de índice de búsqueda por contrato. Las lecturas
+    usan el último snapshot de cada subyacente / contrato, cargado una sola vez por versión del
+    fichero. Con get_quotes sirve también como fuente de cotizaciones de pricing.
+    """
+    name = "marks"
+
+    def __init__(self, path: str = MARKS_DB_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self._latest = None  # (huella de ficheros, últimos spots, últimos marks)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS underlying_marks (ticker TEXT NOT NULL, ts TEXT NOT NULL, "
+                     "spot REAL, iv REAL, source TEXT, PRIMARY KEY (ticker, ts))")
+        conn.execute("CREATE TABLE IF NOT EXISTS option_marks (ticker TEXT NOT NULL, expiry TEXT NOT NULL, "
+                     "strike REAL NOT NULL, type TEXT NOT NULL, ts TEXT NOT NULL, mark REAL, iv REAL, source TEXT, "
+                     "PRIMARY KEY (ticker, expiry, strike, type, ts))")
+        return conn
+
+    def storage_token(self) -> tuple:
+        token = []
+        for path in (self.path, self.path + "-wal"):
+            try:
+                st_info = os.stat(path)
+                token.append((st_info.st_mtime_ns, st_info.st_size))
+            except FileNotFoundError:
+                token.append(None)
+        return tuple(token)
+
+    def record(self, spots=None, marks: pd.DataFrame = None, source: str = "manual", ts=None):
+        """Guarda un snapshot (spots y marks de opciones) en una transacción. Devuelve (n_spots, n_marks)."""
+        stamp = _stamp(ts)
+        spot_rows = _spot_frame(spots, stamp)[["Ticker", "Ts", "Spot", "IV"]] if spots is not None and len(spots) else None
+        mark_rows = _mark_frame(marks, stamp)[MARK_KEY + ["Ts", "Mark", "IV"]] if marks is not None and len(marks) else None
+        with self.lock, closing(self._connect()) as conn:
+            with conn:
+                if spot_rows is not None:
+                    conn.executemany("INSERT OR REPLACE INTO underlying_marks VALUES (?, ?, ?, ?, ?)",
+                                     _sql_rows(spot_rows, source))
+                if mark_rows is not None:
+                    conn.executemany("INSERT OR REPLACE INTO option_marks VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                     _sql_rows(mark_rows, source))
+            self._latest = None
+        return (0 if spot_rows is None else len(spot_rows)), (0 if mark_rows is None else len(mark_rows))
+
+    def latest(self):
+        """(último spot por ticker, último mark por contrato) como DataFrames; se relee si cambió el fichero."""
+        token = self.storage_token()
+        with self.lock:
+            if self._latest is not None and self._latest[0] == token:
+                return self._latest[1], self._latest[2]
+            if not os.path.exists(self.path):
+                return pd.DataFrame(columns=SPOT_COLUMNS), pd.DataFrame(columns=OPTION_MARK_COLUMNS)
+            with closing(self._connect()) as conn:
+                # Columnas sueltas junto a MAX(ts): SQLite las toma de la fila con la hora más reciente
+                spots = pd.read_sql_query(
+                    "SELECT ticker AS Ticker, spot AS Spot, iv AS IV, MAX(ts) AS Ts FROM underlying_marks "
+                    "GROUP BY ticker", conn)
+                marks = pd.read_sql_query(
+                    "SELECT ticker AS Ticker, expiry AS Expiry, strike AS Strike, type AS OptionType, "
+                    "mark AS Mark, iv AS IV, MAX(ts) AS Ts FROM option_marks "
+                    "GROUP BY ticker, expiry, strike, type", conn)
+            self._latest = (self.storage_token(), spots, marks)
+            return spots, marks
+
+    def get_quotes(self, tickers) -> dict:
+        """Último spot / IV de cada ticker ({ticker: {"spot", "iv", "ts"}}), interfaz de fuente de cotizaciones."""
+        spots, _ = self.latest()
+        spots = spots[spots["Ticker"].isin(list(tickers))]
+        return {
+            row["Ticker"]: {"spot": row["Spot"], "iv": row["IV"] if pd.notna(row["IV"]) else None, "ts": row["Ts"]}
+            for row in spots.to_dict("records")
+        }
+
+    def latest_marks(self, legs: pd.DataFrame) -> pd.DataFrame:
+        """Último mark (Mark, IV, Ts) de cada pata de `legs` con un solo cruce por clave; NaN si no hay."""
+        _, marks = self.latest()
+        found = _contract_keys(legs).merge(marks, on=MARK_KEY, how="left")
+        return found[["Mark", "IV", "Ts"]].set_axis(legs.index)
+
+    def history(self, ticker: str, expiry=None, strike=None, option_type=None) -> pd.DataFrame:
+        """Serie temporal de un subyacente (sin expiry) o de un contrato concreto."""
+        if not os.path.exists(self.path):
+            return pd.DataFrame(columns=["Ts", "Spot" if expiry is None else "Mark", "IV", "Source"])
+        with closing(self._connect()) as conn:
+            if expiry is None:
+                return pd.read_sql_query(
+                    "SELECT ts AS Ts, spot AS Spot, iv AS IV, source AS Source FROM underlying_marks "
+                    "WHERE ticker = ? ORDER BY ts", conn, params=(str(ticker).upper(),))
+            key = _contract_keys(pd.DataFrame([{"Ticker": ticker, "Expiry": expiry, "Strike": strike,
+                                                "OptionType": option_type}])).iloc[0]
+            return pd.read_sql_query(
+                "SELECT ts AS Ts, mark AS Mark, iv AS IV, source AS Source FROM option_marks "
+                "WHERE ticker = ? AND expiry = ? AND strike = ? AND type = ? ORDER BY ts", conn,
+                params=(key["Ticker"], key["Expiry"], float(key["Strike"]), key["OptionType"]))
+
+
+_QUOTE_STORES = {}
+_QUOTE_STORES_LOCK = threading.Lock()
+
+def get_quote_store(path: str = MARKS_DB_FILE) -> QuoteStore:
+    """Instancia única del almacén de cotizaciones por ruta (compartida entre sesiones)."""
+    with _QUOTE_STORES_LOCK:
+        if path not in _QUOTE_STORES:
+            _QUOTE_STORES[path] = QuoteStore(path)
+        return _QUOTE_STORES[path]
+
+
+# --- Proveedores de marks: fetch(tickers, contratos) -> (spots SPOT_COLUMNS, marks OPTION_MARK_COLUMNS) ---
+class YahooMarkProvider:
+    """Spot y marks (punto medio bid / ask, o último precio) desde yfinance (importación diferida)."""
+    name = "yahoo"
+
+    def fetch(self, tickers, contracts: pd.DataFrame):
+        import yfinance as yf
+
+        spots, marks = [], []
+        for ticker_symbol in tickers:
+            ticker = yf.Ticker(ticker_symbol)
+            try:
+                spots.append({"Ticker": ticker_symbol, "Spot": float(ticker.fast_info["last_price"])})
+            except Exception:
+                continue
+            wanted = contracts[contracts["Ticker"] == ticker_symbol]
+            for expiry, legs in wanted.groupby("Expiry"):
+                try:
+                    chain = ticker.option_chain(expiry)
+                except Exception:
+                    continue
+                for opt_type, table in (("Call", chain.calls), ("Put", chain.puts)):
+                    table = table[table["strike"].isin(legs.loc[legs["OptionType"] == opt_type, "Strike"])]
+                    quoted = (table["bid"] > 0) & (table["ask"] > 0)
+                    marks.append(pd.DataFrame({
+                        "Ticker": ticker_symbol, "Expiry": expiry, "Strike": table["strike"], "OptionType": opt_type,
+                        "Mark": ((table["bid"] + table["ask"]) / 2).where(quoted, table["lastPrice"]),
+                        "IV": table["impliedVolatility"],
+                    }))
+        return (pd.DataFrame(spots, columns=["Ticker", "Spot"]),
+                pd.concat(marks, ignore_index=True) if marks else pd.DataFrame(columns=OPTION_MARK_COLUMNS))
+
+
+class CsvDropMarkProvider:
+    """
+    Cotizaciones de los CSV que se dejan en una carpeta (exportación de posiciones o de la cadena
+    del broker). Cada fila es un subyacente o una opción: columna Symbol (OCC, Schwab/Tradier o IB)
+    o Ticker / Expiry / Strike / Type, y precio en Mark, Mid, Last o Price (o Bid + Ask). La hora
+    del snapshot es la de modificación del archivo.
+    """
+    name = "csv"
+    PRICE_COLUMNS = ("mark", "mid", "markprice", "last", "lastprice", "price")
+
+    def __init__(self, folder: str = MARKS_DROP_DIR):
+        self.folder = folder
+
+    @staticmethod
+    def _column(raw: pd.DataFrame, *names):
+        lookup = {str(c).strip().lower().replace(" ", "").replace("_", ""): c for c in raw.columns}
+        return next((lookup[n] for n in names if n in lookup), None)
+
+    def _read(self, path: str) -> pd.DataFrame:
+        raw = pd.read_csv(path, dtype=str)
+        symbol_col = self._column(raw, "symbol", "instrument")
+        if symbol_col is not None:
+            parsed = raw[symbol_col].map(parse_option_symbol)
+            rows = pd.DataFrame([p or {} for p in parsed], index=raw.index).reindex(columns=MARK_KEY)
+            rows["Ticker"] = rows["Ticker"].fillna(raw[symbol_col].str.strip().str.upper())
+        else:
+            rows = pd.DataFrame({
+                key: raw[col] if col is not None else None
+                for key, col in zip(MARK_KEY, (self._column(raw, "ticker", "underlying"), self._column(raw, "expiry", "expiration"),
+                                               self._column(raw, "strike"), self._column(raw, "optiontype", "type", "putcall")))
+            }, index=raw.index)
+            rows["OptionType"] = rows["OptionType"].replace({"C": "Call", "P": "Put", "c": "Call", "p": "Put"})
+
+        price_col = self._column(raw, *self.PRICE_COLUMNS)
+        bid_col, ask_col = self._column(raw, "bid"), self._column(raw, "ask")
+        price = _numeric(raw[price_col]) if price_col is not None else pd.Series(np.nan, index=raw.index)
+        if bid_col is not None and ask_col is not None:
+            bid, ask = _numeric(raw[bid_col]), _numeric(raw[ask_col])
+            price = price.fillna(((bid + ask) / 2).where((bid > 0) & (ask > 0)))
+        iv_col = self._column(raw, "iv", "impliedvolatility", "impliedvol")
+        iv = _numeric(raw[iv_col]) if iv_col is not None else pd.Series(np.nan, index=raw.index)
+        rows["Mark"] = price.to_numpy()
+        rows["IV"] = iv.where(iv <= 3, iv / 100).to_numpy()  # Acepta IV en fracción o en %
+        rows["Ts"] = _stamp(datetime.fromtimestamp(os.path.getmtime(path)))
+        return rows
+
+    def fetch(self, tickers, contracts: pd.DataFrame = None):
+        files = sorted(glob.glob(os.path.join(self.folder, "*.csv")), key=os.path.getmtime)
+        if not files:
+            return pd.DataFrame(columns=SPOT_COLUMNS), pd.DataFrame(columns=OPTION_MARK_COLUMNS)
+        rows = pd.concat([self._read(path) for path in files], ignore_index=True)
+        rows = rows[rows["Ticker"].isin(list(tickers)) & rows["Mark"].notna()]
+        is_option = rows["OptionType"].isin(["Call", "Put"])
+        spots = rows.loc[~is_option, ["Ticker", "Mark", "IV", "Ts"]].rename(columns={"Mark": "Spot"})
+        return spots, rows.loc[is_option, OPTION_MARK_COLUMNS]
+
+
+class FakeMarkProvider:
+    """Proveedor sin red: spots fijos y marks Black-Scholes con una IV común, para pruebas y benchmarks."""
+    name = "fake"
+
+    def __init__(self, spots: dict = None, iv: float = DEFAULT_IV, now=None):
+        self.spots = spots or {}
+        self.iv = iv
+        self.now = now
+        self.calls = 0
+
+    def fetch(self, tickers, contracts: pd.DataFrame):
+        self.calls += 1
+        spots = pd.DataFrame([{"Ticker": t, "Spot": self.spots[t], "IV": self.iv} for t in tickers if t in self.spots],
+                             columns=["Ticker", "Spot", "IV"])
+        wanted = contracts[contracts["Ticker"].isin(list(self.spots))]
+        price = black_scholes(wanted["Ticker"].map(self.spots).to_numpy(dtype=float), wanted["Strike"].to_numpy(dtype=float),
+                              years_to_expiry(wanted["Expiry"], self.now), self.iv,
+                              (wanted["OptionType"] == "Call").to_numpy())["price"]
+        return spots, wanted.assign(Mark=np.round(price, 2), IV=self.iv)
+
+
+_MARK_PROVIDER = {"provider": CsvDropMarkProvider()}
+
+def set_mark_provider(provider):
+    """Sustituye el proveedor de marks (cualquier objeto con fetch(tickers, contratos) -> (spots, marks))."""
+    _MARK_PROVIDER["provider"] = provider
+
+def get_mark_provider():
+    return _MARK_PROVIDER["provider"]
+
+
+@profiled("Marks (refresco)")
+def refresh_marks(active_df: pd.DataFrame, provider=None, store: QuoteStore = None) -> dict:
+    """Pide al proveedor el spot y los marks de los tickers y contratos abiertos y los guarda como snapshot."""
+    provider = provider or get_mark_provider()
+    store = store if store is not None else get_quote_store()
+    options = active_df[active_df["OptionType"].isin(["Call", "Put"])]
+    contracts = _contract_keys(options).dropna().drop_duplicates().reset_index(drop=True)
+    tickers = active_df["Ticker"].dropna().astype(str).str.upper().unique().tolist()
+    spots, marks = provider.fetch(tickers, contracts)
+    n_spots, n_marks = store.record(spots, marks, source=provider.name)
+    return {"spots": n_spots, "marks": n_marks, "proveedor": provider.name}
+
+
+def _merge_quotes(quotes: dict, snapshots: dict) -> dict:
+    """Cotizaciones de la fuente activa, sustituidas por el snapshot del almacén si es más reciente."""
+    merged = dict(quotes)
+    for ticker, quote in snapshots.items():
+        current = merged.get(ticker)
+        if not current or str(quote.get("ts") or "") > str(current.get("ts") or ""):
+            merged[ticker] = quote
+    return merged
+
+
+@profiled("Mark-to-market")
+def mark_to_market(active_df: pd.DataFrame, chain_table: pd.DataFrame, store: QuoteStore = None,
+                   quotes: dict = None, now=None) -> pd.DataFrame:
+    """
+    Valoración actual de todas las cadenas abiertas en una sola pasada (índice ChainID, MTM_COLUMNS).
+
+    Cada pata usa su último mark del almacén; si no lo tiene, el precio Black-Scholes con el spot / IV
+    más reciente (PatasTeoricas cuenta cuántas). chain_table es la tabla de build_active_chain_summaries:
+    - PnLNoRealizado: prima de apertura de las patas abiertas + su valor actual (acciones: spot − strike).
+    - PnLCampaña: crédito neto de la campaña (rolls incluidos; débito en los time spreads) + valor actual, o (spot − BE) en acciones.
+    - PctMaxBeneficio: PnLCampaña / beneficio máximo del payoff (en un CC de La Rueda, PnLNoRealizado / prima
+      cobrada por el CC).
+    - DistBEPct: distancia del spot al Break Even más cercano en % del spot; negativa fuera de la zona
+      de beneficio al vencimiento.
+    Las cadenas con alguna pata sin precio quedan en NaN.
+    """
+    if active_df.empty or chain_table.empty:
+        return pd.DataFrame(columns=MTM_COLUMNS)
+    store = store if store is not None else get_quote_store()
+    legs = active_df[active_df["OptionType"].isin(["Call", "Put", "Stock"])]
+    tickers = legs["Ticker"].dropna().unique().tolist()
+    if quotes is None:
+        quotes = get_quote_source().get_quotes(tickers)
+    quotes = _merge_quotes(quotes, store.get_quotes(tickers))
+
+    greeks = leg_greeks(legs, quotes, now)
+    marks = store.latest_marks(legs)
+    is_option = (legs["OptionType"] != "Stock").to_numpy()
+    has_mark = is_option & marks["Mark"].notna().to_numpy()
+    price = np.where(has_mark, marks["Mark"].to_numpy(dtype=float), greeks["Precio"].to_numpy(dtype=float))
+
+    contracts = pd.to_numeric(legs["Contratos"], errors="coerce").fillna(0.0).to_numpy(dtype=float)
+    is_sell = (legs["Side"] == "Sell").to_numpy()
+    size = np.where(is_sell, -1.0, 1.0) * contracts * 100.0
+    prima = pd.to_numeric(legs["PrimaRecibida"], errors="coerce").fillna(0.0).to_numpy(dtype=float)
+    strike = pd.to_numeric(legs["Strike"], errors="coerce").fillna(0.0).to_numpy(dtype=float)
+    # Caja de apertura: las vendidas cobran prima y las compradas la pagan; las acciones se compraron al strike
+    entry = np.where(is_option, np.where(is_sell, prima, -prima) * contracts * 100.0, -strike * size)
+
+    per_leg = pd.DataFrame({
+        "ChainID": legs["ChainID"].to_numpy(),
+        "Ticker": legs["Ticker"].to_numpy(),
+        "Spot": greeks["Spot"].to_numpy(dtype=float),
+        "Valor": price * size,
+        "Entrada": entry,
+        "Acciones": np.where(is_option, 0.0, size),
+        "Teorica": is_option & ~has_mark & ~np.isnan(price),
+        "SinPrecio": np.isnan(price),
+        "MarkTs": pd.to_datetime(marks["Ts"].where(has_mark), errors="coerce").to_numpy(),
+    })
+    chains = per_leg.groupby("ChainID", sort=False).agg(
+        Ticker=("Ticker", "first"), Spot=("Spot", "first"), Valor=("Valor", "sum"), Entrada=("Entrada", "sum"),
+        Acciones=("Acciones", "sum"), PatasTeoricas=("Teorica", "sum"), SinPrecio=("SinPrecio", "any"),
+        MarkTs=("MarkTs", "max"),
+    )
+    summary = chain_table.set_index("ChainID")[[
+        "payoff_premium", "qty_active", "max_profit", "calculated_be", "calculated_be_upper", "is_dual_be",
+        "is_stock_position", "is_cc_rueda",
+    ]]
+    table = chains.join(summary, how="inner")
+    if table.empty:
+        return pd.DataFrame(columns=MTM_COLUMNS)
+
+    spot = table["Spot"]
+    value = table["Valor"].where(~table["SinPrecio"])
+    qty_usd = table["qty_active"].astype(float) * 100.0
+    stock, cc_rueda = table["is_stock_position"].astype(bool), table["is_cc_rueda"].astype(bool)
+    unrealized = table["Entrada"] + value
+    campaign = (table["payoff_premium"] * qty_usd + value).where(~stock, value - table["calculated_be"] * table["Acciones"])
+    max_profit = pd.to_numeric(table["max_profit"], errors="coerce").astype(float)
+    max_profit_usd = (max_profit * qty_usd).where(np.isfinite(max_profit) & (max_profit > 0))
+    max_profit_usd = max_profit_usd.where(~cc_rueda, table["Entrada"].where(table["Entrada"] > 0))
+
+    # Break Even más cercano al spot y zona de beneficio al vencimiento (payoff de las patas en el spot)
+    lower = table["calculated_be"].astype(float)
+    upper = table["calculated_be_upper"].astype(float).where(table["is_dual_be"].astype(bool) & (table["calculated_be_upper"] > 0))
+    nearest = upper.where(upper.notna() & ((spot - upper).abs() < (spot - lower).abs()), lower).where(lambda be: be > 0)
+    in_profit = pd.Series(spot >= lower, index=table.index).where(~cc_rueda, spot <= lower)
+    option_ids = table.index[~stock & ~cc_rueda & spot.notna()]
+    if len(option_ids):
+        prep = _prepare_legs(legs[legs["ChainID"].isin(option_ids)])
+        at_spot = _chain_pnl(prep, _per_chain(spot, prep["chains"])[:, None],
+                             np.nan_to_num(_per_chain(table["payoff_premium"], prep["chains"])))
+        in_profit.loc[prep["chains"]] = at_spot[:, 0] >= 0
+    distance = (spot - nearest).abs() / spot * 100.0
+
+    return pd.DataFrame({
+        "Ticker": table["Ticker"],
+        "Spot": spot,
+        "ValorActual": value,
+        "PnLNoRealizado": unrealized,
+        "PnLCampaña": campaign,
+        "MaxBeneficioUSD": max_profit_usd,
+        "PctMaxBeneficio": campaign.where(~cc_rueda, unrealized) / max_profit_usd * 100.0,
+        "BECercano": nearest,
+        "DistBEPct": distance.where(in_profit.astype(bool), -distance),
+        "PatasTeoricas": table["PatasTeoricas"].astype(int),
+        "MarkTs": table["MarkTs"],
+    }, index=pd.Index(table.index, name="ChainID"))
+
+
+def mark_to_market_totals(mtm: pd.DataFrame) -> dict:
+    """Totales de cartera de mark_to_market (sólo cadenas valoradas)."""
+    valued = mtm[mtm["ValorActual"].notna()]
+    bounded = valued[valued["MaxBeneficioUSD"].notna()]
+    max_profit = float(bounded["MaxBeneficioUSD"].sum())
+    captured = float((bounded["PctMaxBeneficio"] * bounded["MaxBeneficioUSD"]).sum()) / 100.0
+    return {
+        "valoradas": len(valued),
+        "sin_valorar": len(mtm) - len(valued),
+        "pnl_no_realizado": float(valued["PnLNoRealizado"].sum()),
+        "pnl_campana": float(valued["PnLCampaña"].sum()),
+        "pct_max_beneficio": captured / max_profit * 100.0 if max_profit > 0 else np.nan,
+        "bajo_be": int((valued["DistBEPct"] < 0).sum()),
+        "patas_teoricas": int(valued["PatasTeoricas"].sum()),
+        "ultimo_mark": valued["MarkTs"].dropna().max() if valued["MarkTs"].notna().any() else None,
+    }
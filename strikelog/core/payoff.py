@@ -0,0 +1,162 @@
+"""
+Motor de payoff numérico: PnL al vencimiento de cualquier combinación de patas (lado, tipo,
+strike, contratos, prima neta) sobre una rejilla de precios vectorizada. Los Break Evens se
+obtienen por acotación de raíces y se devuelven también el beneficio y la pérdida máximos.
+
+Las patas con vencimiento posterior al más cercano de su cadena (Calendar, Diagonal, Flyagonal)
+se valoran con Black-Scholes en esa fecha; el resto cuenta su valor intrínseco, así que para
+cadenas de un solo vencimiento el resultado es exacto (los strikes son nodos de la rejilla).
+"""
+import numpy as np
+import pandas as pd
+
+from .config import DEFAULT_IV
+from .pricing import black_scholes
+
+PAYOFF_GRID_POINTS = 256   # Puntos de la rejilla uniforme por cadena (además de los strikes)
+PAYOFF_GRID_SPAN = 2.0     # La rejilla cubre [0, PAYOFF_GRID_SPAN × strike máximo]
+_EPS = 1e-9
+
+PAYOFF_COLUMNS = ["BE_Lower", "BE_Upper", "BreakEvens", "MaxProfit", "MaxLoss"]
+
+
+def _leg_frame(legs) -> pd.DataFrame:
+    """Patas (lista de dicts del formulario o DataFrame del journal) con las columnas del motor."""
+    frame = legs.copy() if isinstance(legs, pd.DataFrame) else pd.DataFrame(list(legs))
+    if "OptionType" not in frame.columns:
+        frame["OptionType"] = frame["Type"] if "Type" in frame.columns else "Put"
+    elif "Type" in frame.columns:
+        frame["OptionType"] = frame["OptionType"].fillna(frame["Type"])
+    defaults = {"ChainID": 0, "Side": "Sell", "Strike": 0.0, "Contratos": 1.0, "Expiry": pd.NaT, "IV": np.nan}
+    for col, default in defaults.items():
+        if col not in frame.columns:
+            frame[col] = default
+    frame["Strike"] = pd.to_numeric(frame["Strike"], errors="coerce").fillna(0.0)
+    contracts = pd.to_numeric(frame["Contratos"], errors="coerce").fillna(1.0)
+    frame["Contratos"] = contracts.where(contracts > 0, 1.0)
+    frame["Expiry"] = pd.to_datetime(frame["Expiry"], errors="coerce")
+    return frame.reset_index(drop=True)
+
+
+def _per_chain(values, chains) -> np.ndarray:
+    """Escalar, dict o Series indexada por ChainID -> array alineado con `chains` (NaN si falta)."""
+    if isinstance(values, (dict, pd.Series)):
+        return pd.Series(values, dtype=float).reindex(chains).to_numpy(dtype=float)
+    return np.full(len(chains), float(values))
+
+
+def _prepare_legs(legs) -> dict:
+    """Arrays por pata (ordenadas por cadena) que comparten el motor de payoff y el de POP."""
+    frame = _leg_frame(legs)
+    frame = frame.sort_values("ChainID", kind="stable").reset_index(drop=True)
+    chain_codes, chains = pd.factorize(frame["ChainID"], sort=False)
+    starts = np.flatnonzero(np.r_[True, chain_codes[1:] != chain_codes[:-1]])
+    contracts = frame["Contratos"].to_numpy(dtype=float)
+    opt_type = frame["OptionType"].to_numpy()
+    # Vencimiento de referencia: el más cercano de cada cadena; las patas posteriores conservan tiempo
+    front = frame["Expiry"].groupby(chain_codes).transform("min")
+    return {
+        "frame": frame,
+        "chains": chains,
+        "chain_codes": chain_codes,
+        "starts": starts,
+        "strike": frame["Strike"].to_numpy(dtype=float),
+        "sign": np.where((frame["Side"] == "Sell").to_numpy(), -1.0, 1.0),
+        "weight": contracts / contracts[starts][chain_codes],
+        "is_call": opt_type == "Call",
+        "is_stock": opt_type == "Stock",
+        "front": front.iloc[starts].to_numpy(),
+        "t_rem": (frame["Expiry"] - front).dt.days.fillna(0).to_numpy(dtype=float) / 365.0,
+        "iv": frame["IV"].fillna(DEFAULT_IV).to_numpy(dtype=float),
+    }
+
+
+def _chain_pnl(prep: dict, prices: np.ndarray, net: np.ndarray) -> np.ndarray:
+    """PnL por acción de cada cadena (fila) en el vencimiento más cercano para cada precio (columna)."""
+    codes, strike, is_call, is_stock = prep["chain_codes"], prep["strike"], prep["is_call"], prep["is_stock"]
+    leg_prices = prices[codes]
+    # Valor intrínseco: max(±(S − K), 0) para opciones; S − K para acciones
+    value = (leg_prices - strike[:, None]) * np.where(is_call | is_stock, 1.0, -1.0)[:, None]
+    options = ~is_stock
+    if options.all():
+        np.maximum(value, 0.0, out=value)
+    else:
+        value[options] = np.maximum(value[options], 0.0)
+    later = (prep["t_rem"] > 0) & ~is_stock
+    if later.any():
+        value[later] = black_scholes(leg_prices[later], strike[later, None], prep["t_rem"][later, None],
+                                     prep["iv"][later, None], is_call[later, None])["price"]
+    return np.add.reduceat(value * (prep["sign"] * prep["weight"])[:, None], prep["starts"], axis=0) + net[:, None]
+
+
+def payoff_table(legs, net_premium=0.0, grid_points: int = PAYOFF_GRID_POINTS) -> pd.DataFrame:
+    """
+    Break Evens, beneficio máximo y pérdida máxima de todas las cadenas de `legs` a la vez.
+
+    legs: DataFrame (o lista de dicts) con Side, OptionType/Type, Strike y opcionalmente ChainID,
+    Contratos, Expiry e IV. net_premium: prima neta por acción con signo (+ crédito, − débito) por
+    contrato de la primera pata de cada cadena; escalar, dict o Series indexada por ChainID.
+
+    Devuelve un DataFrame indexado por ChainID: BE_Lower / BE_Upper (0.0 si no existen),
+    BreakEvens (tupla ordenada), MaxProfit y MaxLoss por acción (inf si no tienen límite).
+    """
+    if len(legs) == 0:
+        return pd.DataFrame(columns=PAYOFF_COLUMNS)
+    prep = _prepare_legs(legs)
+    chains, chain_codes, starts, strike = prep["chains"], prep["chain_codes"], prep["starts"], prep["strike"]
+    n_chains, n_legs = len(chains), len(strike)
+    net = np.nan_to_num(_per_chain(net_premium, chains))
+
+    # Rejilla por cadena: puntos uniformes + los strikes propios (nodos exactos de los codos)
+    max_strike = np.maximum.reduceat(strike, starts)
+    upper = np.where(max_strike > 0, max_strike * PAYOFF_GRID_SPAN, 1.0)
+    uniform = np.linspace(0.0, 1.0, grid_points)[None, :] * upper[:, None]
+    rank = np.arange(n_legs) - starts[chain_codes]
+    knots = np.repeat(upper[:, None], np.diff(np.r_[starts, n_legs]).max(), axis=1)
+    knots[chain_codes, rank] = strike
+    grid = np.sort(np.concatenate([uniform, knots], axis=1), axis=1)
+    pnl = _chain_pnl(prep, grid, net)
+
+    # Pendiente más allá del último strike: calls y acciones suman ±1 por unidad
+    tail_slope = np.add.reduceat(
+        np.where(prep["is_call"] | prep["is_stock"], prep["sign"] * prep["weight"], 0.0), starts)
+
+    # Acotación de raíces: cambios de signo entre nodos consecutivos, interpolación lineal
+    profit = pnl >= -_EPS
+    rows, cols = np.nonzero(profit[:, 1:] != profit[:, :-1])
+    x0, x1 = grid[rows, cols], grid[rows, cols + 1]
+    p0, p1 = pnl[rows, cols], pnl[rows, cols + 1]
+    roots = np.round(x0 - p0 * (x1 - x0) / (p1 - p0), 4)
+
+    # Raíz en la cola lineal, más allá de la rejilla
+    last_x, last_p = grid[:, -1], pnl[:, -1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tail_root = last_x - last_p / tail_slope
+    has_tail = (np.abs(tail_slope) > _EPS) & (last_p * tail_slope < -_EPS)
+    rows = np.concatenate([rows, np.flatnonzero(has_tail)])
+    roots = np.concatenate([roots, np.round(tail_root[has_tail], 4)])
+
+    order = np.lexsort((roots, rows))
+    breakevens = [()] * n_chains
+    for chain, chain_roots in pd.Series(roots[order]).groupby(rows[order]):
+        breakevens[chain] = tuple(dict.fromkeys(chain_roots.tolist()))
+
+    max_profit = np.where(tail_slope > _EPS, np.inf, np.round(pnl.max(axis=1), 4))
+    max_loss = np.where(tail_slope < -_EPS, np.inf, np.round(-pnl.min(axis=1), 4))
+    valid = max_strike > 0
+    return pd.DataFrame({
+        "BE_Lower": [be[0] if be and ok else 0.0 for be, ok in zip(breakevens, valid)],
+        "BE_Upper": [be[-1] if len(be) >= 2 and ok else 0.0 for be, ok in zip(breakevens, valid)],
+        "BreakEvens": [be if ok else () for be, ok in zip(breakevens, valid)],
+        "MaxProfit": np.where(valid, max_profit, np.nan),
+        "MaxLoss": np.where(valid, max_loss, np.nan),
+    }, index=pd.Index(chains, name="ChainID"))
+
+
+def payoff_profile(legs, net_premium: float = 0.0) -> dict:
+    """Break Evens, beneficio máximo y pérdida máxima (por acción) de una sola combinación de patas."""
+    table = payoff_table([{**leg, "ChainID": 0} for leg in legs], net_premium)
+    if table.empty:
+        return {"breakevens": (), "max_profit": np.nan, "max_loss": np.nan}
+    row = table.iloc[0]
+    return {"breakevens": row["BreakEvens"], "max_profit": row["MaxProfit"], "max_loss": row["MaxLoss"]}
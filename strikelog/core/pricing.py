@@ -0,0 +1,271 @@
+"""
+Valoración Black-Scholes vectorizada (precio, delta, gamma, theta, vega) de todas las patas
+abiertas en una sola pasada NumPy, con fuente de cotizaciones (spot / IV) intercambiable.
+"""
+import os
+import json
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from .config import DEFAULT_IV, QUOTES_FILE, RISK_FREE_RATE
+from .profiling import profiled
+
+_SQRT2 = np.sqrt(2.0)
+_INV_SQRT_2PI = 1.0 / np.sqrt(2.0 * np.pi)
+# Coeficientes de Abramowitz & Stegun 7.1.26 (error absoluto < 1.5e-7); evita depender de scipy
+_AS_P = 0.3275911
+_AS_A = (0.254829592, -0.284496736, 1.421413741, -1.453152027, 1.061405429)
+
+
+def _erf(x: np.ndarray) -> np.ndarray:
+    sign = np.sign(x)
+    x = np.abs(x)
+    t = 1.0 / (1.0 + _AS_P * x)
+    a1, a2, a3, a4, a5 = _AS_A
+    poly = ((((a5 * t + a4) * t + a3) * t + a2) * t + a1) * t
+    return sign * (1.0 - poly * np.exp(-x * x))
+
+
+def norm_cdf(x) -> np.ndarray:
+    """Función de distribución normal estándar, vectorizada."""
+    return 0.5 * (1.0 + _erf(np.asarray(x, dtype=float) / _SQRT2))
+
+
+def norm_pdf(x) -> np.ndarray:
+    x = np.asarray(x, dtype=float)
+    return _INV_SQRT_2PI * np.exp(-0.5 * x * x)
+
+
+def black_scholes(spot, strike, t_years, iv, is_call, rate: float = RISK_FREE_RATE) -> dict:
+    """
+    Precio y griegas por acción de opciones europeas (arrays del mismo tamaño o escalares).
+    theta es por día natural y vega por punto de volatilidad (1%). Con t <= 0 o iv <= 0 devuelve
+    el valor intrínseco y delta 0 / ±1.
+    """
+    spot, strike, t, iv, is_call = np.broadcast_arrays(
+        *(np.asarray(a, dtype=float) for a in (spot, strike, t_years, iv)), np.asarray(is_call, dtype=bool))
+    live = (t > 0) & (iv > 0) & (spot > 0) & (strike > 0)
+
+    # Valores seguros donde la opción ya venció: evitan divisiones por cero sin ramas por pata
+    t_s = np.where(live, t, 1.0)
+    iv_s = np.where(live, iv, 1.0)
+    spot_s = np.where(live, spot, 1.0)
+    strike_s = np.where(live, strike, 1.0)
+    sqrt_t = np.sqrt(t_s)
+    d1 = (np.log(spot_s / strike_s) + (rate + 0.5 * iv_s ** 2) * t_s) / (iv_s * sqrt_t)
+    d2 = d1 - iv_s * sqrt_t
+    disc = np.exp(-rate * t_s)
+    nd1, nd2 = norm_cdf(d1), norm_cdf(d2)
+    pdf_d1 = norm_pdf(d1)
+
+    call_price = spot_s * nd1 - strike_s * disc * nd2
+    put_price = strike_s * disc * (1.0 - nd2) - spot_s * (1.0 - nd1)
+    gamma = pdf_d1 / (spot_s * iv_s * sqrt_t)
+    vega = spot_s * pdf_d1 * sqrt_t / 100.0
+    theta_common = -spot_s * pdf_d1 * iv_s / (2.0 * sqrt_t)
+    call_theta = (theta_common - rate * strike_s * disc * nd2) / 365.0
+    put_theta = (theta_common + rate * strike_s * disc * (1.0 - nd2)) / 365.0
+
+    intrinsic = np.where(is_call, np.maximum(spot - strike, 0.0), np.maximum(strike - spot, 0.0))
+    expired_delta = np.where(intrinsic > 0, np.where(is_call, 1.0, -1.0), 0.0)
+    return {
+        "price": np.where(live, np.where(is_call, call_price, put_price), intrinsic),
+        "delta": np.where(live, np.where(is_call, nd1, nd1 - 1.0), expired_delta),
+        "gamma": np.where(live, gamma, 0.0),
+        "theta": np.where(live, np.where(is_call, call_theta, put_theta), 0.0),
+        "vega": np.where(live, vega, 0.0),
+    }
+
+
+def years_to_expiry(expiry, now=None) -> np.ndarray:
+    """Años hasta el cierre de mercado (16:00) del día de vencimiento; 0 si ya venció."""
+    now = pd.Timestamp(now or datetime.now())
+    expiry = pd.to_datetime(pd.Series(expiry), errors="coerce").dt.normalize() + pd.Timedelta(hours=16)
+    seconds = (expiry - now).dt.total_seconds().to_numpy(dtype=float, na_value=np.nan)
+    return np.clip(seconds / (365.0 * 86400.0), 0.0, None)
+
+
+# --- Fuentes de cotizaciones (spot / IV por ticker) ---
+class LocalQuoteSource:
+    """Cotizaciones introducidas a mano en un JSON local {ticker: {"spot", "iv", "ts"}} (sin red)."""
+    name = "local"
+
+    def __init__(self, path: str = QUOTES_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _read(self) -> dict:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get_quotes(self, tickers) -> dict:
+        data = self._read()
+        return {t: data[t] for t in tickers if t in data}
+
+    def set_quotes(self, quotes: dict):
+        """Añade / reemplaza {ticker: {"spot", "iv"}} y guarda con marca de tiempo."""
+        with self._lock:
+            data = self._read()
+            stamp = datetime.now().isoformat(timespec="seconds")
+            for ticker, quote in quotes.items():
+                data[ticker] = {"spot": float(quote["spot"]), "iv": float(quote.get("iv") or DEFAULT_IV), "ts": stamp}
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+            os.replace(tmp, self.path)
+
+
+class StaticQuoteSource:
+    """Cotizaciones fijas en memoria ({ticker: {"spot", "iv"}}), para pruebas y benchmarks."""
+    name = "static"
+
+    def __init__(self, quotes: dict = None):
+        self.quotes = quotes or {}
+
+    def get_quotes(self, tickers) -> dict:
+        return {t: self.quotes[t] for t in tickers if t in self.quotes}
+
+
+_QUOTE_SOURCE = {"source": LocalQuoteSource()}
+
+def set_quote_source(source):
+    """Sustituye la fuente de cotizaciones (cualquier objeto con get_quotes(tickers) -> {ticker: {spot, iv}})."""
+    _QUOTE_SOURCE["source"] = source
+
+def get_quote_source():
+    return _QUOTE_SOURCE["source"]
+
+
+GREEK_COLUMNS = ["Spot", "IV", "T", "Precio", "Delta", "Gamma", "Theta", "Vega",
+                 "PosDelta", "PosGamma", "PosTheta", "PosVega", "Valor"]
+
+
+def _leg_inputs(legs: pd.DataFrame, quotes: dict = None, now=None) -> dict:
+    """Spot, IV, strike, años al vencimiento y tamaño con signo (× contratos × 100) de cada pata."""
+    if quotes is None:
+        quotes = get_quote_source().get_quotes(legs["Ticker"].dropna().unique().tolist())
+    return {
+        "spot": legs["Ticker"].map(lambda t: (quotes.get(t) or {}).get("spot", np.nan)).to_numpy(dtype=float),
+        "iv": legs["Ticker"].map(lambda t: (quotes.get(t) or {}).get("iv") or DEFAULT_IV).to_numpy(dtype=float),
+        "strike": pd.to_numeric(legs["Strike"], errors="coerce").fillna(0.0).to_numpy(dtype=float),
+        "t": years_to_expiry(legs["Expiry"], now),
+        "is_call": (legs["OptionType"] == "Call").to_numpy(),
+        "is_stock": (legs["OptionType"] == "Stock").to_numpy(),
+        "size": np.where((legs["Side"] == "Sell").to_numpy(), -1.0, 1.0) *
+                pd.to_numeric(legs["Contratos"], errors="coerce").fillna(0.0).to_numpy(dtype=float) * 100.0,
+    }
+
+
+@profiled("Griegas (Black-Scholes)")
+def leg_greeks(legs: pd.DataFrame, quotes: dict = None, now=None) -> pd.DataFrame:
+    """
+    Griegas de cada pata (mismo índice que legs) en una sola llamada vectorizada. Las columnas
+    Pos* ya incluyen lado y tamaño (× contratos × 100, negativas si la pata está vendida):
+    PosDelta en acciones equivalentes, PosTheta en $/día, PosVega en $ por punto de IV y Valor
+    en $ de mercado. Las acciones (OptionType Stock) cuentan delta 1; sin cotización quedan NaN.
+    """
+    if legs.empty:
+        return pd.DataFrame(columns=GREEK_COLUMNS, index=legs.index, dtype=float)
+    leg = _leg_inputs(legs, quotes, now)
+    spot, iv, t, is_stock, size = leg["spot"], leg["iv"], leg["t"], leg["is_stock"], leg["size"]
+
+    bs = black_scholes(spot, leg["strike"], np.nan_to_num(t), iv, leg["is_call"])
+    price = np.where(is_stock, spot, bs["price"])
+    delta = np.where(is_stock, 1.0, bs["delta"])
+    gamma = np.where(is_stock, 0.0, bs["gamma"])
+    theta = np.where(is_stock, 0.0, bs["theta"])
+    vega = np.where(is_stock, 0.0, bs["vega"])
+    missing = np.isnan(spot)
+
+    out = pd.DataFrame({
+        "Spot": spot, "IV": iv, "T": t, "Precio": price, "Delta": delta, "Gamma": gamma,
+        "Theta": theta, "Vega": vega,
+        "PosDelta": delta * size, "PosGamma": gamma * size, "PosTheta": theta * size,
+        "PosVega": vega * size, "Valor": price * size,
+    }, index=legs.index)
+    out.loc[missing, ["Precio", "Delta", "Gamma", "Theta", "Vega", "PosDelta", "PosGamma", "PosTheta", "PosVega", "Valor"]] = np.nan
+    return out
+
+
+def portfolio_greeks(active_df: pd.DataFrame, quotes: dict = None, now=None):
+    """
+    (griegas por pata, totales por ChainID, totales de la cartera) de las patas abiertas.
+    Las cadenas o tickers sin cotización no suman en los totales (ver "sin_cotizacion").
+    """
+    legs = leg_greeks(active_df, quotes, now)
+    pos_cols = ["PosDelta", "PosGamma", "PosTheta", "PosVega", "Valor"]
+    per_chain = legs[pos_cols].groupby(active_df["ChainID"]).sum(min_count=1)
+    totals = {col: float(legs[col].sum()) for col in pos_cols}
+    totals["sin_cotizacion"] = sorted(active_df.loc[legs["Spot"].isna(), "Ticker"].dropna().unique().tolist())
+    return legs, per_chain, totals
+
+
+SCENARIO_PRICE_STEPS = 51   # Movimientos del subyacente (impar: incluye el 0%)
+SCENARIO_IV_STEPS = 21      # Desplazamientos de IV (impar: incluye el 0)
+SCENARIO_WORST_COLUMNS = ["ChainID", "Ticker", "Estrategia", "PeorPnL", "Movimiento", "ΔIV", "PnLSinCambios"]
+
+
+@profiled("Escenarios precio × IV")
+def scenario_grid(active_df: pd.DataFrame, price_moves, iv_shifts, quotes: dict = None, now=None,
+                  horizon_days: int = 0):
+    """
+    Test de estrés de las patas abiertas: cada ticker se mueve price_moves (fracción de su spot,
+    p. ej. -0.05) y su IV se desplaza iv_shifts (puntos absolutos, p. ej. +0.10), con el tiempo
+    avanzado horizon_days. Todas las patas × escenarios se revalúan en una sola llamada a
+    black_scholes.
+
+    Devuelve (cartera, peores): cartera es un DataFrame de PnL $ respecto al valor teórico actual
+    (filas = movimientos, columnas = desplazamientos de IV); peores tiene la peor celda de cada
+    cadena (SCENARIO_WORST_COLUMNS). Las patas sin cotización no participan.
+    """
+    moves = np.asarray(price_moves, dtype=float)
+    shifts = np.asarray(iv_shifts, dtype=float)
+    legs = active_df[active_df["OptionType"].isin(["Call", "Put", "Stock"])]
+    leg = _leg_inputs(legs, quotes, now)
+    quoted = ~np.isnan(leg["spot"])
+    legs = legs[quoted]
+    if legs.empty:
+        return (pd.DataFrame(0.0, index=pd.Index(moves, name="Movimiento"), columns=pd.Index(shifts, name="ΔIV")),
+                pd.DataFrame(columns=SCENARIO_WORST_COLUMNS))
+    spot, iv, strike, size = (leg[k][quoted] for k in ("spot", "iv", "strike", "size"))
+    t, is_call, is_stock = np.nan_to_num(leg["t"][quoted]), leg["is_call"][quoted], leg["is_stock"][quoted]
+
+    # Valor teórico actual (referencia del PnL) y revaluación patas × movimientos × IV
+    base = np.where(is_stock, spot, black_scholes(spot, strike, t, iv, is_call)["price"])
+    spot_s = spot[:, None, None] * (1.0 + moves[None, :, None])
+    iv_s = np.maximum(iv[:, None, None] + shifts[None, None, :], 0.01)
+    t_s = np.maximum(t - horizon_days / 365.0, 0.0)[:, None, None]
+    price = black_scholes(spot_s, strike[:, None, None], t_s, iv_s, is_call[:, None, None])["price"]
+    price = np.where(is_stock[:, None, None], spot_s, price)
+    pnl = (price - base[:, None, None]) * size[:, None, None]
+
+    portfolio = pd.DataFrame(pnl.sum(axis=0), index=pd.Index(moves, name="Movimiento"),
+                             columns=pd.Index(shifts, name="ΔIV"))
+
+    # Peor celda por cadena: suma por ChainID (patas ordenadas por cadena + reduceat) y argmin plano
+    codes, chains = pd.factorize(legs["ChainID"])
+    order = np.argsort(codes, kind="stable")
+    starts = np.flatnonzero(np.r_[True, np.diff(codes[order]) != 0])
+    chain_pnl = np.add.reduceat(pnl[order], starts, axis=0).reshape(len(chains), -1)
+    worst = chain_pnl.argmin(axis=1)
+    move_idx, shift_idx = np.unravel_index(worst, (len(moves), len(shifts)))
+    center = (np.abs(moves).argmin(), np.abs(shifts).argmin())
+    first_leg = legs.iloc[order[starts]]
+    worst_df = pd.DataFrame({
+        "ChainID": chains,
+        "Ticker": first_leg["Ticker"].to_numpy(),
+        "Estrategia": first_leg["Estrategia"].to_numpy(),
+        "PeorPnL": chain_pnl[np.arange(len(chains)), worst],
+        "Movimiento": moves[move_idx],
+        "ΔIV": shifts[shift_idx],
+        "PnLSinCambios": chain_pnl[:, center[0] * len(shifts) + center[1]],
+    }).sort_values("PeorPnL", kind="stable").reset_index(drop=True)
+    return portfolio, worst_df
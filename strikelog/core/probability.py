@@ -0,0 +1,100 @@
+"""
+Probabilidad de beneficio (POP) por Monte Carlo: precios finales lognormales a partir del spot,
+la IV y el tiempo hasta el vencimiento más cercano de cada cadena, puntuados con el mismo payoff
+que los Break Evens (payoff.py). Devuelve POP, valor esperado y probabilidad de pérdida máxima.
+"""
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from .config import DEFAULT_IV, POP_PATHS, POP_SEED, POP_TIME_BUDGET, RISK_FREE_RATE
+from .cache import LRUCache
+from .profiling import profiled
+from .pricing import get_quote_source, years_to_expiry
+from .payoff import _chain_pnl, _per_chain, _prepare_legs, payoff_table
+
+POP_COLUMNS = ["POP", "EV", "P_MaxLoss", "Rutas"]
+POP_CHUNK_ELEMENTS = 2_000_000   # Patas × rutas por bloque simulado (acota la memoria)
+MAX_LOSS_TOLERANCE = 0.01        # Una ruta "toca" la pérdida máxima si queda a menos del 1% de ella
+
+_POP_CACHE = LRUCache(16, name="POP Monte Carlo")
+
+
+def simulate_terminal_prices(spot, iv, t_years, z, rate: float = RISK_FREE_RATE) -> np.ndarray:
+    """Precios finales lognormales (neutral al riesgo): una fila por subyacente, una columna por z."""
+    spot, iv, t = (np.asarray(a, dtype=float)[:, None] for a in (spot, iv, t_years))
+    return spot * np.exp((rate - 0.5 * iv ** 2) * t + iv * np.sqrt(t) * np.asarray(z, dtype=float)[None, :])
+
+
+@profiled("POP (Monte Carlo)")
+def pop_table(legs, net_premium, spot, iv=DEFAULT_IV, now=None, paths: int = POP_PATHS,
+              seed: int = POP_SEED, time_budget: float = POP_TIME_BUDGET) -> pd.DataFrame:
+    """
+    POP (%), valor esperado (EV, $ por acción) y probabilidad de acabar en la pérdida máxima (%)
+    de cada cadena de `legs`, evaluados en su vencimiento más cercano.
+
+    legs y net_premium siguen el formato de payoff_table; spot e iv son escalares, dicts o Series
+    por ChainID (las cadenas sin spot devuelven NaN). Todas las cadenas comparten las mismas
+    normales (semilla fija + variables antitéticas), así que una cadena da lo mismo sola que en
+    lote. La simulación avanza por bloques y se detiene al agotar time_budget; "Rutas" indica
+    cuántas se usaron.
+    """
+    if len(legs) == 0:
+        return pd.DataFrame(columns=POP_COLUMNS)
+    prep = _prepare_legs(legs)
+    chains = prep["chains"]
+    net = np.nan_to_num(_per_chain(net_premium, chains))
+    spot_arr = _per_chain(spot, chains)
+    iv_arr = np.nan_to_num(_per_chain(iv, chains), nan=DEFAULT_IV)
+    t_years = np.nan_to_num(years_to_expiry(prep["front"], now))
+
+    key = (int(pd.util.hash_pandas_object(prep["frame"][["ChainID", "Side", "OptionType", "Strike", "Contratos", "Expiry"]],
+                                          index=False).sum()),
+           tuple(net), tuple(np.nan_to_num(spot_arr, nan=-1.0)), tuple(iv_arr), tuple(t_years.round(6)),
+           paths, seed, now or date.today())
+    cached = _POP_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    has_spot = np.isfinite(spot_arr) & (spot_arr > 0)
+    max_loss = payoff_table(legs, pd.Series(net, index=chains))["MaxLoss"].reindex(chains).to_numpy(dtype=float)
+    loss_floor = np.where(np.isfinite(max_loss) & (max_loss > 0), -max_loss * (1 - MAX_LOSS_TOLERANCE), -np.inf)
+
+    rng = np.random.default_rng(seed)
+    chunk = max(2, min(paths, POP_CHUNK_ELEMENTS // len(prep["strike"]))) // 2 * 2
+    wins = np.zeros(len(chains))
+    pnl_sum = np.zeros(len(chains))
+    max_loss_hits = np.zeros(len(chains))
+    done = 0
+    start = time.perf_counter()
+    while done < paths and (done == 0 or time.perf_counter() - start < time_budget):
+        half = rng.standard_normal(min(chunk, paths - done) // 2 or 1)
+        z = np.concatenate([half, -half])  # Antitéticas: media exacta de z y menos varianza
+        prices = simulate_terminal_prices(np.where(has_spot, spot_arr, 1.0), iv_arr, t_years, z)
+        pnl = _chain_pnl(prep, prices, net)
+        wins += (pnl > 0).sum(axis=1)
+        pnl_sum += pnl.sum(axis=1)
+        max_loss_hits += (pnl <= loss_floor[:, None]).sum(axis=1)
+        done += len(z)
+
+    table = pd.DataFrame({
+        "POP": np.where(has_spot, wins / done * 100, np.nan),
+        "EV": np.where(has_spot, pnl_sum / done, np.nan),
+        "P_MaxLoss": np.where(has_spot & np.isfinite(loss_floor), max_loss_hits / done * 100, np.nan),
+        "Rutas": done,
+    }, index=pd.Index(chains, name="ChainID"))
+    return _POP_CACHE.put(key, table)
+
+
+def portfolio_pop(active_df: pd.DataFrame, net_premium, quotes: dict = None, now=None) -> pd.DataFrame:
+    """POP de las cadenas abiertas con el spot / IV de la fuente de cotizaciones activa (NaN sin cotización)."""
+    if active_df.empty:
+        return pd.DataFrame(columns=POP_COLUMNS)
+    if quotes is None:
+        quotes = get_quote_source().get_quotes(active_df["Ticker"].dropna().unique().tolist())
+    chain_ticker = active_df.groupby("ChainID")["Ticker"].first()
+    spot = chain_ticker.map(lambda t: (quotes.get(t) or {}).get("spot", np.nan))
+    iv = chain_ticker.map(lambda t: (quotes.get(t) or {}).get("iv") or DEFAULT_IV)
+    return pop_table(active_df, net_premium, spot, iv, now)
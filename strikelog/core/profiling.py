@@ -0,0 +1,161 @@
+"""
+Perfilado por secciones de cada ejecución del script (un rerun de Streamlit).
+
+La UI abre un RenderProfile por rerun con render_profile(); las rutas calientes del núcleo y las
+páginas marcan sus tramos con profile_section() / @profiled. Sin un perfil activo en el hilo,
+ambos son prácticamente gratuitos (no miden nada).
+"""
+import os
+import time
+import cProfile
+import threading
+import functools
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+from .cache import cache_stats
+
+_ACTIVE = threading.local()
+
+
+class RenderProfile:
+    """Tiempos agregados por sección (ms, llamadas, filas) y aciertos de caché de una ejecución."""
+
+    def __init__(self, label: str = "", dump_dir: str = None):
+        self.label = label
+        self.dump_dir = dump_dir
+        self.dump_path = None
+        self.interrupted = False
+        self.sections = {}  # nombre -> {"ms", "calls", "rows", "depth"}; el orden es el de aparición
+        self.total_ms = None
+        self._stack = []
+        self._cache_start = cache_stats()
+        self._cache_end = None
+        self._start = time.perf_counter()
+        self._profiler = None
+        if dump_dir:
+            self._profiler = cProfile.Profile()
+            try:
+                self._profiler.enable()
+            except ValueError:  # Otro perfilador (depurador, cobertura) ya ocupa el hook
+                self._profiler = None
+
+    def _entry(self, name: str, depth: int = 0) -> dict:
+        return self.sections.setdefault(name, {"ms": 0.0, "calls": 0, "rows": 0, "depth": depth})
+
+    def record(self, name: str, ms: float, rows=None, depth: int = 0):
+        entry = self._entry(name, depth)
+        entry["ms"] += ms
+        entry["calls"] += 1
+        if rows is not None:
+            entry["rows"] += int(rows)
+
+    def elapsed_ms(self) -> float:
+        return self.total_ms if self.total_ms is not None else (time.perf_counter() - self._start) * 1000
+
+    def finish(self, interrupted: bool = False):
+        """Cierra el perfil; si cProfile estaba activo, vuelca las estadísticas a dump_dir."""
+        if self.total_ms is not None:
+            return
+        self.total_ms = (time.perf_counter() - self._start) * 1000
+        self.interrupted = interrupted
+        self._cache_end = cache_stats()
+        if self._profiler is not None:
+            self._profiler.disable()
+            os.makedirs(self.dump_dir, exist_ok=True)
+            stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+            slug = "".join(c if c.isalnum() else "_" for c in self.label).strip("_") or "rerun"
+            self.dump_path = os.path.join(self.dump_dir, f"{stamp}_{slug}.pstats")
+            self._profiler.dump_stats(self.dump_path)
+            self._profiler = None
+
+    def sections_frame(self) -> pd.DataFrame:
+        """Tabla de secciones (sangrada según el anidamiento) lista para st.dataframe."""
+        rows = [
+            {
+                "Sección": " " * entry["depth"] + name,
+                "Llamadas": entry["calls"],
+                "ms": round(entry["ms"], 1),
+                "Filas": entry["rows"] or None,
+            }
+            for name, entry in self.sections.items()
+        ]
+        return pd.DataFrame(rows, columns=["Sección", "Llamadas", "ms", "Filas"]).astype({"Filas": "Int64"})
+
+    def cache_frame(self) -> pd.DataFrame:
+        """Aciertos / fallos de cada caché durante esta ejecución (sólo las que se consultaron)."""
+        end = self._cache_end if self._cache_end is not None else cache_stats()
+        rows = []
+        for name, (hits, misses) in end.items():
+            hits0, misses0 = self._cache_start.get(name, (0, 0))
+            if hits - hits0 or misses - misses0:
+                rows.append({"Caché": name, "Aciertos": hits - hits0, "Fallos": misses - misses0})
+        return pd.DataFrame(rows, columns=["Caché", "Aciertos", "Fallos"])
+
+
+def current_profile():
+    """Perfil activo en el hilo actual (None fuera de render_profile)."""
+    return getattr(_ACTIVE, "profile", None)
+
+
+@contextmanager
+def render_profile(label: str = "", dump_dir: str = None):
+    """
+    Perfila el bloque como una ejecución completa. Si el bloque termina con una excepción
+    (p. ej. el rerun que sigue a un guardado) el perfil queda marcado como interrumpido.
+    """
+    profile = RenderProfile(label, dump_dir)
+    previous = current_profile()
+    _ACTIVE.profile = profile
+    try:
+        yield profile
+    except BaseException:
+        profile.finish(interrupted=True)
+        raise
+    else:
+        profile.finish()
+    finally:
+        _ACTIVE.profile = previous
+
+
+@contextmanager
+def profile_section(name: str, rows=None):
+    """
+    Mide el bloque como la sección `name` del perfil activo. Devuelve un dict cuyo campo "rows"
+    se puede rellenar dentro del bloque si el número de filas sólo se conoce al final.
+    """
+    info = {"rows": rows}
+    profile = current_profile()
+    if profile is None:
+        yield info
+        return
+    depth = len(profile._stack)
+    profile._entry(name, depth)  # Registrada al abrirse: la tabla sigue el orden de ejecución
+    profile._stack.append(name)
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        profile._stack.pop()
+        profile.record(name, (time.perf_counter() - start) * 1000, info["rows"], depth)
+
+
+def profiled(name: str = None):
+    """Decorador: perfila cada llamada; filas = las del primer DataFrame recibido (o del devuelto)."""
+    def decorator(fn):
+        section = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if current_profile() is None:
+                return fn(*args, **kwargs)
+            frame = next((a for a in (*args, *kwargs.values()) if isinstance(a, pd.DataFrame)), None)
+            with profile_section(section, rows=len(frame) if frame is not None else None) as info:
+                result = fn(*args, **kwargs)
+                if frame is None and isinstance(result, pd.DataFrame):
+                    info["rows"] = len(result)
+                return result
+        return wrapper
+    return decorator
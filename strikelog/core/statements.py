@@ -0,0 +1,412 @@
+"""
+Importación de extractos del broker: lectura en streaming de actividad en texto pegado o CSV,
+símbolos de opción (OCC, "NFLX 06/18/2026 85.00 P", "NFLX 18JUN26 85 P"), emparejado FIFO de
+aperturas y cierres en patas y cadenas, y detección de rolls (cierre + apertura el mismo día).
+"""
+import re
+import csv
+import hashlib
+import itertools
+from collections import deque
+from datetime import datetime
+from uuid import uuid4
+
+import pandas as pd
+
+from .config import COLUMNS
+from .accounting import calculate_pnl_metrics, detect_strategy_direction, detect_strategy_from_legs, suggest_breakeven
+from .profiling import profiled
+
+# Acción del extracto -> (Side de la orden, efecto)
+STATEMENT_ACTIONS = {
+    "sell to open": ("Sell", "open"), "sto": ("Sell", "open"),
+    "buy to open": ("Buy", "open"), "bto": ("Buy", "open"),
+    "buy to close": ("Buy", "close"), "btc": ("Buy", "close"),
+    "sell to close": ("Sell", "close"), "stc": ("Sell", "close"),
+    "expired": (None, "expire"), "expiration": (None, "expire"),
+    "assigned": (None, "assign"), "assignment": (None, "assign"),
+}
+# Dentro de un mismo día se aplican primero los cierres (un roll cierra y luego abre)
+_EFFECT_ORDER = {"expire": 0, "assign": 0, "close": 0, "open": 1}
+
+_DATE_TOKEN_RE = re.compile(r"^(\d{1,2}/\d{1,2}/\d{4})(?:\s+as of\s+\d{1,2}/\d{1,2}/\d{4})?$", re.IGNORECASE)
+_MONEY_RE = re.compile(r"^\(?-?\$?-?[\d,]*\.?\d+\)?$")
+_SYMBOL_PATTERNS = [
+    # Schwab / Tradier: NFLX 06/18/2026 85.00 P
+    re.compile(r"^(?P<ticker>[A-Z][A-Z.]{0,5})\s+(?P<mm>\d{2})/(?P<dd>\d{2})/(?P<yyyy>\d{4})\s+(?P<strike>\d+(?:\.\d+)?)\s+(?P<cp>[PC])$"),
+    # OCC: NFLX  260618P00085000 (strike x1000 en 8 dígitos)
+    re.compile(r"^(?P<ticker>[A-Z][A-Z.]{0,5})\s*(?P<yy>\d{2})(?P<mm>\d{2})(?P<dd>\d{2})(?P<cp>[PC])(?P<occ_strike>\d{8})$"),
+    # IB: NFLX 18JUN26 85 P
+    re.compile(r"^(?P<ticker>[A-Z][A-Z.]{0,5})\s+(?P<dd>\d{2})(?P<mon>[A-Z]{3})(?P<yy>\d{2})\s+(?P<strike>\d+(?:\.\d+)?)\s+(?P<cp>[PC])$"),
+]
+
+# Cabeceras CSV reconocidas (en minúsculas) para cada campo
+_CSV_FIELDS = {
+    "date": ["date", "fecha", "date/time", "datetime", "tradedate", "trade date"],
+    "action": ["action", "acción", "accion"],
+    "code": ["code", "open/closeindicator"],
+    "symbol": ["symbol", "símbolo", "simbolo"],
+    "description": ["description", "descripción", "descripcion"],
+    "qty": ["quantity", "qty", "cantidad"],
+    "price": ["price", "t. price", "tradeprice", "precio"],
+    "fees": ["fees & comm", "fees", "comm/fee", "commission", "ibcommission", "comisiones"],
+    "amount": ["amount", "proceeds", "netcash", "importe"],
+}
+
+
+def parse_option_symbol(text):
+    """
+    Devuelve {"Ticker", "Expiry", "Strike", "OptionType"} para un símbolo de opción en formato
+    OCC, Schwab/Tradier o IB; None si el texto no es una opción reconocible.
+    """
+    if not isinstance(text, str):
+        return None
+    text = " ".join(text.strip().upper().split())
+    for pattern in _SYMBOL_PATTERNS:
+        m = pattern.match(text)
+        if not m:
+            continue
+        g = m.groupdict()
+        try:
+            if g.get("yyyy"):
+                expiry = datetime(int(g["yyyy"]), int(g["mm"]), int(g["dd"]))
+            elif g.get("mon"):
+                expiry = datetime.strptime(f"{g['dd']}{g['mon']}{g['yy']}", "%d%b%y")
+            else:
+                expiry = datetime(2000 + int(g["yy"]), int(g["mm"]), int(g["dd"]))
+        except ValueError:
+            return None
+        strike = int(g["occ_strike"]) / 1000 if g.get("occ_strike") else float(g["strike"])
+        return {
+            "Ticker": g["ticker"], "Expiry": pd.Timestamp(expiry), "Strike": strike,
+            "OptionType": "Put" if g["cp"] == "P" else "Call",
+        }
+    return None
+
+
+def _parse_money(text) -> float:
+    """'$1,234.56', '-$834.66' o '($834.66)' -> float (0.0 si está vacío)."""
+    text = str(text or "").strip()
+    if not text:
+        return 0.0
+    negative = text.startswith("(") or "-" in text
+    value = float(re.sub(r"[^\d.]", "", text) or 0.0)
+    return -value if negative else value
+
+
+def _num(value) -> float:
+    return float(value) if pd.notna(value) else 0.0
+
+
+def _parse_date(text):
+    text = str(text or "").strip()
+    m = _DATE_TOKEN_RE.match(text)
+    if m:
+        return pd.Timestamp(datetime.strptime(m.group(1), "%m/%d/%Y"))
+    try:
+        return pd.Timestamp(pd.to_datetime(text.replace(",", " ")).normalize())
+    except (ValueError, TypeError):
+        return None
+
+
+def _make_fill(fecha, action_text, symbol_text, qty, price, fees, amount, code=""):
+    """Fill normalizado o None si la línea no es una operación de opciones reconocible."""
+    option = parse_option_symbol(symbol_text)
+    if option is None or fecha is None:
+        return None
+    action = STATEMENT_ACTIONS.get(" ".join(str(action_text or "").lower().split()))
+    if action is None and code:
+        # IB: código O / C y cantidad con signo (negativa = venta)
+        effect = "open" if "O" in code.upper() else "close" if "C" in code.upper() else None
+        action = ("Sell" if qty < 0 else "Buy", effect) if effect else None
+    if action is None:
+        return None
+    side, effect = action
+    qty = abs(int(round(qty)))
+    if qty == 0:
+        return None
+    return {
+        "Fecha": fecha, "Accion": str(action_text or code).strip(), "Simbolo": " ".join(str(symbol_text).split()),
+        "Side": side, "Efecto": effect, **option, "Contratos": qty, "Precio": abs(price),
+        "Comisiones": abs(fees), "Importe": amount,
+    }
+
+
+def _iter_text_fills(tokens):
+    """Actividad pegada desde la web del broker: una fecha abre cada registro (acción, símbolo, números)."""
+    record = None
+    for token in itertools.chain(tokens, [None]):
+        if token is None or _DATE_TOKEN_RE.match(token):
+            if record and len(record["fields"]) >= 2:
+                action, symbol = record["fields"][0], record["fields"][1]
+                nums = [_parse_money(t) for t in record["fields"][2:] if _MONEY_RE.match(t)]
+                qty, price, fees, amount = (nums + [0.0] * 4)[:4]
+                fill = _make_fill(_parse_date(record["date"]), action, symbol, qty, price, fees, amount)
+                if fill:
+                    yield fill
+            record = {"date": token, "fields": []} if token is not None else None
+        elif record is not None:
+            record["fields"].append(token)
+
+
+def _iter_csv_fills(header, rows):
+    columns = [h.strip().lower() for h in header]
+    pos = {field: next((columns.index(a) for a in aliases if a in columns), None) for field, aliases in _CSV_FIELDS.items()}
+
+    def get(row, field):
+        i = pos[field]
+        return row[i] if i is not None and i < len(row) else ""
+
+    for row in rows:
+        if not row:
+            continue
+        symbol = get(row, "symbol")
+        if parse_option_symbol(symbol) is None:
+            symbol = get(row, "description")
+        fill = _make_fill(
+            _parse_date(get(row, "date")), get(row, "action"), symbol, _parse_money(get(row, "qty")),
+            _parse_money(get(row, "price")), _parse_money(get(row, "fees")), _parse_money(get(row, "amount")),
+            code=get(row, "code"),
+        )
+        if fill:
+            yield fill
+
+
+def iter_statement_fills(lines):
+    """
+    Fills de opciones de un extracto, leídos en streaming (memoria constante) desde cualquier
+    iterable de líneas: fichero abierto, st.file_uploader envuelto en texto o texto.splitlines().
+    Detecta CSV por la cabecera; si no, interpreta la actividad pegada separada por tabuladores.
+    """
+    lines = iter(lines)
+    for first in lines:
+        if first.strip():
+            break
+    else:
+        return
+    first = first.lstrip("﻿")
+    header = next(csv.reader([first]))
+    if len(header) > 2 and any(h.strip().lower() in _CSV_FIELDS["symbol"] + _CSV_FIELDS["description"] for h in header):
+        yield from _iter_csv_fills(header, csv.reader(lines))
+        return
+    tokens = (t.strip() for line in itertools.chain([first], lines) for t in line.rstrip("\r\n").split("\t"))
+    yield from _iter_text_fills(t for t in tokens if t)
+
+
+def _fill_id(fill, occurrence: int) -> str:
+    """ID determinista de la pata abierta por un fill: reimportar el mismo extracto no la duplica."""
+    key = f"{fill['Fecha']:%Y-%m-%d}|{fill['Accion']}|{fill['Simbolo']}|{fill['Contratos']}|{fill['Precio']}|{fill['Importe']}|{occurrence}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:8]
+
+
+def _contract_key(ticker, expiry, strike, option_type):
+    return (str(ticker).upper(), pd.Timestamp(expiry).normalize(), round(float(strike), 4), option_type)
+
+
+@profiled("Importación de extracto")
+def pair_statement_fills(df: pd.DataFrame, fills, broker: str = "IB"):
+    """
+    Empareja los fills con el journal: cada grupo de aperturas del mismo ticker y día es una
+    cadena nueva (prima neta en la primera pata, como el formulario); los cierres consumen lotes
+    abiertos en orden FIFO, incluidas las patas abiertas que ya estaban en el journal, y cierran
+    las patas igual que el panel de gestión (parciales por contratos o por patas). Un cierre y una
+    apertura del mismo ticker el mismo día es un roll: las patas cerradas quedan "Rolada" y las
+    nuevas enlazan con ParentID.
+
+    No guarda nada: devuelve (df_actualizado, informe) para previsualizar y guardar de una vez
+    con JournalManager.save_with_backup (una sola transacción en el log).
+    """
+    report = {"fills": 0, "opened_legs": 0, "closed_legs": 0, "chains": 0, "rolls": 0,
+              "duplicates": 0, "unmatched": [], "warnings": [], "ids": []}
+    fills = sorted(fills, key=lambda f: (f["Fecha"], f["Ticker"], _EFFECT_ORDER[f["Efecto"]]))
+    report["fills"] = len(fills)
+
+    existing_ids = set(df["ID"].astype(str)) if not df.empty else set()
+    open_mask = (df["Estado"] == "Abierta") & df["OptionType"].isin(["Put", "Call"]) if not df.empty else pd.Series(dtype=bool)
+    rows = {}       # ID -> dict de la fila (abiertas del journal + nuevas)
+    new_ids = []    # Filas creadas por la importación, en orden
+    changed = set() # Filas del journal modificadas
+    lots = {}       # contrato -> deque de lotes abiertos {"id", "qty", "side", "price"}
+    opened = df[open_mask].sort_values("FechaApertura", kind="stable") if not df.empty else df
+    for row in opened.to_dict("records"):
+        rows[row["ID"]] = row
+        lots.setdefault(_contract_key(row["Ticker"], row["Expiry"], row["Strike"], row["OptionType"]), deque()).append(
+            {"id": row["ID"], "qty": int(_num(row["Contratos"])), "side": row["Side"], "price": None})
+
+    now = datetime.now().isoformat()
+    seen = {}
+    for (fecha, ticker), day_fills in itertools.groupby(fills, key=lambda f: (f["Fecha"], f["Ticker"])):
+        day_fills = list(day_fills)
+        closes = [f for f in day_fills if f["Efecto"] != "open"]
+        opens = [f for f in day_fills if f["Efecto"] == "open"]
+
+        # --- Cierres: FIFO contra los lotes abiertos del mismo contrato ---
+        matches = {}  # ChainID -> [(id, qty, lote, fill)]
+        for fill in closes:
+            queue = lots.get(_contract_key(ticker, fill["Expiry"], fill["Strike"], fill["OptionType"]), deque())
+            remaining = fill["Contratos"]
+            for lot in list(queue):
+                if remaining == 0:
+                    break
+                if fill["Side"] is not None and lot["side"] == fill["Side"]:
+                    continue
+                take = min(remaining, lot["qty"])
+                lot["qty"] -= take
+                remaining -= take
+                if lot["qty"] == 0:
+                    queue.remove(lot)
+                matches.setdefault(rows[lot["id"]]["ChainID"], []).append((lot["id"], take, lot, fill))
+            if remaining:
+                report["unmatched"].append(f"{fecha:%Y-%m-%d} {fill['Accion']} {fill['Simbolo']} x{remaining}")
+
+        closed_rows = []
+        estado_cierre = "Rolada" if opens else "Cerrada"
+        for chain_id, chain_matches in matches.items():
+            closed_rows.extend(_close_chain_legs(rows, new_ids, changed, chain_matches, fecha, estado_cierre, report))
+        if opens and closed_rows:
+            report["rolls"] += 1
+
+        # --- Aperturas: una cadena por ticker y día (fills parciales del mismo contrato se agregan) ---
+        legs = {}
+        for fill in opens:
+            occurrence = seen[_fill_id(fill, 0)] = seen.get(_fill_id(fill, 0), -1) + 1
+            leg_id = _fill_id(fill, occurrence)
+            if leg_id in existing_ids:
+                report["duplicates"] += 1
+                continue
+            key = (fill["Side"], *_contract_key(ticker, fill["Expiry"], fill["Strike"], fill["OptionType"]))
+            if key in legs:
+                leg = legs[key]
+                total = leg["Contratos"] + fill["Contratos"]
+                leg["Precio"] = (leg["Precio"] * leg["Contratos"] + fill["Precio"] * fill["Contratos"]) / total
+                leg["Contratos"] = total
+                leg["Comisiones"] += fill["Comisiones"]
+            else:
+                legs[key] = {**fill, "ID": leg_id}
+        if legs:
+            _open_chain(rows, new_ids, lots, list(legs.values()), closed_rows, fecha, broker, now, report)
+
+    if any(f["Efecto"] == "assign" for f in fills):
+        report["warnings"].append("Las asignaciones quedan como 'Asignada'; registra las acciones desde Cartera Activa (📜 Asignación).")
+
+    out = df.copy()
+    if changed:
+        positions = pd.Index(out["ID"]).get_indexer(list(changed))
+        for pos, row_id in zip(positions, changed):
+            for col in ("Contratos", "Comisiones", "Estado", "FechaCierre", "CostoCierre", "PnL_USD_Realizado",
+                        "ProfitPct", "PnL_Capital_Pct", "UpdatedAt"):
+                out.iat[pos, out.columns.get_loc(col)] = rows[row_id][col]
+    if new_ids:
+        new_df = pd.DataFrame([rows[i] for i in new_ids]).reindex(columns=COLUMNS)
+        out = new_df if out.empty else pd.concat([out.dropna(how="all", axis=1), new_df], ignore_index=True)
+    report["ids"] = list(changed) + new_ids
+    return out, report
+
+
+def _close_chain_legs(rows, new_ids, changed, chain_matches, fecha, estado, report):
+    """Cierra las patas casadas de una cadena; PnL y costo de cierre neto van en la primera pata cerrada."""
+    if any(fill["Efecto"] == "assign" for *_, fill in chain_matches):
+        estado = "Asignada"
+    closed = []
+    open_dollars = {"Sell": 0.0, "Buy": 0.0}
+    close_dollars = {"Sell": 0.0, "Buy": 0.0}  # Por Side de la pata abierta
+    priced = all(lot["price"] is not None for _, _, lot, _ in chain_matches)
+    for row_id, take, lot, fill in chain_matches:
+        row = rows[row_id]
+        total = int(_num(row["Contratos"])) or take
+        close_price = 0.0 if fill["Efecto"] in ("expire", "assign") else fill["Precio"]
+        close_fee = fill["Comisiones"] / fill["Contratos"] * take
+        if take < total:
+            # Parcial por contratos: la original conserva el resto y se crea la fila cerrada
+            comisiones = _num(row.get("Comisiones"))
+            row["Contratos"] = total - take
+            row["Comisiones"] = comisiones / total * (total - take)
+            _mark_changed(row, rows, changed, new_ids)
+            closed_row = {**row, "ID": str(uuid4())[:8], "Contratos": take,
+                          "Comisiones": comisiones / total * take + close_fee}
+            rows[closed_row["ID"]] = closed_row
+            new_ids.append(closed_row["ID"])
+        else:
+            closed_row = row
+            closed_row["Comisiones"] = _num(row.get("Comisiones")) + close_fee
+            _mark_changed(closed_row, rows, changed, new_ids)
+        closed_row.update({"Estado": estado, "FechaCierre": fecha, "CostoCierre": 0.0, "PnL_USD_Realizado": 0.0,
+                           "ProfitPct": 0.0, "PnL_Capital_Pct": 0.0, "UpdatedAt": datetime.now().isoformat()})
+        side = row["Side"] if row["Side"] in open_dollars else "Sell"
+        if priced:
+            open_dollars[side] += lot["price"] * take
+        close_dollars[side] += close_price * take
+        closed.append(closed_row)
+        report["closed_legs"] += 1
+
+    first = closed[0]
+    qty = max(int(r["Contratos"]) for r in closed)
+    strategy = first.get("Estrategia", "Custom / Other")
+    direction = detect_strategy_direction(strategy, first["Side"])
+    # Crédito: se recompra lo vendido; débito: se vende lo comprado (neto por acción)
+    if direction == "Sell":
+        close_net = (close_dollars["Sell"] - close_dollars["Buy"]) / qty
+        entry = (open_dollars["Sell"] - open_dollars["Buy"]) / qty
+    else:
+        close_net = (close_dollars["Buy"] - close_dollars["Sell"]) / qty
+        entry = (open_dollars["Buy"] - open_dollars["Sell"]) / qty
+    if not priced:
+        # Patas abiertas a mano: prima neta guardada en el journal, como el panel de gestión
+        entry = sum(_num(r.get("PrimaRecibida")) for r in closed)
+    bp = sum(_num(r.get("BuyingPower")) for r in closed)
+    comisiones = sum(float(r["Comisiones"]) for r in closed)
+    pnl, _, roc = calculate_pnl_metrics(entry, close_net, qty, strategy, bp, first["Side"], comisiones)
+    max_profit = entry * qty * 100
+    first.update({
+        "CostoCierre": round(close_net, 4), "PnL_USD_Realizado": round(pnl, 2),
+        "ProfitPct": (pnl / max_profit * 100) if max_profit > 0 else 0.0, "PnL_Capital_Pct": roc,
+    })
+    return closed
+
+
+def _mark_changed(row, rows, changed, new_ids):
+    if row["ID"] not in new_ids:
+        changed.add(row["ID"])
+
+
+def _open_chain(rows, new_ids, lots, legs, closed_rows, fecha, broker, now, report):
+    """Crea la cadena de las aperturas de un día; si hubo cierres del mismo ticker, es un roll."""
+    legs_data = [{"Side": l["Side"], "Type": l["OptionType"], "OptionType": l["OptionType"], "Strike": l["Strike"],
+                  "Contratos": l["Contratos"], "Expiry": l["Expiry"]} for l in legs]
+    strategy = detect_strategy_from_legs(legs_data) or "Custom / Other"
+    net_dollars = sum(l["Precio"] * l["Contratos"] * (1 if l["Side"] == "Sell" else -1) for l in legs)
+    direction = detect_strategy_direction(strategy, "Sell" if net_dollars >= 0 else "Buy")
+    # La pata 0 guarda la prima neta de la cadena: la primera del lado de la dirección
+    legs.sort(key=lambda l: l["Side"] != direction)
+    legs_data.sort(key=lambda l: l["Side"] != direction)
+    qty = max(l["Contratos"] for l in legs)
+    prima = (net_dollars if direction == "Sell" else -net_dollars) / qty
+    be_lower, be_upper = suggest_breakeven(strategy, legs_data, prima)
+
+    chain_id = str(uuid4())[:8]
+    for i, leg in enumerate(legs):
+        parent = None
+        if closed_rows:
+            parent = next((r for r in closed_rows if r["Side"] == leg["Side"] and r["OptionType"] == leg["OptionType"]), closed_rows[0])
+        rows[leg["ID"]] = {
+            "ID": leg["ID"], "ChainID": chain_id, "ParentID": parent["ID"] if parent else pd.NA,
+            "Ticker": leg["Ticker"], "FechaApertura": fecha, "Expiry": leg["Expiry"],
+            "Estrategia": strategy, "Setup": pd.NA, "Tags": "importado",
+            "Side": leg["Side"], "OptionType": leg["OptionType"], "Strike": leg["Strike"], "Delta": 0.0,
+            "PrimaRecibida": prima if i == 0 else 0.0, "CostoCierre": 0.0, "Contratos": leg["Contratos"],
+            "BuyingPower": 0.0, "BreakEven": be_lower, "BreakEven_Upper": be_upper, "POP": 0.0,
+            "Estado": "Abierta",
+            "Notas": (f"Roll (x{leg['Contratos']}) desde ID {parent['ID'][:4]}" if parent
+                      else f"Importado de extracto: {leg['Accion']} {leg['Simbolo']}"),
+            "UpdatedAt": now, "FechaCierre": pd.NA,
+            "MaxProfitUSD": prima * qty * 100 if i == 0 else 0.0, "ProfitPct": 0.0, "PnL_Capital_Pct": 0.0,
+            "PrecioAccionCierre": 0.0, "PnL_USD_Realizado": 0.0, "Comisiones": leg["Comisiones"],
+            "EarningsDate": pd.NA, "DividendosDate": pd.NA, "Broker": broker,
+            "WheelParentChainID": pd.NA, "CostBaseReal": 0.0, "CoveredCallChainID": pd.NA,
+            "CoveredCallPrima": 0.0, "WheelLeg": pd.NA,
+        }
+        new_ids.append(leg["ID"])
+        lots.setdefault(_contract_key(leg["Ticker"], leg["Expiry"], leg["Strike"], leg["OptionType"]), deque()).append(
+            {"id": leg["ID"], "qty": leg["Contratos"], "side": leg["Side"], "price": leg["Precio"]})
+    report["opened_legs"] += len(legs)
+    report["chains"] += 1
@@ -0,0 +1,1433 @@
+"""Persistencia del journal: log de mutaciones, snapshots deduplicados, motores SQLite / Parquet y JournalManager."""
+import pandas as pd
+import numpy as np
+import os
+import shutil
+import re
+import io
+import json
+import zlib
+import gzip
+import hashlib
+import sqlite3
+import threading
+import logging
+import itertools
+from contextlib import closing
+from datetime import date, datetime, timedelta
+from uuid import uuid4
+
+from .config import (
+    BACKUP_DIR, BACKUP_RETENTION, COLUMNS, DATE_COLUMNS, DB_FILE, FILE_NAME, INDEXED_COLUMNS,
+    INT_COLUMNS, JOURNAL_SCHEMA_VERSION, NUMERIC_COLUMNS, PARQUET_FILE, STORAGE_BACKEND,
+    WAL_ARCHIVE_FILE, WAL_ARCHIVE_MAX_BYTES, WAL_ARCHIVE_SEGMENTS, WAL_COMPACT_EVERY, WAL_FILE,
+)
+from .accounting import calculate_pnl_metrics
+from .cache import LRUCache, record_cache_event
+from .profiling import profiled
+
+
+# Avisos de error de carga / guardado. El núcleo no depende de Streamlit: la UI registra st.error.
+_LOG = logging.getLogger("strikelog")
+_ERROR_HANDLER = {"handler": _LOG.error}
+
+def set_error_handler(handler):
+    """Sustituye la función que recibe los mensajes de error del journal (p. ej. st.error)."""
+    _ERROR_HANDLER["handler"] = handler
+
+def report_error(message: str):
+    _ERROR_HANDLER["handler"](message)
+
+
+def _json_value(v):
+    """Convierte un valor de celda a un tipo serializable en JSON (nulos -> None, fechas -> texto)."""
+    if v is None:
+        return None
+    try:
+        if pd.isna(v):
+            return None
+    except (TypeError, ValueError):
+        pass
+    if isinstance(v, (pd.Timestamp, datetime, date)):
+        return pd.Timestamp(v).strftime("%Y-%m-%d %H:%M:%S")
+    if hasattr(v, "item"):
+        return v.item()
+    return v
+
+
+def _row_to_json(row: pd.Series) -> dict:
+    return {c: _json_value(row.get(c)) for c in COLUMNS}
+
+
+def diff_journal_cells(old: pd.DataFrame, new: pd.DataFrame, ids=None):
+    """
+    Compara dos versiones del journal por ID y devuelve la lista de mutaciones:
+    ("insert", ID, fila), ("delete", ID, fila_anterior) y ("set", ID, columna, anterior, nuevo).
+    UpdatedAt no cuenta como cambio. Con ids sólo se comparan esas filas (O(cambios)).
+    Si alguna versión tiene IDs duplicados o vacíos no se puede comparar fila a fila y devuelve None.
+    """
+    if ids is not None:
+        ids = list(ids)
+        old = old[old["ID"].isin(ids)]
+        new = new[new["ID"].isin(ids)]
+    if old["ID"].isna().any() or new["ID"].isna().any() or old["ID"].duplicated().any() or new["ID"].duplicated().any():
+        return None
+
+    compare_cols = [c for c in COLUMNS if c != "ID" and c != "UpdatedAt" and c in old.columns and c in new.columns]
+    old_i = old.set_index("ID")
+    new_i = new.set_index("ID")
+
+    mutations = []
+    for _, row in old[old["ID"].isin(old_i.index.difference(new_i.index))].iterrows():
+        mutations.append(("delete", row["ID"], _row_to_json(row)))
+    for _, row in new[new["ID"].isin(new_i.index.difference(old_i.index))].iterrows():
+        mutations.append(("insert", row["ID"], _row_to_json(row)))
+
+    # Nulos homogéneos (None) para que NaN / NaT / pd.NA se consideren iguales entre sí
+    common = new_i.index.intersection(old_i.index)
+    a = new_i.loc[common, compare_cols].astype(object)
+    b = old_i.loc[common, compare_cols].astype(object)
+    a = a.where(a.notna(), None).to_numpy()
+    b = b.where(b.notna(), None).to_numpy()
+    rows_idx, cols_idx = (a != b).nonzero()
+    for r, c in zip(rows_idx, cols_idx):
+        mutations.append(("set", common[r], compare_cols[c], _json_value(b[r, c]), _json_value(a[r, c])))
+    return mutations
+
+
+def journal_row_hashes(df: pd.DataFrame) -> pd.Series:
+    """Huella de 64 bits por fila (sin UpdatedAt) indexada por ID: localiza las filas que cambiaron entre dos versiones."""
+    cols = [c for c in df.columns if c != "UpdatedAt"]
+    hashes = pd.util.hash_pandas_object(df[cols], index=False).to_numpy()
+    return pd.Series(hashes, index=pd.Index(df["ID"]))
+
+
+def apply_mutations(df: pd.DataFrame, records: list) -> pd.DataFrame:
+    """Reaplica registros del log de mutaciones (en orden) sobre un DataFrame del journal."""
+    if not records:
+        return df
+    df = df.copy()
+    pos_by_id = {row_id: idx for idx, row_id in zip(df.index, df["ID"])}
+    inserted = {}
+    dropped = set()
+    for rec in records:
+        op, row_id = rec.get("op"), rec.get("id")
+        if op == "insert":
+            if row_id in pos_by_id:
+                dropped.add(pos_by_id.pop(row_id))
+            inserted[row_id] = dict(rec.get("new") or {})
+        elif op == "delete":
+            if row_id in inserted:
+                del inserted[row_id]
+            elif row_id in pos_by_id:
+                dropped.add(pos_by_id.pop(row_id))
+        elif op == "set":
+            col, value = rec.get("col"), rec.get("new")
+            if col not in COLUMNS:
+                continue
+            if row_id in inserted:
+                inserted[row_id][col] = value
+            elif row_id in pos_by_id:
+                if col in DATE_COLUMNS and value is not None:
+                    value = pd.to_datetime(value, errors="coerce")
+                try:
+                    df.at[pos_by_id[row_id], col] = value
+                except (TypeError, ValueError):
+                    df[col] = df[col].astype(object)
+                    df.at[pos_by_id[row_id], col] = value
+    if dropped:
+        df = df.drop(index=list(dropped))
+    if inserted:
+        df = pd.concat([df, pd.DataFrame(list(inserted.values()), columns=COLUMNS)], ignore_index=True)
+    return df.reset_index(drop=True)
+
+
+class MutationLog:
+    """
+    Log append-only del journal en JSON Lines: una línea por mutación
+    (tx, ts, op, id, col, old, new). Las mutaciones pendientes viven en WAL_FILE hasta
+    que se compactan a la base de datos; después pasan a WAL_ARCHIVE_FILE, que sirve
+    como historial de auditoría y para deshacer cambios. Cuando el histórico supera
+    WAL_ARCHIVE_MAX_BYTES se rota a un segmento comprimido (.gz) y sólo se conservan los
+    WAL_ARCHIVE_SEGMENTS más recientes. Los ficheros ya leídos se guardan en memoria por su
+    huella (mtime + tamaño) junto con un índice por transacción.
+    """
+
+    def __init__(self, path: str = WAL_FILE, archive_path: str = WAL_ARCHIVE_FILE):
+        self.path = path
+        self.archive_path = archive_path
+        self.trim_path = archive_path + ".trim"   # Marca de tiempo del último registro descartado al rotar
+        self._parsed = {}                          # ruta -> (huella, registros)
+        self._archived = (None, [], {}, set())     # (huella, registros, tx -> registros, txs deshechas)
+
+    @staticmethod
+    def _read_file(path: str) -> list:
+        if not os.path.exists(path):
+            return []
+        records = []
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Línea truncada por un cierre abrupto: se ignora
+                    continue
+        return records
+
+    @staticmethod
+    def _file_token(path: str):
+        try:
+            st_info = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return st_info.st_mtime_ns, st_info.st_size
+
+    def _read_cached(self, path: str) -> list:
+        token = self._file_token(path)
+        if token is None:
+            self._parsed.pop(path, None)
+            return []
+        cached = self._parsed.get(path)
+        if cached is None or cached[0] != token:
+            cached = (token, self._read_file(path))
+            self._parsed[path] = cached
+        return cached[1]
+
+    def segments(self) -> list:
+        """Segmentos rotados del histórico, del más antiguo al más reciente."""
+        folder = os.path.dirname(self.archive_path) or "."
+        prefix = os.path.basename(self.archive_path) + "."
+        if not os.path.isdir(folder):
+            return []
+        return sorted(os.path.join(folder, n) for n in os.listdir(folder) if n.startswith(prefix) and n.endswith(".gz"))
+
+    def _archived_index(self) -> tuple:
+        """(registros, tx -> registros, txs deshechas) del histórico; sólo se rehace si cambió algún fichero."""
+        paths = self.segments() + [self.archive_path]
+        token = tuple((p, self._file_token(p)) for p in paths)
+        if self._archived[0] != token:
+            records = [r for p in paths for r in self._read_cached(p)]
+            by_tx = {}
+            for rec in records:
+                by_tx.setdefault(rec.get("tx"), []).append(rec)
+            undone = {r.get("undo_of") for r in records if r.get("undo_of")}
+            self._archived = (token, records, by_tx, undone)
+        return self._archived[1:]
+
+    def append(self, records: list):
+        if not records:
+            return
+        with open(self.path, "a", encoding="utf-8") as f:
+            for rec in records:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def pending(self) -> list:
+        return self._read_file(self.path)
+
+    def pending_count(self) -> int:
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path, "rb") as f:
+            return sum(1 for _ in f)
+
+    def archive(self):
+        """Mueve las mutaciones ya compactadas al archivo histórico y vacía el log activo."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as src, open(self.archive_path, "a", encoding="utf-8") as dst:
+            shutil.copyfileobj(src, dst)
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.remove(self.path)
+        if os.path.getsize(self.archive_path) >= WAL_ARCHIVE_MAX_BYTES:
+            self._rotate()
+
+    def _rotate(self):
+        """Comprime el histórico en un segmento nuevo y descarta los segmentos que exceden WAL_ARCHIVE_SEGMENTS."""
+        segment = f"{self.archive_path}.{datetime.now():%Y%m%d%H%M%S%f}.gz"
+        with open(self.archive_path, "rb") as src, gzip.open(segment + ".tmp", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(segment + ".tmp", segment)
+        os.remove(self.archive_path)
+        for old in self.segments()[:-WAL_ARCHIVE_SEGMENTS]:
+            records = self._read_cached(old)
+            if records:
+                with open(self.trim_path, "w", encoding="utf-8") as f:
+                    f.write(records[-1]["ts"])
+            os.remove(old)
+            self._parsed.pop(old, None)
+
+    def trimmed_until(self):
+        """Marca de tiempo del último registro descartado por la rotación (None si el historial está completo)."""
+        if not os.path.exists(self.trim_path):
+            return None
+        with open(self.trim_path, "r", encoding="utf-8") as f:
+            return datetime.fromisoformat(f.read().strip())
+
+    def history(self, row_id=None) -> list:
+        records = self._archived_index()[0] + self.pending()
+        if row_id is not None:
+            records = [r for r in records if r.get("id") == row_id]
+        return records
+
+    @staticmethod
+    def build_tx(mutations: list, undo_of=None) -> list:
+        tx = uuid4().hex[:8]
+        ts = datetime.now().isoformat(timespec="microseconds")
+        records = []
+        for m in mutations:
+            rec = {"tx": tx, "ts": ts, "op": m[0], "id": m[1]}
+            if m[0] == "set":
+                rec.update({"col": m[2], "old": m[3], "new": m[4]})
+            elif m[0] == "insert":
+                rec["new"] = m[2]
+            else:
+                rec["old"] = m[2]
+            if undo_of:
+                rec["undo_of"] = undo_of
+            records.append(rec)
+        return records
+
+    def last_undoable_tx(self) -> list:
+        """Registros de la última transacción que no sea un deshacer ni haya sido deshecha."""
+        archived, by_tx, undone = self._archived_index()
+        pending = self.pending()
+        undone = undone | {r.get("undo_of") for r in pending if r.get("undo_of")}
+        for rec in itertools.chain(reversed(pending), reversed(archived)):
+            tx = rec.get("tx")
+            if rec.get("op") == "reset":
+                # Una importación o reescritura completa no se puede deshacer celda a celda
+                return []
+            if rec.get("undo_of") or tx in undone:
+                continue
+            return by_tx.get(tx, []) + [r for r in pending if r.get("tx") == tx]
+        return []
+
+
+class BackupStore:
+    """
+    Copias de seguridad deduplicadas por contenido en BACKUP_DIR.
+    Cada snapshot es un manifiesto JSON (snapshots/) con la lista de chunks que lo forman;
+    los chunks son bloques de filas CSV comprimidos con zlib y guardados por su SHA-256
+    (objects/), así dos snapshots casi idénticos sólo ocupan los chunks que cambiaron.
+    Los cortes entre chunks dependen del contenido de las filas (no de su posición),
+    de modo que insertar o borrar una fila sólo altera el chunk que la contiene.
+    """
+    ROW_SEP = "\x1e"       # Separador de filas (no aparece en el CSV del journal)
+    CHUNK_MASK = 63        # ~64 filas por chunk de media
+    CHUNK_MAX_ROWS = 256
+
+    def __init__(self, root: str = BACKUP_DIR, retention: dict = None):
+        self.root = root
+        self.retention = retention or BACKUP_RETENTION
+        self.objects_dir = os.path.join(root, "objects")
+        self.snapshots_dir = os.path.join(root, "snapshots")
+        self.lock = threading.Lock()
+
+    # -- Serialización por chunks --
+    def _row_strings(self, df: pd.DataFrame) -> list:
+        text = df.to_csv(header=False, index=False, lineterminator=self.ROW_SEP)
+        rows = text.split(self.ROW_SEP)[:-1]
+        if len(rows) != len(df):
+            clean = df.copy()
+            for c in clean.columns:
+                if clean[c].dtype == object or pd.api.types.is_string_dtype(clean[c]):
+                    clean[c] = clean[c].astype(str).str.replace(self.ROW_SEP, " ", regex=False).where(clean[c].notna())
+            rows = clean.to_csv(header=False, index=False, lineterminator=self.ROW_SEP).split(self.ROW_SEP)[:-1]
+        return rows
+
+    def _chunk(self, rows: list) -> list:
+        chunks, current = [], []
+        for row in rows:
+            current.append(row)
+            if (zlib.crc32(row.encode("utf-8")) & self.CHUNK_MASK) == 0 or len(current) >= self.CHUNK_MAX_ROWS:
+                chunks.append(current)
+                current = []
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def _put_object(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(zlib.compress(data, 6))
+            os.replace(tmp, path)
+        return digest
+
+    def _get_object(self, digest: str) -> bytes:
+        with open(self._object_path(digest), "rb") as f:
+            return zlib.decompress(f.read())
+
+    # -- Snapshots --
+    def snapshot(self, df: pd.DataFrame, source: str = "manual", ts: datetime = None, prune: bool = True) -> str:
+        """Guarda un snapshot deduplicado de df y aplica la política de retención. Devuelve el nombre del manifiesto."""
+        ts = ts or datetime.now()
+        with self.lock:
+            os.makedirs(self.snapshots_dir, exist_ok=True)
+            chunk_ids = [
+                self._put_object((self.ROW_SEP.join(chunk) + self.ROW_SEP).encode("utf-8"))
+                for chunk in self._chunk(self._row_strings(df))
+            ]
+            manifest = {
+                "ts": ts.isoformat(timespec="microseconds"),
+                "source": source,
+                "rows": int(len(df)),
+                "columns": [str(c) for c in df.columns],
+                "chunks": chunk_ids,
+            }
+            name = ts.strftime("%Y%m%d_%H%M%S_%f") + ".json"
+            with open(os.path.join(self.snapshots_dir, name), "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            if prune:
+                self._prune_locked(datetime.now())
+        return name
+
+    def list_snapshots(self) -> list:
+        """Manifiestos disponibles ordenados del más antiguo al más reciente."""
+        if not os.path.isdir(self.snapshots_dir):
+            return []
+        out = []
+        for name in sorted(os.listdir(self.snapshots_dir)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.snapshots_dir, name), "r", encoding="utf-8") as f:
+                    manifest = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+            manifest["name"] = name
+            manifest["ts"] = datetime.fromisoformat(manifest["ts"])
+            out.append(manifest)
+        return out
+
+    def read_snapshot(self, manifest: dict) -> pd.DataFrame:
+        text = "".join(self._get_object(d).decode("utf-8") for d in manifest["chunks"])
+        if not text:
+            return pd.DataFrame(columns=manifest["columns"])
+        return pd.read_csv(io.StringIO(text), header=None, names=manifest["columns"],
+                           lineterminator=self.ROW_SEP, encoding="utf-8")
+
+    # -- Retención --
+    def _prune_locked(self, now: datetime):
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        all_since = today - timedelta(days=self.retention.get("all_days", 1) - 1)
+        hourly_since = now - timedelta(days=self.retention.get("hourly_days", 7))
+        daily_since = now - timedelta(days=self.retention.get("daily_days", 365))
+
+        keep, seen_buckets = set(), set()
+        # Del más reciente al más antiguo: en cada hora / día se conserva el último snapshot
+        for m in reversed(self.list_snapshots()):
+            ts = m["ts"]
+            # Los snapshots de un reset (importación) son la única base válida para reconstruir lo posterior
+            if ts >= all_since or (m.get("source") == "reset" and ts >= daily_since):
+                keep.add(m["name"])
+                continue
+            if ts >= hourly_since:
+                bucket = ("h", ts.strftime("%Y%m%d%H"))
+            elif ts >= daily_since:
+                bucket = ("d", ts.strftime("%Y%m%d"))
+            else:
+                continue
+            if bucket not in seen_buckets:
+                seen_buckets.add(bucket)
+                keep.add(m["name"])
+
+        referenced = set()
+        for m in self.list_snapshots():
+            if m["name"] in keep:
+                referenced.update(m["chunks"])
+            else:
+                os.remove(os.path.join(self.snapshots_dir, m["name"]))
+
+        # Recolección de chunks que ya no usa ningún snapshot
+        if os.path.isdir(self.objects_dir):
+            for prefix in os.listdir(self.objects_dir):
+                prefix_dir = os.path.join(self.objects_dir, prefix)
+                for digest in os.listdir(prefix_dir):
+                    if digest not in referenced:
+                        os.remove(os.path.join(prefix_dir, digest))
+
+    def prune(self):
+        with self.lock:
+            self._prune_locked(datetime.now())
+
+    # -- Restauración --
+    def restore(self, as_of: datetime, log: "MutationLog" = None) -> pd.DataFrame:
+        """
+        Reconstruye el journal tal como estaba en as_of: toma el último snapshot anterior
+        y reaplica las mutaciones del log registradas entre el snapshot y as_of. Si la rotación
+        del histórico ya descartó parte de ese intervalo se devuelve el snapshot tal cual
+        (reaplicar sólo una parte de las mutaciones daría un estado que nunca existió). Nunca se
+        reaplican mutaciones a través de un reset: si entre el snapshot y as_of hay una importación
+        o reescritura completa, el estado intermedio no se puede reconstruir y se lanza ValueError.
+        """
+        candidates = [m for m in self.list_snapshots() if m["ts"] <= as_of]
+        if not candidates:
+            raise ValueError(f"No hay ninguna copia de seguridad anterior a {as_of:%Y-%m-%d %H:%M}.")
+        base = candidates[-1]
+        df = JournalManager.normalize_df(self.read_snapshot(base))
+        log = log or get_journal_store().log
+        trimmed = log.trimmed_until()
+        if trimmed is not None and base["ts"] < trimmed:
+            return df
+        window = [r for r in log.history() if base["ts"] < datetime.fromisoformat(r["ts"]) <= as_of]
+        if any(r.get("op") == "reset" for r in window):
+            raise ValueError(
+                f"Entre la copia del {base['ts']:%Y-%m-%d %H:%M} y {as_of:%Y-%m-%d %H:%M} hubo una importación "
+                "(reset) y su snapshot ya no existe: elige una fecha anterior a la importación o posterior a la copia siguiente."
+            )
+        records = [r for r in window if r.get("op") in ("set", "insert", "delete")]
+        return JournalManager.normalize_df(apply_mutations(df, records))
+
+    # -- Migración de copias antiguas --
+    def import_legacy_backups(self) -> int:
+        """Convierte los journal_*.csv.bak / *.db.bak de versiones anteriores en snapshots y los elimina."""
+        if not os.path.isdir(self.root):
+            return 0
+        migrated = 0
+        for name in sorted(os.listdir(self.root)):
+            match = re.match(r"journal_(\d{8}_\d{6})\.(csv|db)\.bak$", name)
+            if not match:
+                continue
+            path = os.path.join(self.root, name)
+            ts = datetime.strptime(match.group(1), "%Y%m%d_%H%M%S")
+            if match.group(2) == "csv":
+                legacy_df = pd.read_csv(path, encoding="utf-8")
+            else:
+                with closing(sqlite3.connect(path)) as conn:
+                    legacy_df = pd.read_sql_query(f"SELECT * FROM {SQLiteJournal.TABLE} ORDER BY rowid", conn)
+            self.snapshot(legacy_df, source="legacy", ts=ts, prune=False)
+            os.remove(path)
+            migrated += 1
+        if migrated:
+            self.prune()
+        return migrated
+
+    def has_legacy_backups(self) -> bool:
+        if not os.path.isdir(self.root):
+            return False
+        return any(n.startswith("journal_") and n.endswith(".bak") for n in os.listdir(self.root))
+
+
+_BACKUP_STORES = {}
+
+def get_backup_store(root: str = BACKUP_DIR) -> BackupStore:
+    if root not in _BACKUP_STORES:
+        _BACKUP_STORES[root] = BackupStore(root)
+    return _BACKUP_STORES[root]
+
+
+class SQLiteJournal:
+    """
+    Motor de almacenamiento del journal sobre sqlite3 (librería estándar).
+    Una fila por pata con ID único. Los guardados van al log de mutaciones (MutationLog)
+    y la compactación los vuelca a SQLite con upserts por fila, así un cierre o un roll
+    sólo escribe las filas que ha tocado. Mantiene en memoria un espejo del contenido
+    persistido para calcular qué celdas cambiaron en cada guardado.
+
+    La instancia es única por proceso (get_journal_store) y el espejo hace de caché del
+    journal para todas las sesiones: sólo se relee de disco cuando la huella de los
+    ficheros (ruta + mtime + tamaño de la base de datos, su -wal y el log) no coincide
+    con la del último guardado o carga hecho por este proceso.
+    """
+    TABLE = "journal"
+
+    def __init__(self, path: str = DB_FILE):
+        self.path = path
+        self.lock = threading.RLock()
+        self._mirror = None  # Último contenido persistido: base de datos + log pendiente (normalizado)
+        self._mirror_hashes = None  # Huella por fila del espejo (Serie indexada por ID)
+        self.log = MutationLog()
+        self.version = 0     # Versión de datos: cambia con cada carga o guardado con cambios
+        self._token = None   # Huella de los ficheros tras la última escritura / lectura propia
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def storage_token(self) -> tuple:
+        """Huella (ruta, mtime, tamaño) de los ficheros que componen el journal persistido."""
+        token = []
+        for path in (self.path, self.path + "-wal", self.log.path):
+            try:
+                st_info = os.stat(path)
+                token.append((path, st_info.st_mtime_ns, st_info.st_size))
+            except FileNotFoundError:
+                token.append((path, None, None))
+        return tuple(token)
+
+    def _commit_state(self, df: pd.DataFrame, bump: bool = True, row_hashes: pd.Series = None):
+        """Registra df como contenido persistido: versión, espejo, huellas por fila y huella de ficheros."""
+        if bump:
+            self.version += 1
+        df.attrs["data_version"] = self.version
+        self._mirror = df.copy()
+        self._mirror_hashes = row_hashes if row_hashes is not None else journal_row_hashes(df)
+        self._token = self.storage_token()
+
+    def is_stale(self) -> bool:
+        """True si otro proceso (o una edición externa) cambió los ficheros desde la última carga."""
+        return self._mirror is None or self._token != self.storage_token()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @staticmethod
+    def _sql_type(col: str) -> str:
+        if col in NUMERIC_COLUMNS or col == "Strike":
+            return "REAL"
+        if col in INT_COLUMNS:
+            return "INTEGER"
+        return "TEXT"
+
+    def _ensure_schema(self, conn: sqlite3.Connection):
+        cols_sql = ", ".join(
+            f'"{c}" {self._sql_type(c)}' + (" PRIMARY KEY" if c == "ID" else "") for c in COLUMNS
+        )
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {self.TABLE} ({cols_sql})")
+        # Migración de esquema: columnas nuevas añadidas a COLUMNS
+        existing = {r[1] for r in conn.execute(f"PRAGMA table_info({self.TABLE})")}
+        for c in COLUMNS:
+            if c not in existing:
+                conn.execute(f'ALTER TABLE {self.TABLE} ADD COLUMN "{c}" {self._sql_type(c)}')
+        for c in INDEXED_COLUMNS:
+            if c != "ID":
+                conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{self.TABLE}_{c} ON {self.TABLE}("{c}")')
+
+    @staticmethod
+    def _to_records(df: pd.DataFrame) -> list:
+        out = df.reindex(columns=COLUMNS).copy()
+        for c in DATE_COLUMNS:
+            out[c] = pd.to_datetime(out[c], errors="coerce").dt.strftime("%Y-%m-%d %H:%M:%S")
+        out = out.astype(object).where(out.notna(), None)
+        return [tuple(r) for r in out.itertuples(index=False, name=None)]
+
+    def read(self) -> pd.DataFrame:
+        with closing(self._connect()) as conn:
+            self._ensure_schema(conn)
+            cols_sql = ", ".join(f'"{c}"' for c in COLUMNS)
+            return pd.read_sql_query(f"SELECT {cols_sql} FROM {self.TABLE} ORDER BY rowid", conn)
+
+    def upsert(self, rows: pd.DataFrame, deleted_ids=None):
+        """Inserta o actualiza las filas dadas (por ID) y borra los IDs eliminados, en una sola transacción."""
+        cols_sql = ", ".join(f'"{c}"' for c in COLUMNS)
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        updates = ", ".join(f'"{c}"=excluded."{c}"' for c in COLUMNS if c != "ID")
+        sql = (f"INSERT INTO {self.TABLE} ({cols_sql}) VALUES ({placeholders}) "
+               f'ON CONFLICT("ID") DO UPDATE SET {updates}')
+        with closing(self._connect()) as conn:
+            self._ensure_schema(conn)
+            with conn:
+                if deleted_ids:
+                    conn.executemany(f'DELETE FROM {self.TABLE} WHERE "ID" = ?', [(str(i),) for i in deleted_ids])
+                if rows is not None and not rows.empty:
+                    conn.executemany(sql, self._to_records(rows))
+
+    def replace_all(self, df: pd.DataFrame):
+        """Reescribe la tabla completa (importación inicial o journals sin IDs comparables)."""
+        cols_sql = ", ".join(f'"{c}"' for c in COLUMNS)
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        with closing(self._connect()) as conn:
+            self._ensure_schema(conn)
+            with conn:
+                conn.execute(f"DELETE FROM {self.TABLE}")
+                conn.executemany(f"INSERT INTO {self.TABLE} ({cols_sql}) VALUES ({placeholders})", self._to_records(df))
+
+    def _changed_ids(self, row_hashes: pd.Series) -> set:
+        """IDs nuevos, eliminados o con otra huella respecto al espejo (comparación vectorizada de hashes)."""
+        old = self._mirror_hashes
+        if not row_hashes.index.is_unique or not old.index.is_unique:
+            return set(row_hashes.index) | set(old.index)
+        positions = old.index.get_indexer(row_hashes.index)
+        differs = (positions < 0) | (row_hashes.to_numpy() != old.to_numpy()[positions])
+        return set(row_hashes.index[differs]) | set(old.index.difference(row_hashes.index))
+
+    def save(self, df: pd.DataFrame, undo_of=None):
+        """
+        Persiste df añadiendo al log sólo las celdas nuevas, modificadas o eliminadas respecto
+        al espejo: una huella por fila localiza las filas cambiadas y sólo esas se comparan celda
+        a celda (O(cambios)). El BE dinámico de La Rueda se recalcula sólo en las campañas que
+        tocan esas filas. Cada WAL_COMPACT_EVERY mutaciones el log se compacta a SQLite.
+        """
+        with self.lock:
+            if self._mirror is None and self.exists():
+                self._load_locked()
+            if self._mirror is None:
+                df = JournalManager.refresh_wheel_breakevens(df)
+                self.replace_all(df)
+                self._commit_state(df)
+                return
+            row_hashes = journal_row_hashes(df)
+            changed = self._changed_ids(row_hashes)
+            mutations = diff_journal_cells(self._mirror, df, changed)
+            if mutations is None:
+                self.reset(JournalManager.refresh_wheel_breakevens(df))
+                return
+            if mutations:
+                stocks = JournalManager._wheel_stocks_touched(df, mutations)
+                if stocks.any():
+                    JournalManager.refresh_wheel_breakevens(df, stocks)
+                    changed |= set(df.loc[stocks, "ID"])
+                    mutations = diff_journal_cells(self._mirror, df, changed)
+                    row_hashes = journal_row_hashes(df)
+            if mutations:
+                self.log.append(MutationLog.build_tx(mutations, undo_of=undo_of))
+                touched = df["ID"].isin({m[1] for m in mutations})
+                df.loc[touched, "UpdatedAt"] = datetime.now().isoformat(timespec="seconds")
+            self._commit_state(df, bump=bool(mutations), row_hashes=row_hashes)
+            if self.log.pending_count() >= WAL_COMPACT_EVERY:
+                self._compact_locked()
+
+    def reset(self, df: pd.DataFrame):
+        """Reescribe la base de datos con df y cierra el log con un registro 'reset' (importaciones)."""
+        with self.lock:
+            self.replace_all(df)
+            get_backup_store().snapshot(df, source="reset")
+            self.log.append([{"tx": uuid4().hex[:8], "ts": datetime.now().isoformat(timespec="microseconds"), "op": "reset", "id": None}])
+            self.log.archive()
+            self._commit_state(df)
+
+    def compact(self):
+        with self.lock:
+            if self._mirror is None:
+                self._load_locked()
+            self._compact_locked()
+
+    def _compact_locked(self):
+        """Aplica las mutaciones pendientes a SQLite en una transacción (upsert de las filas tocadas)."""
+        pending = self.log.pending()
+        if not pending:
+            return
+        touched = {r.get("id") for r in pending}
+        present = self._mirror["ID"].isin(touched)
+        deleted_ids = list(touched - set(self._mirror.loc[present, "ID"]))
+        self.upsert(self._mirror[present], deleted_ids)
+        self.log.archive()
+        self._token = self.storage_token()
+        get_backup_store().snapshot(self._mirror, source="compact")
+
+    def _load_locked(self) -> pd.DataFrame:
+        df = JournalManager.normalize_df(self.read())
+        pending = self.log.pending()
+        if pending:
+            df = JournalManager.normalize_df(apply_mutations(df, pending))
+        df = JournalManager.refresh_wheel_breakevens(df)
+        self._commit_state(df)
+        return df
+
+    def load(self) -> pd.DataFrame:
+        """Journal completo desde la caché de proceso; sólo relee el disco si los ficheros cambiaron."""
+        with self.lock:
+            stale = self.is_stale()
+            record_cache_event("Journal en memoria", not stale)
+            if stale:
+                self._load_locked()
+            return self._mirror.copy()
+
+    def load_view(self, columns: list) -> pd.DataFrame:
+        """Proyección del journal con sólo las columnas pedidas (desde la caché de proceso)."""
+        with self.lock:
+            stale = self.is_stale()
+            record_cache_event("Journal en memoria", not stale)
+            if stale:
+                self._load_locked()
+            view = self._mirror[columns].copy()
+            view.attrs["data_version"] = self.version
+            return view
+
+    def current_version(self) -> int:
+        """Versión de datos vigente, recargando antes si los ficheros cambiaron fuera de este proceso."""
+        with self.lock:
+            if self._mirror is not None and self.is_stale():
+                self._load_locked()
+            return self.version
+
+
+def _require_pyarrow():
+    """Importación diferida de pyarrow (sólo la necesita el formato Parquet)."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("El formato Parquet necesita pyarrow: pip install pyarrow") from e
+    return pa, pq
+
+
+def journal_arrow_schema():
+    """Esquema tipado del journal derivado de COLUMNS (fechas, numéricas, enteras y texto)."""
+    pa, _ = _require_pyarrow()
+    fields = []
+    for c in COLUMNS:
+        if c in DATE_COLUMNS:
+            fields.append(pa.field(c, pa.timestamp("us")))
+        elif c in NUMERIC_COLUMNS or c == "Strike":
+            fields.append(pa.field(c, pa.float64()))
+        elif c in INT_COLUMNS:
+            fields.append(pa.field(c, pa.int64()))
+        else:
+            fields.append(pa.field(c, pa.string()))
+    return pa.schema(fields)
+
+
+class ParquetJournal(SQLiteJournal):
+    """
+    Variante columnar del motor: el journal compactado vive en un fichero Parquet con el
+    esquema tipado de journal_arrow_schema(), así una carga no parsea fechas ni números y
+    las vistas pueden leer sólo las columnas que usan. Comparte con SQLiteJournal el log de
+    mutaciones, el espejo en memoria y la caché de proceso; al compactar reescribe el fichero.
+    """
+
+    def __init__(self, path: str = PARQUET_FILE):
+        super().__init__(path)
+        self._view_token = None  # Huella de los ficheros en la última vista leída sin espejo
+
+    def _to_table(self, df: pd.DataFrame):
+        pa, _ = _require_pyarrow()
+        out = df.reindex(columns=COLUMNS).copy()
+        for c in COLUMNS:
+            if c in DATE_COLUMNS:
+                out[c] = pd.to_datetime(out[c], errors="coerce").astype("datetime64[us]")
+            elif c in NUMERIC_COLUMNS or c == "Strike":
+                out[c] = pd.to_numeric(out[c], errors="coerce").astype("float64")
+            elif c in INT_COLUMNS:
+                out[c] = pd.to_numeric(out[c], errors="coerce").fillna(1).astype("int64")
+            else:
+                # "string" conserva los nulos (astype(str) los escribiría como "nan" / "<NA>")
+                out[c] = out[c].astype("string")
+        return pa.Table.from_pandas(out, schema=journal_arrow_schema(), preserve_index=False)
+
+    def _write(self, df: pd.DataFrame):
+        """Escritura atómica: fichero temporal + os.replace (una lectura nunca ve un Parquet a medias)."""
+        _, pq = _require_pyarrow()
+        tmp_path = self.path + ".tmp"
+        pq.write_table(self._to_table(df), tmp_path, compression="zstd")
+        os.replace(tmp_path, self.path)
+
+    def storage_token(self) -> tuple:
+        token = []
+        for path in (self.path, self.log.path):
+            try:
+                st_info = os.stat(path)
+                token.append((path, st_info.st_mtime_ns, st_info.st_size))
+            except FileNotFoundError:
+                token.append((path, None, None))
+        return tuple(token)
+
+    def read(self, columns: list = None) -> pd.DataFrame:
+        """Lee el Parquet, opcionalmente sólo algunas columnas (las que falten en el fichero quedan vacías)."""
+        _, pq = _require_pyarrow()
+        wanted = list(columns or COLUMNS)
+        available = set(pq.read_schema(self.path).names)
+        df = pq.read_table(self.path, columns=[c for c in wanted if c in available]).to_pandas()
+        return df.reindex(columns=wanted)
+
+    def upsert(self, rows: pd.DataFrame, deleted_ids=None):
+        """Actualiza por ID conservando el orden de las filas; un fichero columnar se reescribe entero."""
+        current = self.read() if self.exists() else pd.DataFrame(columns=COLUMNS)
+        if deleted_ids:
+            current = current[~current["ID"].isin([str(i) for i in deleted_ids])]
+        merged = current.set_index("ID")
+        if rows is not None and not rows.empty:
+            new = rows.reindex(columns=COLUMNS).set_index("ID")
+            order = list(merged.index) + [i for i in new.index if i not in merged.index]
+            merged = pd.concat([merged.drop(index=new.index.intersection(merged.index)), new]).reindex(order)
+        self._write(merged.reset_index())
+
+    def replace_all(self, df: pd.DataFrame):
+        self._write(df)
+
+    def _compact_locked(self):
+        """El espejo ya contiene el log aplicado: se reescribe el Parquet con él y se archiva el log."""
+        if not self.log.pending_count():
+            return
+        self.replace_all(self._mirror)
+        self.log.archive()
+        self._token = self.storage_token()
+        get_backup_store().snapshot(self._mirror, source="compact")
+
+    def load_view(self, columns: list) -> pd.DataFrame:
+        """
+        Con la caché fría y sin mutaciones pendientes lee del Parquet sólo las columnas pedidas.
+        Si los ficheros cambiaron desde la última lectura la versión de datos avanza, así las
+        cachés derivadas no sirven resultados del contenido anterior.
+        """
+        with self.lock:
+            if self.is_stale() and self.exists() and not self.log.pending_count():
+                token = self.storage_token()
+                if token != self._view_token:
+                    self.version += 1
+                    self._view_token = token
+                view = self.read(columns)
+                view.attrs["data_version"] = self.version
+                return view
+        return super().load_view(columns)
+
+
+_JOURNAL_STORES = {}
+_JOURNAL_STORES_LOCK = threading.Lock()
+
+def get_journal_store(path: str = None) -> SQLiteJournal:
+    """
+    Devuelve la instancia única del motor elegido en STORAGE_BACKEND para una ruta
+    (compartida entre sesiones).
+    """
+    backend = ParquetJournal if STORAGE_BACKEND == "parquet" else SQLiteJournal
+    path = path or (PARQUET_FILE if backend is ParquetJournal else DB_FILE)
+    with _JOURNAL_STORES_LOCK:
+        if path not in _JOURNAL_STORES:
+            _JOURNAL_STORES[path] = backend(path)
+        return _JOURNAL_STORES[path]
+
+
+# Caché LRU del motor de costo base de La Rueda (clave: columnas de entrada de la campaña)
+WHEEL_COST_CACHE_SIZE = 512
+_WHEEL_COST_CACHE = LRUCache(WHEEL_COST_CACHE_SIZE, name="Costo base Rueda")
+WHEEL_SCAN_MAX_STOCKS = 16   # Hasta cuántas posiciones se resuelven sin construir el índice de campañas
+# Columnas que lee la fórmula del costo base: BreakEven, CostBaseReal o UpdatedAt (derivadas) no forman parte de la clave
+WHEEL_COST_INPUTS = [
+    "ID", "ParentID", "ChainID", "WheelParentChainID", "WheelLeg", "Estado", "Estrategia", "Side",
+    "Strike", "Contratos", "PrimaRecibida", "CostoCierre", "PnL_USD_Realizado", "Comisiones",
+]
+
+
+class JournalManager:
+    @staticmethod
+    def _wheel_campaign_positions(df: pd.DataFrame, stock_row: pd.Series, inputs: dict = None) -> np.ndarray:
+        """
+        Posiciones (iloc) de la campaña de La Rueda de una posición de acciones: enlaces directos por
+        ID/ParentID/ChainID/WheelParentChainID del stock, de su padre y de su cadena de origen.
+        Se resuelve con el índice de campañas en O(campaña); con inputs (columnas ya extraídas) se
+        comparan directamente los enlaces, sin construir el índice (pocas campañas tras un guardado).
+        """
+        # Importación diferida: el índice de campañas depende de la versión de datos de este módulo
+        from .campaigns import _valid_link, get_campaign_index
+        stock_id = stock_row["ID"]
+        stock_chain = stock_row["ChainID"]
+        lookups = [("ID", stock_id), ("ParentID", stock_id), ("ChainID", stock_chain), ("WheelParentChainID", stock_chain)]
+        for link in (stock_row.get("ParentID"), stock_row.get("WheelParentChainID")):
+            if _valid_link(link) and str(link) != "nan":
+                lookups += [("ChainID", link), ("ParentID", link), ("WheelParentChainID", link)]
+        if inputs is not None:
+            hit = np.zeros(len(df), dtype=bool)
+            for col, value in lookups:
+                if _valid_link(value):
+                    hit |= inputs[col] == value
+            return np.flatnonzero(hit)
+        index = get_campaign_index(df)
+        postings = {"ID": index.by_id, "ParentID": index.by_parent, "ChainID": index.by_chain,
+                    "WheelParentChainID": index.by_wheel_parent}
+        groups = [postings[col].get(value) for col, value in lookups]
+        groups = [g for g in groups if g is not None and len(g)]
+        return np.unique(np.concatenate(groups)) if groups else np.empty(0, dtype=np.int64)
+
+    @staticmethod
+    def wheel_campaign_rows(df: pd.DataFrame, stock_row: pd.Series) -> pd.DataFrame:
+        """
+        Filas de la campaña de La Rueda de una posición de acciones (PCS original, Buy Put, CCs,
+        Stock, Spreads).
+        """
+        return df.iloc[JournalManager._wheel_campaign_positions(df, stock_row)].drop_duplicates(subset=["ID"])
+
+    @staticmethod
+    def _wheel_cost_inputs(df: pd.DataFrame) -> dict:
+        """Columnas WHEEL_COST_INPUTS como arrays numpy (en un lote se extraen una sola vez)."""
+        return {c: df[c].to_numpy() for c in WHEEL_COST_INPUTS}
+
+    @staticmethod
+    def _wheel_cost_figures(df: pd.DataFrame, stock_row: pd.Series, inputs: dict = None, scan: bool = False) -> dict:
+        """
+        Desglose del costo base (sin campaign_rows), memoizado por los campos del stock y los valores
+        de WHEEL_COST_INPUTS en las filas de la campaña: la clave sólo lee las entradas de la fórmula
+        (no depende de BreakEven, CostBaseReal ni UpdatedAt) y no materializa las filas.
+        """
+        positions = JournalManager._wheel_campaign_positions(df, stock_row, inputs if scan else None)
+        input_columns = df.columns.get_indexer(WHEEL_COST_INPUTS)
+        if inputs is None:
+            # Llamada suelta: sólo se extraen las filas de la campaña
+            inputs = JournalManager._wheel_cost_inputs(df.iloc[positions, input_columns])
+            positions_in = slice(None)
+        else:
+            positions_in = positions
+        stock_fields = tuple(_json_value(stock_row.get(c)) for c in ("ID", "Strike", "Contratos", "PrimaRecibida", "CoveredCallPrima"))
+        content = hashlib.sha1(repr([inputs[c][positions_in].tolist() for c in WHEEL_COST_INPUTS]).encode("utf-8"))
+        key = (stock_fields, content.hexdigest())
+        cached = _WHEEL_COST_CACHE.get(key)
+        if cached is not None:
+            return cached
+
+        campaign_rows = df.iloc[positions, input_columns].drop_duplicates(subset=["ID"])
+        stock_id = stock_row["ID"]
+        precio_compra = float(stock_row.get("Strike", 0.0))
+        acciones_st = int(stock_row.get("Contratos", 1)) * 100
+        cc_prima_acum = float(stock_row.get("CoveredCallPrima", 0.0))
+
+        wheel_leg = campaign_rows["WheelLeg"].fillna("").astype(str)
+        estado = campaign_rows["Estado"]
+        total_comisiones_campana = float(pd.to_numeric(campaign_rows["Comisiones"], errors="coerce").sum())
+
+        # 1. prima_neta_pcs (Si es 0.0 en el stock row, la recuperamos dinámicamente de los registros del PCS original)
+        prima_neta_pcs = float(stock_row.get("PrimaRecibida", 0.0))
+        if prima_neta_pcs == 0.0:
+            sell_put_rows = campaign_rows[wheel_leg == "sell_put"]
+            buy_put_rows = campaign_rows[(wheel_leg == "buy_put_open") & (estado != "Asignada")]
+            sell_put_prima = float(sell_put_rows["PrimaRecibida"].iloc[0]) if not sell_put_rows.empty else 0.0
+            buy_put_prima = abs(float(buy_put_rows["PrimaRecibida"].iloc[0])) if not buy_put_rows.empty else 0.0
+            if sell_put_prima > 0:
+                prima_neta_pcs = sell_put_prima - buy_put_prima
+
+        # 2. Buscar si el Buy Put de La Rueda ya fue cerrado (para calcular venta del Buy Put)
+        closed_bp_rows = campaign_rows[(wheel_leg == "buy_put_open") & (estado != "Abierta") & (estado != "Asignada")]
+        buy_put_closed = not closed_bp_rows.empty
+        buy_put_prima_extra = abs(float(closed_bp_rows["CostoCierre"].iloc[0])) if buy_put_closed else 0.0
+
+        # 3. Primas extras cobradas en la campaña (CCs extras, spreads defensivos, etc.)
+        extras = campaign_rows[
+            (campaign_rows["ID"] != stock_id)
+            & (wheel_leg != "sell_put") & (wheel_leg != "buy_put_open")
+            & ~campaign_rows["Estrategia"].isin(["Long Stock (Asignación)", "Long Stock"])
+        ]
+        # Si está abierta, cuenta su PrimaRecibida * 100 * Contratos; si no, su PnL realizado
+        r_pnl = extras["PnL_USD_Realizado"].astype(float).where(
+            extras["Estado"] != "Abierta",
+            extras["PrimaRecibida"].astype(float) * 100 * extras["Contratos"].astype(float),
+        )
+        estr_lower = extras["Estrategia"].astype(str).str.lower()
+        is_cc = estr_lower.str.contains("covered call", regex=False) | (estr_lower == "cc") | estr_lower.str.contains("cc (", regex=False)
+        is_pds = ~is_cc & (estr_lower.str.contains("put debit spread", regex=False) | estr_lower.str.contains("pds", regex=False))
+        cc_pnl = float(r_pnl[is_cc].sum())
+        pds_pnl = float(r_pnl[is_pds].sum())
+        extra_campana_pnl = float(r_pnl[~is_cc & ~is_pds].sum())
+
+        # Convertir PnL a términos por acción
+        cc_pnl_per_share = cc_pnl / acciones_st
+        pds_pnl_per_share = pds_pnl / acciones_st
+        extra_campana_pnl_per_share = extra_campana_pnl / acciones_st
+
+        # Combinar el acumulado manual con el detectado en el journal
+        cc_acumulado_final = max(abs(cc_prima_acum), cc_pnl_per_share)
+
+        # Primas totales por acción que reducen el costo base
+        total_primas = abs(prima_neta_pcs) + cc_acumulado_final + pds_pnl_per_share + extra_campana_pnl_per_share + abs(buy_put_prima_extra)
+        costo_base_dinamico = precio_compra - total_primas + (total_comisiones_campana / acciones_st)
+
+        result = {
+            "acciones": acciones_st,
+            "precio_compra": precio_compra,
+            "prima_neta_pcs": prima_neta_pcs,
+            "cc_pnl_per_share": cc_pnl_per_share,
+            "cc_acumulado_final": cc_acumulado_final,
+            "pds_pnl_per_share": pds_pnl_per_share,
+            "extra_campana_pnl_per_share": extra_campana_pnl_per_share,
+            "buy_put_prima_extra": buy_put_prima_extra,
+            "buy_put_closed": buy_put_closed,
+            "total_comisiones_campana": total_comisiones_campana,
+            "total_primas": total_primas,
+            "costo_base_dinamico": costo_base_dinamico,
+        }
+        return _WHEEL_COST_CACHE.put(key, result)
+
+    @staticmethod
+    def wheel_cost_basis(df: pd.DataFrame, stock_row: pd.Series) -> dict:
+        """
+        Motor único de costo base de La Rueda. Devuelve el desglose por acción:
+        prima_neta_pcs, cc_acumulado_final, pds_pnl_per_share, extra_campana_pnl_per_share,
+        buy_put_prima_extra (+ buy_put_closed), total_comisiones_campana, total_primas y
+        costo_base_dinamico, junto con campaign_rows (filas actuales de la campaña).
+        """
+        figures = JournalManager._wheel_cost_figures(df, stock_row)
+        return {"campaign_rows": JournalManager.wheel_campaign_rows(df, stock_row), **figures}
+
+    @staticmethod
+    def calculate_stock_dynamic_be(df: pd.DataFrame, stock_row: pd.Series) -> float:
+        return JournalManager._wheel_cost_figures(df, stock_row)["costo_base_dinamico"]
+
+    @staticmethod
+    def ensure_unique_ids(df: pd.DataFrame) -> pd.DataFrame:
+        # El motor SQLite usa ID como clave: los duplicados o vacíos (ediciones manuales del CSV) reciben un ID nuevo
+        bad = df["ID"].isna() | (df["ID"].astype(str).str.strip() == "") | df["ID"].duplicated()
+        if bad.any():
+            df = df.copy()
+            df.loc[bad, "ID"] = [str(uuid4())[:8] for _ in range(int(bad.sum()))]
+        return df
+
+    @staticmethod
+    @profiled("Guardado (save_with_backup)")
+    def save_with_backup(df: pd.DataFrame, undo_of=None) -> pd.DataFrame:
+        # Cada guardado añade sus mutaciones al log; la copia de seguridad se hace al compactar
+        store = get_journal_store()
+        try:
+            df = JournalManager.ensure_unique_ids(JournalManager.normalize_df(df))
+            store.save(df, undo_of=undo_of)
+            return df
+        except PermissionError:
+            report_error(f"❌ Error al guardar: El archivo '{store.path}' está bloqueado. Ciérralo si lo tienes abierto en otro programa.")
+        except sqlite3.OperationalError as e:
+            report_error(f"❌ Error al guardar: la base de datos '{store.path}' no está disponible ({e}).")
+        except Exception as e:
+            report_error(f"❌ Error al guardar: {e}")
+        return df
+
+    @staticmethod
+    def import_csv(csv_path: str = FILE_NAME) -> pd.DataFrame:
+        """Importa un journal CSV completo al motor SQLite (reemplaza el contenido actual)."""
+        df = pd.read_csv(csv_path, encoding='utf-8')
+        df = JournalManager.ensure_unique_ids(JournalManager.normalize_df(df))
+        df = JournalManager.refresh_wheel_breakevens(df)
+        get_journal_store().reset(df)
+        return df
+
+    @staticmethod
+    def import_parquet(parquet_path: str = PARQUET_FILE, replay_log: bool = False) -> pd.DataFrame:
+        """
+        Importa un journal Parquet al motor activo (reemplaza el contenido actual).
+        replay_log=True aplica además el log pendiente (cambio de motor con STRIKELOG_STORAGE).
+        """
+        source = ParquetJournal(parquet_path)
+        if replay_log:
+            df = source.load()
+        else:
+            df = JournalManager.normalize_df(source.read())
+            df = JournalManager.refresh_wheel_breakevens(JournalManager.ensure_unique_ids(df))
+        get_journal_store().reset(df)
+        return df
+
+    @staticmethod
+    def import_sqlite(db_path: str = DB_FILE) -> pd.DataFrame:
+        """Importa una base de datos SQLite del journal (con su log pendiente) al motor activo."""
+        df = SQLiteJournal(db_path).load()
+        get_journal_store().reset(df)
+        return df
+
+    @staticmethod
+    def export_parquet(parquet_path: str = PARQUET_FILE) -> str:
+        """Exporta el journal persistido a Parquet con el esquema tipado de journal_arrow_schema()."""
+        ParquetJournal(parquet_path).replace_all(get_journal_store().load())
+        return parquet_path
+
+    @staticmethod
+    @profiled("Carga de columnas (load_view)")
+    def load_view(columns: list) -> pd.DataFrame:
+        """Journal con sólo las columnas indicadas (p.ej. DASHBOARD_COLUMNS, sin Notas ni Tags)."""
+        store = get_journal_store()
+        if not store.exists():
+            return JournalManager.load_data()[columns]
+        return store.load_view(columns)
+
+    @staticmethod
+    def data_version(check_files: bool = False) -> int:
+        """
+        Versión de los datos persistidos; las cachés derivadas (índices, KPIs) se invalidan cuando cambia.
+        Con check_files=True detecta también cambios hechos por otro proceso (recarga la caché).
+        """
+        store = get_journal_store()
+        return store.current_version() if check_files else store.version
+
+    @staticmethod
+    def undo_last(df: pd.DataFrame):
+        """
+        Deshace la última transacción del log aplicando sus mutaciones inversas sobre df.
+        Devuelve (df_resultante, nº de mutaciones revertidas); el deshacer queda registrado en el log.
+        """
+        store = get_journal_store()
+        records = store.log.last_undoable_tx()
+        if not records:
+            return df, 0
+        inverse = []
+        for rec in reversed(records):
+            if rec["op"] == "set":
+                inverse.append({"op": "set", "id": rec["id"], "col": rec["col"], "new": rec.get("old")})
+            elif rec["op"] == "insert":
+                inverse.append({"op": "delete", "id": rec["id"]})
+            elif rec["op"] == "delete":
+                inverse.append({"op": "insert", "id": rec["id"], "new": rec.get("old")})
+        df = apply_mutations(df, inverse)
+        df = JournalManager.save_with_backup(df, undo_of=records[0]["tx"])
+        return df, len(inverse)
+
+    @staticmethod
+    def change_history(row_id=None) -> pd.DataFrame:
+        """Historial de auditoría (mutaciones compactadas + pendientes), opcionalmente de una sola fila."""
+        records = get_journal_store().log.history(row_id)
+        cols = ["ts", "tx", "op", "id", "col", "old", "new"]
+        rows = [{c: (json.dumps(r.get(c), ensure_ascii=False) if isinstance(r.get(c), dict) else r.get(c)) for c in cols} for r in records]
+        return pd.DataFrame(rows, columns=cols)
+
+    @staticmethod
+    def export_csv(csv_path: str = FILE_NAME) -> str:
+        """Exporta el journal persistido a CSV con las mismas columnas que el formato original."""
+        df = get_journal_store().load()
+        df.to_csv(csv_path, index=False)
+        return csv_path
+
+    @staticmethod
+    def _schema_intact(df: pd.DataFrame) -> bool:
+        """Comprobación O(columnas): mismas columnas y ningún tipo perdido por una edición en sitio."""
+        if list(df.columns) != COLUMNS:
+            return False
+        dtypes = df.dtypes
+        return (
+            all(dtypes[c].kind == "M" for c in DATE_COLUMNS)
+            and all(dtypes[c] == "float64" for c in NUMERIC_COLUMNS)
+            and all(dtypes[c].kind in "iu" for c in INT_COLUMNS)
+        )
+
+    @staticmethod
+    @profiled("normalize_df")
+    def normalize_df(df: pd.DataFrame) -> pd.DataFrame:
+        # Camino rápido: el DataFrame ya está normalizado con esta versión del esquema (marca en df.attrs)
+        if df.attrs.get("schema_version") == JOURNAL_SCHEMA_VERSION and JournalManager._schema_intact(df):
+            return df
+
+        df = df.copy()
+        # Asegurar que Setup existe
+        if "Setup" not in df.columns:
+            df["Setup"] = "Otro"
+
+        # Intentar recuperar fechas de cierre de las notas si faltan (como en el caso de JBLU)
+        fecha_cierre = df["FechaCierre"] if "FechaCierre" in df.columns else pd.Series(pd.NA, index=df.index, dtype=object)
+        estado = df["Estado"] if "Estado" in df.columns else pd.Series(pd.NA, index=df.index, dtype=object)
+        sin_cierre = (estado != "Abierta") & (fecha_cierre.isna() | (fecha_cierre.astype(str) == "nan"))
+        if sin_cierre.any():
+            # Buscar patrón YYYY-MM-DD en Notas o Estado (sólo en las filas sin fecha de cierre)
+            notas = df.loc[sin_cierre, "Notas"].astype(str) if "Notas" in df.columns else ""
+            texto = notas + " " + estado[sin_cierre].astype(str)
+            recuperada = texto.str.extract(r"(\d{4}-\d{2}-\d{2})", expand=False).dropna()
+            if not recuperada.empty:
+                fecha_cierre = fecha_cierre.astype(object)
+                fecha_cierre.loc[recuperada.index] = recuperada
+        df["FechaCierre"] = fecha_cierre
+
+        for c in COLUMNS:
+            if c not in df.columns:
+                if c == "Side": df[c] = "Sell"
+                elif c == "OptionType": df[c] = "Put"
+                elif c == "Tags": df[c] = ""
+                elif c == "Broker": df[c] = "IB"
+                elif c in ["BuyingPower", "BreakEven", "BreakEven_Upper", "POP", "Delta", "PnL_Capital_Pct", "PrecioAccionCierre", "PnL_USD_Realizado", "Comisiones", "CostBaseReal", "CoveredCallPrima"]: df[c] = 0.0
+                elif c in ["WheelParentChainID", "CoveredCallChainID", "WheelLeg"]: df[c] = pd.NA
+                else: df[c] = pd.NA
+
+        df["Broker"] = df["Broker"].fillna("IB").replace("", "IB")
+
+        if list(df.columns) != COLUMNS:
+            df = df[COLUMNS].copy()
+
+        # Coerción por columna, sólo donde el tipo no es ya el esperado
+        for col in DATE_COLUMNS:
+            if df[col].dtype.kind != "M":
+                df[col] = pd.to_datetime(df[col], errors='coerce')
+
+        # Forzar tipo datetime64[ns] para compatibilidad total con Arrow
+        hoy = pd.Timestamp.now().normalize()
+        for col in ["FechaApertura", "Expiry"]:
+            if df[col].hasnans:
+                df[col] = df[col].fillna(hoy)
+
+        for col in NUMERIC_COLUMNS:
+            if df[col].dtype != "float64":
+                df[col] = pd.to_numeric(df[col], errors='coerce').astype("float64")
+            if df[col].hasnans:
+                df[col] = df[col].fillna(0.0)
+
+        if df["Contratos"].dtype.kind not in "iu":
+            df["Contratos"] = pd.to_numeric(df["Contratos"], errors='coerce').fillna(1).astype(int)
+
+        # UpdatedAt se sella al guardar las filas modificadas; aquí sólo se rellenan las que no lo tienen
+        if df["UpdatedAt"].isna().any():
+            df["UpdatedAt"] = df["UpdatedAt"].fillna(datetime.now().isoformat(timespec="seconds"))
+
+        df.attrs["schema_version"] = JOURNAL_SCHEMA_VERSION
+        return df
+
+    @staticmethod
+    def _open_wheel_stocks(df: pd.DataFrame) -> pd.Series:
+        return (df["Estrategia"] == "Long Stock (Asignación)") & (df["Estado"] == "Abierta")
+
+    @staticmethod
+    def _wheel_stocks_touched(df: pd.DataFrame, mutations: list) -> pd.Series:
+        """
+        Máscara de las posiciones de stock de La Rueda abiertas cuya campaña puede incluir alguna fila
+        de las mutaciones: algún enlace del stock (ID, ChainID, ParentID, WheelParentChainID) coincide
+        con un enlace de una fila tocada, antes o después del cambio. Es un superconjunto de las
+        campañas afectadas y sólo recorre las filas tocadas y los stocks abiertos.
+        """
+        link_cols = ["ID", "ChainID", "ParentID", "WheelParentChainID"]
+        touched = {m[1] for m in mutations}
+        links = set(touched)
+        for m in mutations:
+            if m[0] in ("insert", "delete"):
+                links.update(m[2].get(c) for c in link_cols)
+            elif m[2] in link_cols:
+                links.update((m[3], m[4]))
+        rows = df[df["ID"].isin(touched)]
+        for c in link_cols:
+            links.update(rows[c])
+        links = {v for v in links if isinstance(v, str) and v and v != "nan"}
+        stocks = df.loc[JournalManager._open_wheel_stocks(df), link_cols]
+        mask = pd.Series(False, index=df.index)
+        mask.loc[stocks.index] = stocks.isin(links).any(axis=1)
+        return mask
+
+    @staticmethod
+    @profiled("BE dinámico Rueda")
+    def refresh_wheel_breakevens(df: pd.DataFrame, stock_mask: pd.Series = None) -> pd.DataFrame:
+        """
+        Recálculo dinámico del BE de las posiciones de stock de La Rueda activas
+        (todas, o sólo las de stock_mask).
+        """
+        if stock_mask is None:
+            stock_mask = JournalManager._open_wheel_stocks(df)
+        if not stock_mask.any():
+            return df
+        inputs = JournalManager._wheel_cost_inputs(df)
+        # Con pocas campañas (lo habitual tras un guardado) comparar enlaces es más barato que indexar
+        scan = int(stock_mask.sum()) <= WHEEL_SCAN_MAX_STOCKS
+        for idx, stock_row in df[stock_mask].iterrows():
+            try:
+                dynamic_be = JournalManager._wheel_cost_figures(df, stock_row, inputs, scan)["costo_base_dinamico"]
+            except (KeyError, TypeError, ValueError, ZeroDivisionError) as e:
+                _LOG.warning("No se pudo recalcular el BE de La Rueda de %s: %s", stock_row.get("ID"), e)
+                continue
+            df.at[idx, "BreakEven"] = dynamic_be
+            df.at[idx, "CostBaseReal"] = dynamic_be
+        return df
+
+    @staticmethod
+    @profiled("Carga del journal (load_data)")
+    def load_data() -> pd.DataFrame:
+        store = get_journal_store()
+        try:
+            # Migración única: el primer arranque con un motor nuevo importa el journal existente
+            if not store.exists():
+                if isinstance(store, ParquetJournal) and os.path.exists(DB_FILE):
+                    return JournalManager.import_sqlite(DB_FILE)
+                if not isinstance(store, ParquetJournal) and os.path.exists(PARQUET_FILE):
+                    return JournalManager.import_parquet(PARQUET_FILE, replay_log=True)
+                if os.path.exists(FILE_NAME):
+                    return JournalManager.import_csv(FILE_NAME)
+            if store.exists():
+                return store.load()
+        except Exception as e:
+            report_error(f"❌ Error cargando datos: {e}")
+        empty = pd.DataFrame(columns=COLUMNS)
+        empty.attrs["data_version"] = store.version
+        return empty
+
+    @staticmethod
+    @profiled("Vencimientos por lotes")
+    def expire_chains(df: pd.DataFrame, decisions: dict, now: datetime = None):
+        """
+        Resuelve de una vez las cadenas vencidas. decisions = {ChainID: "OTM" | "Asignada" | "Manual"}:
+        - OTM: todas las patas abiertas se cierran a $0.00. El PnL (calculate_pnl_metrics con la prima
+          neta guardada: + en crédito, − en débito) va en la primera pata y los CC quedan desvinculados
+          de sus acciones.
+        - Asignada (sólo CSP: una única pata Sell Put): el put queda Asignada con la prima cobrada y se
+          crea la posición Long Stock de La Rueda (costo base = strike − prima).
+        - Manual: la cadena no se toca.
+        Todas las mutaciones se aplican con operaciones vectorizadas sobre una copia; el llamador guarda
+        una sola vez. Devuelve (df, resumen) con resumen = {"OTM", "Asignada" (nº de cadenas), "pnl",
+        "omitidas" (Asignada pedida en cadenas que no son CSP)}.
+        """
+        summary = {"OTM": 0, "Asignada": 0, "pnl": 0.0, "omitidas": []}
+        decisions = {chain_id: action for chain_id, action in decisions.items() if action in ("OTM", "Asignada")}
+        open_mask = (df["Estado"] == "Abierta") & df["ChainID"].isin(list(decisions))
+        if not open_mask.any():
+            return df, summary
+
+        legs = df[open_mask]
+        chains = legs.groupby("ChainID", sort=False).agg(
+            Estrategia=("Estrategia", "first"), Side=("Side", "first"), OptionType=("OptionType", "first"),
+            Patas=("ID", "size"), Prima=("PrimaRecibida", "sum"), Contratos=("Contratos", "max"),
+            BP=("BuyingPower", "sum"), Comisiones=("Comisiones", "sum"),
+        )
+        chains["Accion"] = chains.index.map(decisions)
+        is_csp = (chains["Patas"] == 1) & (chains["Side"] == "Sell") & (chains["OptionType"] == "Put")
+        rejected = (chains["Accion"] == "Asignada") & ~is_csp
+        summary["omitidas"] = chains.index[rejected].tolist()
+        chains = chains[~rejected]
+        if chains.empty:
+            return df, summary
+
+        # PnL de cada cadena con la función centralizada (cierre a $0.00): crédito +prima, débito −prima
+        qty = chains["Contratos"].fillna(1).replace(0, 1).astype(float)
+        metrics = [
+            calculate_pnl_metrics(float(prima or 0.0), 0.0, q, strategy, float(bp or 0.0), side, float(fees or 0.0))
+            for prima, q, strategy, bp, side, fees in zip(chains["Prima"], qty, chains["Estrategia"], chains["BP"],
+                                                          chains["Side"], chains["Comisiones"])
+        ]
+        chains["PnL"] = [round(pnl, 2) for pnl, _, _ in metrics]
+        max_profit = chains["Prima"].fillna(0.0) * qty * 100
+        chains["ProfitPct"] = np.where(max_profit > 0, chains["PnL"] / max_profit.where(max_profit > 0, 1.0) * 100, 0.0)
+        chains["RoC"] = [roc for _, _, roc in metrics]
+
+        out = df.copy()
+        rows = out.index[open_mask & out["ChainID"].isin(chains.index)]
+        chain_of = out.loc[rows, "ChainID"]
+        first = ~chain_of.duplicated()
+        assigned = (chain_of.map(chains["Accion"]) == "Asignada").to_numpy()
+        stamp = pd.Timestamp(now or datetime.now()).floor("s")
+        strike_txt = pd.to_numeric(out.loc[rows, "Strike"], errors="coerce").map(lambda k: f"{k:g}")
+        # Una columna de texto sin ningún valor (p. ej. importada de CSV) llega como float y no admite texto
+        for col in ("Notas", "WheelLeg"):
+            if out[col].dtype.kind == "f":
+                out[col] = out[col].astype(object)
+
+        out.loc[rows, "Estado"] = np.where(assigned, "Asignada", "Cerrada")
+        out.loc[rows, "FechaCierre"] = stamp
+        out.loc[rows, "CostoCierre"] = 0.0
+        out.loc[rows, "PnL_USD_Realizado"] = np.where(first, chain_of.map(chains["PnL"]), 0.0)
+        out.loc[rows, "ProfitPct"] = np.where(first, chain_of.map(chains["ProfitPct"]), 0.0)
+        out.loc[rows, "PnL_Capital_Pct"] = np.where(first, chain_of.map(chains["RoC"]), 0.0)
+        out.loc[rows, "Notas"] = out.loc[rows, "Notas"].fillna("").astype(str) + np.where(
+            assigned, " [ASIGNADA a $" + strike_txt + " — La Rueda iniciada]", " [OTM — expirado sin valor]")
+        if assigned.any():
+            out.loc[rows[assigned], "WheelLeg"] = "sell_put"
+        # Los CC vencidos OTM dejan libres sus acciones para vender uno nuevo
+        otm_chains = chains.index[chains["Accion"] == "OTM"]
+        out.loc[out["CoveredCallChainID"].isin(otm_chains), "CoveredCallChainID"] = pd.NA
+
+        # Posiciones de acciones de las CSP asignadas (mismo registro que la asignación del panel de gestión)
+        csp = out.loc[rows[assigned]]
+        if not csp.empty:
+            strike = pd.to_numeric(csp["Strike"], errors="coerce").fillna(0.0).to_numpy()
+            prima = pd.to_numeric(csp["PrimaRecibida"], errors="coerce").fillna(0.0).to_numpy()
+            contracts = pd.to_numeric(csp["Contratos"], errors="coerce").fillna(1).to_numpy()
+            cost_base = strike - prima
+            stock = pd.DataFrame({
+                "ID": [str(uuid4())[:8] for _ in range(len(csp))],
+                "ChainID": [str(uuid4())[:8] for _ in range(len(csp))],
+                "ParentID": csp["ID"].to_numpy(), "Ticker": csp["Ticker"].to_numpy(),
+                "FechaApertura": stamp.normalize(), "Expiry": pd.Timestamp("2099-12-31"),
+                "Estrategia": "Long Stock (Asignación)", "Setup": csp["Setup"].fillna("Otro").to_numpy(),
+                "Tags": "la-rueda,asignacion", "Side": "Buy", "OptionType": "Stock", "Strike": strike, "Delta": 1.0,
+                "PrimaRecibida": prima, "CostoCierre": 0.0, "Contratos": contracts,
+                "BuyingPower": strike * contracts * 100, "BreakEven": cost_base, "BreakEven_Upper": 0.0, "POP": 0.0,
+                "Estado": "Abierta",
+                "Notas": [f"Acciones por asignación de CSP. Costo base: ${c:.2f}" for c in cost_base],
+                "FechaCierre": pd.NaT, "MaxProfitUSD": 0.0, "ProfitPct": 0.0, "PnL_Capital_Pct": 0.0,
+                "PrecioAccionCierre": 0.0, "PnL_USD_Realizado": 0.0, "Comisiones": 0.0,
+                "Broker": csp["Broker"].to_numpy(), "EarningsDate": csp["EarningsDate"].to_numpy(),
+                "DividendosDate": csp["DividendosDate"].to_numpy(), "WheelParentChainID": csp["ChainID"].to_numpy(),
+                "CostBaseReal": cost_base, "CoveredCallChainID": pd.NA, "CoveredCallPrima": 0.0, "WheelLeg": "long_stock",
+            }).reindex(columns=out.columns)
+            out = pd.concat([out, stock], ignore_index=True)
+
+        counts = chains["Accion"].value_counts()
+        summary.update({"OTM": int(counts.get("OTM", 0)), "Asignada": int(counts.get("Asignada", 0)),
+                        "pnl": float(chains["PnL"].sum())})
+        return out, summary
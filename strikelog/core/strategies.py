@@ -0,0 +1,181 @@
+"""
+Clasificador de estrategias por tabla: cada cadena se reduce a una firma canónica de sus patas
+(lado, tipo, rango relativo del strike, proporción de contratos, rango del vencimiento) y la
+firma se busca en STRATEGY_RULES. Sirve para cualquier número de patas y vencimientos, y el
+resultado de cada firma se memoiza: las cadenas con la misma forma se clasifican una sola vez.
+"""
+from math import gcd
+
+import pandas as pd
+
+from .cache import LRUCache
+from .profiling import profiled
+from .payoff import _leg_frame
+
+_STRIKE_TOLERANCE = 1e-6   # Distancias entre strikes consecutivos que se consideran iguales (alas simétricas)
+
+_SIGNATURE_CACHE = LRUCache(512, name="Clasificador de estrategias")
+_UNKNOWN = object()   # Firma ya evaluada sin estrategia (None también se memoiza)
+
+
+def _sig(*legs) -> tuple:
+    """Firma canónica a partir de patas (side, type, rango strike, proporción, rango vencimiento)."""
+    return tuple(sorted(legs))
+
+
+def _build_rules() -> dict:
+    """Tabla firma -> estrategia. Un par (simétrica, rota) depende de si las alas son iguales."""
+    rules = {
+        # 1 pata
+        _sig(("Sell", "Put", 0, 1, 0)): "CSP (Cash Secured Put)",
+        _sig(("Sell", "Call", 0, 1, 0)): "CC (Covered Call)",
+        _sig(("Buy", "Call", 0, 1, 0)): "Long Call",
+        _sig(("Buy", "Put", 0, 1, 0)): "Long Put",
+        _sig(("Buy", "Stock", -1, 1, 0)): "Long Stock (Asignación)",
+        # Verticales
+        _sig(("Sell", "Put", 1, 1, 0), ("Buy", "Put", 0, 1, 0)): "Put Credit Spread",
+        _sig(("Sell", "Put", 0, 1, 0), ("Buy", "Put", 1, 1, 0)): "Put Debit Spread",
+        _sig(("Sell", "Call", 0, 1, 0), ("Buy", "Call", 1, 1, 0)): "Call Credit Spread",
+        _sig(("Sell", "Call", 1, 1, 0), ("Buy", "Call", 0, 1, 0)): "Call Debit Spread",
+        # Volatilidad vendida
+        _sig(("Sell", "Put", 0, 1, 0), ("Sell", "Call", 0, 1, 0)): "Straddle",
+        _sig(("Sell", "Put", 0, 1, 0), ("Sell", "Call", 1, 1, 0)): "Strangle",
+        _sig(("Sell", "Put", 1, 1, 0), ("Sell", "Call", 0, 1, 0)): "Strangle",
+        # Cobertura de acciones
+        _sig(("Buy", "Put", 0, 1, 0), ("Sell", "Call", 1, 1, 0)): "Collar",
+        _sig(("Buy", "Stock", -1, 1, 0), ("Sell", "Call", 0, 1, 0)): "CC (Covered Call)",
+        _sig(("Buy", "Stock", -1, 1, 0), ("Buy", "Put", 0, 1, 0), ("Sell", "Call", 1, 1, 0)): "Collar",
+        # 4 patas
+        _sig(("Buy", "Put", 0, 1, 0), ("Sell", "Put", 1, 1, 0),
+             ("Sell", "Call", 2, 1, 0), ("Buy", "Call", 3, 1, 0)): "Iron Condor",
+        _sig(("Buy", "Put", 0, 1, 0), ("Sell", "Put", 1, 1, 0),
+             ("Sell", "Call", 1, 1, 0), ("Buy", "Call", 2, 1, 0)): "Iron Fly",
+    }
+    butterfly = ("Butterfly", "Broken Wing Butterfly (BWB)")
+    for opt in ("Put", "Call"):
+        # Ratio 1x2: se vende el doble (Ratio Spread) o se compra el doble (Backspread) más OTM
+        far, near = (0, 1) if opt == "Put" else (1, 0)
+        rules[_sig(("Buy", opt, near, 1, 0), ("Sell", opt, far, 2, 0))] = "Ratio Spread"
+        rules[_sig(("Sell", opt, near, 1, 0), ("Buy", opt, far, 2, 0))] = "Backspread"
+        # Mariposas: 1-2-1 y, como las guarda el formulario (una sola cantidad), 1-1-1
+        for body in (2, 1):
+            rules[_sig(("Buy", opt, 0, 1, 0), ("Sell", opt, 1, body, 0), ("Buy", opt, 2, 1, 0))] = butterfly
+        # Calendarios y diagonales: vendida y comprada en vencimientos distintos
+        for sell_exp, buy_exp in ((0, 1), (1, 0)):
+            rules[_sig(("Sell", opt, 0, 1, sell_exp), ("Buy", opt, 0, 1, buy_exp))] = "Calendar"
+            for sell_rank, buy_rank in ((0, 1), (1, 0)):
+                rules[_sig(("Sell", opt, sell_rank, 1, sell_exp), ("Buy", opt, buy_rank, 1, buy_exp))] = "Diagonal"
+    return rules
+
+
+STRATEGY_RULES = _build_rules()
+
+
+def _is_fly_body(legs) -> bool:
+    """Patas de un mismo tipo y vencimiento: compradas en los extremos, vendidas dentro, en igual cantidad."""
+    ranks = [leg[2] for leg in legs]
+    if len(legs) < 3 or len({leg[4] for leg in legs}) != 1:
+        return False
+    wings = [leg for leg in legs if leg[2] in (min(ranks), max(ranks))]
+    body = [leg for leg in legs if leg not in wings]
+    return (bool(body) and all(leg[0] == "Buy" for leg in wings) and all(leg[0] == "Sell" for leg in body)
+            and sum(leg[3] for leg in wings) == sum(leg[3] for leg in body))
+
+
+def _is_time_spread(legs) -> bool:
+    """Una vendida y una comprada del mismo tipo en vencimientos distintos (calendario / diagonal)."""
+    return len(legs) == 2 and {leg[0] for leg in legs} == {"Buy", "Sell"} and legs[0][4] != legs[1][4]
+
+
+def _classify_structure(signature: tuple):
+    """Reglas generales para las firmas que no están en la tabla (ratios arbitrarios, Flyagonal)."""
+    by_type = {}
+    for leg in signature:
+        by_type.setdefault(leg[1], []).append(leg)
+
+    # Ratio N×M de un solo tipo y vencimiento: manda el lado con más contratos
+    if len(signature) == 2 and len(by_type) == 1 and signature[0][4] == signature[1][4]:
+        qty = {leg[0]: leg[3] for leg in signature}
+        if set(qty) == {"Buy", "Sell"} and qty["Buy"] != qty["Sell"]:
+            return "Ratio Spread" if qty["Sell"] > qty["Buy"] else "Backspread"
+
+    # Flyagonal: mariposa (simétrica o rota) de un tipo + calendario / diagonal del otro
+    if set(by_type) == {"Put", "Call"}:
+        calls, puts = by_type["Call"], by_type["Put"]
+        if (_is_fly_body(calls) and _is_time_spread(puts)) or (_is_fly_body(puts) and _is_time_spread(calls)):
+            return "Flyagonal"
+    return None
+
+
+def classify_signature(signature: tuple, balanced: bool = True):
+    """Estrategia de una firma canónica (None si no se reconoce). Memoizada por (firma, alas iguales)."""
+    key = (signature, balanced)
+    cached = _SIGNATURE_CACHE.get(key, _UNKNOWN)
+    if cached is not _UNKNOWN:
+        return cached
+    strategy = STRATEGY_RULES.get(signature)
+    if isinstance(strategy, tuple):
+        strategy = strategy[0] if balanced else strategy[1]
+    elif strategy is None:
+        strategy = _classify_structure(signature)
+    _SIGNATURE_CACHE.put(key, strategy)
+    return strategy
+
+
+def _leg_tuple(leg: dict) -> tuple:
+    """Pata del formulario (dict) -> (side, type, strike, contratos, vencimiento o None)."""
+    opt_type = leg.get("OptionType") or leg.get("Type") or "Put"
+    try:
+        contracts = int(round(float(leg.get("Contratos") or 1)))
+    except (TypeError, ValueError):
+        contracts = 1
+    try:
+        expiry = pd.Timestamp(leg.get("Expiry"))
+    except (TypeError, ValueError):
+        expiry = pd.NaT
+    return (leg.get("Side", "Sell"), opt_type, float(leg.get("Strike") or 0.0), max(contracts, 1),
+            None if pd.isna(expiry) else expiry)
+
+
+def chain_signature(legs) -> tuple:
+    """
+    Firma canónica de una cadena a partir de tuplas (side, type, strike, contratos, vencimiento).
+    Las patas repetidas (mismo lado, tipo, strike y vencimiento) se suman; strikes y vencimientos
+    se sustituyen por su rango dentro de la cadena y los contratos por su proporción (÷ MCD). Las
+    acciones no tienen rango de strike (-1). Devuelve (firma, alas simétricas).
+    """
+    merged = {}
+    for side, opt_type, strike, contracts, expiry in legs:
+        key = (side, opt_type, round(strike, 4), None if opt_type == "Stock" else expiry)
+        merged[key] = merged.get(key, 0) + contracts
+    strikes = sorted({key[2] for key in merged if key[1] != "Stock"})
+    expiries = sorted({key[3] for key in merged if key[3] is not None})
+    strike_rank = {strike: rank for rank, strike in enumerate(strikes)}
+    expiry_rank = {expiry: rank for rank, expiry in enumerate(expiries)}
+    unit = gcd(*merged.values())
+    signature = tuple(sorted(
+        (side, opt_type, -1 if opt_type == "Stock" else strike_rank[strike], qty // unit, expiry_rank.get(expiry, 0))
+        for (side, opt_type, strike, expiry), qty in merged.items()
+    ))
+    gaps = [high - low for low, high in zip(strikes, strikes[1:])]
+    return signature, all(abs(a - b) <= _STRIKE_TOLERANCE for a, b in zip(gaps, reversed(gaps)))
+
+
+@profiled("Clasificador de estrategias")
+def classify_chains(legs) -> pd.Series:
+    """
+    Estrategia detectada de todas las cadenas de `legs` (DataFrame del journal o lista de dicts)
+    en una pasada: columnas normalizadas una vez, una firma por cadena y una búsqueda memoizada
+    por firma. None si la forma no se reconoce.
+    """
+    if len(legs) == 0:
+        return pd.Series(dtype=object, name="Estrategia")
+    frame = _leg_frame(legs)
+    expiry = frame["Expiry"].astype(object).where(frame["Expiry"].notna(), None)
+    contracts = frame["Contratos"].round().clip(lower=1).astype(int)
+    chains = {}
+    for chain_id, *leg in zip(frame["ChainID"], frame["Side"], frame["OptionType"], frame["Strike"].astype(float),
+                              contracts, expiry):
+        chains.setdefault(chain_id, []).append(leg)
+    return pd.Series([classify_signature(*chain_signature(chain_legs)) for chain_legs in chains.values()],
+                     index=pd.Index(list(chains), name="ChainID"), dtype=object, name="Estrategia")
@@ -0,0 +1,47 @@
+"""
+Utilidades comunes de las pruebas del núcleo (strikelog.core): journals de ejemplo y un
+directorio de trabajo aislado para el motor de almacenamiento (rutas relativas de config.py).
+"""
+import os
+import sys
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from strikelog.core import COLUMNS, JournalManager, storage  # noqa: E402
+
+
+def make_leg(**fields) -> dict:
+    """Fila del journal con valores por defecto (pata abierta Sell Put de 1 contrato)."""
+    row = {
+        "ID": fields.get("ID", "L1"), "ChainID": "C1", "ParentID": pd.NA, "Ticker": "XYZ",
+        "FechaApertura": datetime(2026, 1, 5, 10, 0), "Expiry": datetime(2026, 2, 20),
+        "Estrategia": "CSP (Cash Secured Put)", "Setup": "Otro", "Tags": "", "Side": "Sell",
+        "OptionType": "Put", "Strike": 100.0, "Delta": 0.0, "PrimaRecibida": 2.0, "CostoCierre": 0.0,
+        "Contratos": 1, "BuyingPower": 10000.0, "BreakEven": 98.0, "BreakEven_Upper": 0.0, "POP": 0.0,
+        "Estado": "Abierta", "Notas": "", "FechaCierre": pd.NaT, "MaxProfitUSD": 200.0, "ProfitPct": 0.0,
+        "PnL_Capital_Pct": 0.0, "PrecioAccionCierre": 0.0, "PnL_USD_Realizado": 0.0, "Comisiones": 0.0,
+        "Broker": "IB",
+    }
+    row.update(fields)
+    return row
+
+
+def make_journal(*legs) -> pd.DataFrame:
+    """DataFrame normalizado con las columnas de COLUMNS a partir de dicts de make_leg."""
+    return JournalManager.normalize_df(pd.DataFrame(list(legs)).reindex(columns=COLUMNS))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """
+    Directorio de trabajo vacío con instancias nuevas del journal y del almacén de copias:
+    los singletons de storage se indexan por ruta relativa y no deben arrastrar el espejo de
+    otra prueba.
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(storage, "_JOURNAL_STORES", {})
+    monkeypatch.setattr(storage, "_BACKUP_STORES", {})
+    return tmp_path
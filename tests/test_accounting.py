@@ -0,0 +1,57 @@
+"""Ayudas del formulario de alta: prima con signo, Break Even y POP con el motor de payoff."""
+from datetime import date, timedelta
+
+import pytest
+
+from strikelog.core import (
+    LEG_DEFAULTS, is_time_spread, pop_legs, pop_table, signed_net_premium, suggest_breakeven, suggest_pop,
+)
+
+FRONT, BACK = "2026-11-20", "2026-12-18"
+
+
+def _form_legs(strategy, strike=100.0, expiries=(FRONT, BACK)):
+    """Patas por defecto del formulario para `strategy`, todas al mismo strike."""
+    return [{"Side": side, "Type": opt, "OptionType": opt, "Strike": strike, "Expiry": expiry}
+            for (side, opt), expiry in zip(LEG_DEFAULTS[strategy], expiries)]
+
+
+def test_calendar_premium_is_a_debit_even_with_the_sold_leg_first():
+    legs = _form_legs("Calendar")
+    assert legs[0]["Side"] == "Sell"
+    assert is_time_spread("Calendar", legs)
+    assert signed_net_premium("Calendar", legs, 1.0) == -1.0
+    assert signed_net_premium("Calendar", legs, -1.0) == -1.0
+
+
+def test_custom_leg_set_with_later_bought_leg_is_a_time_spread():
+    legs = _form_legs("Calendar")
+    assert signed_net_premium("Custom / Other", legs, 1.0) == -1.0
+    same_expiry = _form_legs("Calendar", expiries=(FRONT, FRONT))
+    assert not is_time_spread("Custom / Other", same_expiry)
+    assert signed_net_premium("Custom / Other", same_expiry, 1.0) == 1.0
+
+
+def test_calendar_breakevens_bracket_the_strike():
+    lower, upper = suggest_breakeven("Calendar", _form_legs("Calendar"), 1.0)
+    assert 90.0 < lower < 100.0 < upper < 110.0
+
+
+def test_credit_spread_breakeven_keeps_credit_sign():
+    legs = [{"Side": "Sell", "Type": "Put", "Strike": 100.0}, {"Side": "Buy", "Type": "Put", "Strike": 95.0}]
+    assert suggest_breakeven("Put Credit Spread", legs, 1.0) == (pytest.approx(99.0), 0.0)
+
+
+def test_calendar_pop_and_ev_account_for_the_debit():
+    # POP relativo a hoy: el Monte Carlo evalúa en el vencimiento cercano
+    front = date.today() + timedelta(days=34)
+    legs = _form_legs("Calendar", expiries=(front.isoformat(), (front + timedelta(days=28)).isoformat()))
+    pop = suggest_pop(0.5, "Sell", strategy="Calendar", legs_data=legs, total_premium=1.0,
+                      spot=100.0, iv=0.3, expiry=front.isoformat())
+    assert 0.0 < pop < 80.0
+
+    sim_legs = pop_legs("Calendar", legs, front.isoformat())
+    paid = pop_table(sim_legs, signed_net_premium("Calendar", legs, 1.0), 100.0, 0.3).iloc[0]
+    free = pop_table(sim_legs, 0.0, 100.0, 0.3).iloc[0]
+    assert paid["POP"] == pytest.approx(pop, abs=0.1)
+    assert paid["EV"] == pytest.approx(free["EV"] - 1.0)
@@ -0,0 +1,78 @@
+"""Calendarios de earnings / ex-dividend: caché con TTL y consulta concurrente."""
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from strikelog.core import CalendarCache, StaticCalendarProvider, fetch_calendars
+
+CALENDARS = {"AAPL": (date(2026, 1, 29), date(2026, 2, 9)), "SPY": (None, date(2026, 3, 20))}
+
+
+class FailingProvider(StaticCalendarProvider):
+    """Proveedor que falla en los tickers indicados."""
+
+    def __init__(self, calendars, broken):
+        super().__init__(calendars)
+        self.broken = set(broken)
+
+    def fetch(self, ticker_symbol: str):
+        if ticker_symbol in self.broken:
+            raise ConnectionError(ticker_symbol)
+        return super().fetch(ticker_symbol)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CalendarCache(str(tmp_path / "calendar_cache.json"), ttl_hours=12)
+
+
+def test_second_sync_is_served_from_cache(cache):
+    provider = StaticCalendarProvider(CALENDARS)
+    results, failed = fetch_calendars(["AAPL", "SPY", "AAPL"], provider, cache)
+    assert results == CALENDARS and failed == []
+    assert provider.calls == 2   # Tickers repetidos se consultan una vez
+
+    progress = []
+    again, _ = fetch_calendars(["AAPL", "SPY"], provider, cache,
+                               on_progress=lambda done, total, ticker: progress.append((done, total)))
+    assert provider.calls == 2
+    assert again == {"AAPL": ("2026-01-29", "2026-02-09"), "SPY": (None, "2026-03-20")}
+    assert progress == [(2, 2)]
+
+
+def test_cache_persists_and_expires(cache):
+    stamp = datetime(2026, 1, 10, 8, 0)
+    cache.put_many({"AAPL": CALENDARS["AAPL"]}, "static", now=stamp)
+    reopened = CalendarCache(cache.path, ttl_hours=12)
+    assert reopened.get("AAPL", "static", now=stamp + timedelta(hours=11)) == ("2026-01-29", "2026-02-09")
+    assert reopened.get("AAPL", "static", now=stamp + timedelta(hours=13)) is None
+    # Las entradas de otro proveedor no sirven
+    assert reopened.get("AAPL", "yahoo", now=stamp) is None
+
+
+def test_tickers_without_dates_are_cached_too(cache):
+    provider = StaticCalendarProvider({})
+    fetch_calendars(["XYZ"], provider, cache)
+    results, _ = fetch_calendars(["XYZ"], provider, cache)
+    assert results == {"XYZ": (None, None)}
+    assert provider.calls == 1
+
+
+def test_failed_tickers_are_reported_and_not_cached(cache):
+    provider = FailingProvider(CALENDARS, broken=["SPY"])
+    results, failed = fetch_calendars(["AAPL", "SPY"], provider, cache)
+    assert failed == ["SPY"] and set(results) == {"AAPL"}
+    assert cache.get("SPY", provider.name) is None
+
+
+def test_slow_provider_times_out(cache):
+    provider = StaticCalendarProvider(CALENDARS, delay=0.5)
+    results, failed = fetch_calendars(["AAPL", "SPY"], provider, cache, workers=2, timeout=0.05)
+    assert results == {} and sorted(failed) == ["AAPL", "SPY"]
+
+
+def test_lookups_run_concurrently(cache):
+    provider = StaticCalendarProvider({}, delay=0.2)
+    start = datetime.now()
+    fetch_calendars([f"T{i}" for i in range(8)], provider, cache, workers=8, timeout=5)
+    assert (datetime.now() - start).total_seconds() < 1.0   # En serie serían 1.6 s
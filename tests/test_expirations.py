@@ -0,0 +1,68 @@
+"""Vencimientos por lotes (JournalManager.expire_chains)."""
+from datetime import datetime
+
+import pytest
+
+from strikelog.core import JournalManager
+
+from conftest import make_journal, make_leg
+
+NOW = datetime(2026, 2, 21, 9, 30)
+
+
+@pytest.fixture
+def journal():
+    return make_journal(
+        make_leg(ID="p1", ChainID="PCS", Estrategia="Put Credit Spread", PrimaRecibida=1.0, Contratos=2,
+                 Comisiones=2.6),
+        make_leg(ID="p2", ChainID="PCS", Estrategia="Put Credit Spread", Side="Buy", Strike=95.0,
+                 PrimaRecibida=0.0, Contratos=2),
+        make_leg(ID="c1", ChainID="CSP", PrimaRecibida=2.0),
+        make_leg(ID="s1", ChainID="STK", Estrategia="Long Stock (Asignación)", Side="Buy", OptionType="Stock",
+                 Strike=50.0, CoveredCallChainID="CC"),
+        make_leg(ID="cc1", ChainID="CC", Estrategia="CC (Covered Call)", OptionType="Call", Strike=55.0,
+                 PrimaRecibida=0.8),
+        make_leg(ID="m1", ChainID="MAN"),
+    )
+
+
+def test_otm_closes_every_leg_with_pnl_on_the_first(journal):
+    out, summary = JournalManager.expire_chains(journal, {"PCS": "OTM"}, now=NOW)
+    legs = out[out["ChainID"] == "PCS"].set_index("ID")
+    assert set(legs["Estado"]) == {"Cerrada"}
+    assert (legs["FechaCierre"] == NOW).all()
+    # Crédito neto 1.00 × 2 contratos × 100 − comisiones
+    assert legs.loc["p1", "PnL_USD_Realizado"] == pytest.approx(197.4)
+    assert legs.loc["p2", "PnL_USD_Realizado"] == 0.0
+    assert summary["OTM"] == 1 and summary["pnl"] == pytest.approx(197.4)
+
+
+def test_otm_covered_call_releases_its_stock(journal):
+    out, _ = JournalManager.expire_chains(journal, {"CC": "OTM"}, now=NOW)
+    assert out.set_index("ID").isna().loc["s1", "CoveredCallChainID"]
+
+
+def test_assigned_csp_opens_wheel_stock_at_net_cost(journal):
+    out, summary = JournalManager.expire_chains(journal, {"CSP": "Asignada"}, now=NOW)
+    put = out.set_index("ID").loc["c1"]
+    assert put["Estado"] == "Asignada" and put["WheelLeg"] == "sell_put"
+
+    stock = out[out["ParentID"] == "c1"]
+    assert len(stock) == 1
+    stock = stock.iloc[0]
+    assert (stock["OptionType"], stock["Estado"], stock["Strike"]) == ("Stock", "Abierta", 100.0)
+    assert stock["BreakEven"] == pytest.approx(98.0)   # Strike − prima cobrada
+    assert summary["Asignada"] == 1
+
+
+def test_assignment_is_only_for_single_leg_csp(journal):
+    out, summary = JournalManager.expire_chains(journal, {"PCS": "Asignada"}, now=NOW)
+    assert summary["omitidas"] == ["PCS"]
+    assert out is journal
+
+
+def test_manual_and_unknown_chains_are_untouched(journal):
+    out, summary = JournalManager.expire_chains(journal, {"MAN": "Manual", "NOPE": "OTM"}, now=NOW)
+    assert out is journal
+    assert summary == {"OTM": 0, "Asignada": 0, "pnl": 0.0, "omitidas": []}
+    assert (journal["Estado"] == "Abierta").all()
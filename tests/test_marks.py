@@ -0,0 +1,117 @@
+"""Almacén local de cotizaciones, proveedores de marks y mark-to-market de las cadenas abiertas."""
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from strikelog.core import (
+    CsvDropMarkProvider, FakeMarkProvider, QuoteStore, mark_to_market, mark_to_market_totals, portfolio_pop,
+    refresh_marks, summarize_active_chain,
+)
+
+from conftest import make_journal, make_leg
+
+EXPIRY = "2026-11-20"
+NOW = datetime(2026, 10, 16, 16, 0)
+
+
+@pytest.fixture
+def store(workdir):
+    return QuoteStore(str(workdir / "marks.db"))
+
+
+@pytest.fixture
+def journal():
+    return make_journal(
+        make_leg(ID="a", ChainID="A", Expiry=EXPIRY),
+        make_leg(ID="b", ChainID="B", Ticker="ABC", Strike=50.0, PrimaRecibida=1.0, BreakEven=49.0, Expiry=EXPIRY),
+        make_leg(ID="c", ChainID="C", Ticker="NOQ", Expiry=EXPIRY),
+    )
+
+
+def _put_mark(mark, ts, ticker="XYZ"):
+    return pd.DataFrame([{"Ticker": ticker, "Expiry": EXPIRY, "Strike": 100, "OptionType": "Put", "Mark": mark, "Ts": ts}])
+
+
+def test_record_normalizes_keys_and_serves_latest_snapshot(store, journal):
+    marks = pd.DataFrame([{"Ticker": "xyz ", "Expiry": EXPIRY, "Strike": 100, "OptionType": "put", "Mark": 0.5}])
+    assert store.record({"XYZ": {"spot": 105.0, "iv": 0.25}}, marks, ts="2026-10-16 15:00") == (1, 1)
+    store.record({"XYZ": {"spot": 107.0}}, _put_mark(0.4, None), ts="2026-10-17 10:00")
+
+    assert store.get_quotes(["XYZ"])["XYZ"]["spot"] == 107.0
+    latest = store.latest_marks(journal)
+    assert latest.loc[0, "Mark"] == pytest.approx(0.4)
+    assert latest.loc[1:, "Mark"].isna().all()
+    assert store.history("XYZ")["Spot"].tolist() == [105.0, 107.0]
+    assert store.history("XYZ", EXPIRY, 100, "Put")["Mark"].tolist() == [0.5, 0.4]
+
+
+def test_same_snapshot_twice_is_not_duplicated(store):
+    for _ in range(2):
+        store.record({"XYZ": {"spot": 105.0}}, _put_mark(0.5, None), ts="2026-10-16 15:00")
+    assert len(store.history("XYZ")) == 1
+    assert len(store.history("XYZ", EXPIRY, 100, "Put")) == 1
+
+
+def test_mark_to_market_uses_marks_then_theoretical_prices(store, journal):
+    store.record({"XYZ": {"spot": 105.0, "iv": 0.25}, "ABC": {"spot": 52.0}}, _put_mark(0.5, None), ts="2026-10-16 15:00")
+    table = pd.DataFrame([summarize_active_chain(journal, group) for _, group in journal.groupby("ChainID")])
+    mtm = mark_to_market(journal, table, store=store, quotes={}, now=NOW)
+
+    # CSP de 2.00 con mark de 0.50: 150 $ no realizados de 200 $ posibles, spot 7 $ por encima del BE
+    marked = mtm.loc["A"]
+    assert marked["PnLNoRealizado"] == pytest.approx(150.0)
+    assert marked["PctMaxBeneficio"] == pytest.approx(75.0)
+    assert marked["BECercano"] == pytest.approx(98.0)
+    assert marked["DistBEPct"] == pytest.approx(7 / 105 * 100)
+    assert marked["PatasTeoricas"] == 0
+
+    assert mtm.loc["B", "PatasTeoricas"] == 1 and pd.notna(mtm.loc["B", "ValorActual"])
+    assert pd.isna(mtm.loc["C", "ValorActual"])   # Sin spot ni mark
+
+    totals = mark_to_market_totals(mtm)
+    assert (totals["valoradas"], totals["sin_valorar"], totals["patas_teoricas"]) == (2, 1, 1)
+    assert totals["ultimo_mark"] == pd.Timestamp("2026-10-16 15:00")
+
+
+def test_calendar_chain_is_valued_and_simulated_as_a_debit(store):
+    # Calendar del formulario: pata vendida primero y la prima (1.00 pagada) guardada en positivo
+    front = datetime.combine(date.today() + timedelta(days=34), datetime.min.time())
+    legs = make_journal(
+        make_leg(ID="k1", ChainID="K", Estrategia="Calendar", PrimaRecibida=1.0, Expiry=front, BreakEven=0.0),
+        make_leg(ID="k2", ChainID="K", Estrategia="Calendar", Side="Buy", PrimaRecibida=0.0,
+                 Expiry=front + timedelta(days=28)),
+    )
+    summary = summarize_active_chain(legs, legs)
+    assert summary["net_credit_chain"] == pytest.approx(1.0)
+    assert summary["payoff_premium"] == pytest.approx(-1.0)
+    assert 90.0 < summary["calculated_be"] < 100.0 < summary["calculated_be_upper"] < 110.0
+
+    pop = portfolio_pop(legs, pd.Series({"K": summary["payoff_premium"]}), quotes={"XYZ": {"spot": 100.0, "iv": 0.3}})
+    assert 0.0 < pop.loc["K", "POP"] < 80.0
+
+    mtm = mark_to_market(legs, pd.DataFrame([summary]), store=store, quotes={"XYZ": {"spot": 100.0, "iv": 0.3}})
+    assert mtm.loc["K", "PnLCampaña"] == pytest.approx(mtm.loc["K", "ValorActual"] - 100.0)
+
+
+def test_csv_drop_provider_reads_symbols_and_bid_ask(workdir):
+    drop = workdir / "quotes_drop"
+    drop.mkdir()
+    (drop / "positions.csv").write_text(
+        "Symbol,Mark,Bid,Ask,Implied Volatility\n"
+        "XYZ,105.00,,,\n"
+        "XYZ 11/20/2026 100.00 P,,0.40,0.60,32.5\n"
+        "ABC 11/20/2026 50.00 C,0.80,,,\n", encoding="utf-8")
+    spots, marks = CsvDropMarkProvider(str(drop)).fetch(["XYZ"])
+    assert spots.set_index("Ticker").loc["XYZ", "Spot"] == pytest.approx(105.0)
+    assert len(marks) == 1
+    mark = marks.iloc[0]
+    assert (mark["Strike"], mark["OptionType"]) == (100.0, "Put")
+    assert mark["Mark"] == pytest.approx(0.5) and mark["IV"] == pytest.approx(0.325)
+
+
+def test_refresh_marks_records_provider_snapshot(store, journal):
+    provider = FakeMarkProvider({"XYZ": 105.0, "ABC": 52.0}, iv=0.3, now=NOW)
+    counts = refresh_marks(journal, provider, store)
+    assert counts == {"spots": 2, "marks": 2, "proveedor": "fake"}
+    assert store.latest_marks(journal)["Mark"].notna().tolist() == [True, True, False]
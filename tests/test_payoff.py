@@ -0,0 +1,86 @@
+"""Motor de payoff: Break Evens, beneficio y pérdida máximos por acción."""
+import math
+
+import pandas as pd
+import pytest
+
+from strikelog.core import payoff_profile, payoff_table
+
+
+def _put(side, strike, qty=1, **extra):
+    return {"Side": side, "Type": "Put", "Strike": strike, "Contratos": qty, **extra}
+
+
+def _call(side, strike, qty=1, **extra):
+    return {"Side": side, "Type": "Call", "Strike": strike, "Contratos": qty, **extra}
+
+
+def test_csp_breakeven_is_strike_minus_credit():
+    profile = payoff_profile([_put("Sell", 100)], 2.0)
+    assert profile["breakevens"] == (98.0,)
+    assert profile["max_profit"] == pytest.approx(2.0)
+    assert profile["max_loss"] == pytest.approx(98.0)
+
+
+def test_naked_call_has_unlimited_loss():
+    profile = payoff_profile([_call("Sell", 100)], 2.0)
+    assert profile["breakevens"] == (102.0,)
+    assert math.isinf(profile["max_loss"])
+
+
+def test_iron_condor_has_two_breakevens_around_short_strikes():
+    legs = [_put("Buy", 90), _put("Sell", 95), _call("Sell", 105), _call("Buy", 110)]
+    profile = payoff_profile(legs, 1.5)
+    assert profile["breakevens"] == (93.5, 106.5)
+    assert profile["max_profit"] == pytest.approx(1.5)
+    assert profile["max_loss"] == pytest.approx(3.5)   # Ancho del ala − crédito
+
+
+def test_long_call_butterfly_debit():
+    legs = [_call("Buy", 90), _call("Sell", 100, qty=2), _call("Buy", 110)]
+    profile = payoff_profile(legs, -2.0)
+    assert profile["breakevens"] == (92.0, 108.0)
+    assert profile["max_profit"] == pytest.approx(8.0)
+    assert profile["max_loss"] == pytest.approx(2.0)
+
+
+def test_put_ratio_spread_weights_legs_by_contracts():
+    # Compra 1 put 100, vende 2 puts 95 con 0.50 de crédito: pico en 95 y BE bajo 95 − 5.50
+    profile = payoff_profile([_put("Buy", 100), _put("Sell", 95, qty=2)], 0.5)
+    assert profile["breakevens"] == (89.5,)
+    assert profile["max_profit"] == pytest.approx(5.5)
+    assert profile["max_loss"] == pytest.approx(89.5)
+
+
+def test_calendar_values_back_month_and_loses_at_most_the_debit():
+    legs = [_call("Sell", 100, Expiry="2026-11-20"), _call("Buy", 100, Expiry="2026-12-18")]
+    profile = payoff_profile(legs, -1.5)
+    lower, upper = profile["breakevens"]
+    assert lower < 100 < upper
+    assert profile["max_profit"] > 0
+    assert profile["max_loss"] == pytest.approx(1.5)
+
+
+def test_covered_stock_leg_is_linear():
+    legs = [{"Side": "Buy", "Type": "Stock", "Strike": 50}, _call("Sell", 55)]
+    profile = payoff_profile(legs, 1.0)
+    assert profile["breakevens"] == (49.0,)
+    assert profile["max_profit"] == pytest.approx(6.0)
+
+
+def test_batch_table_matches_single_chain_profiles():
+    chains = {
+        "csp": ([_put("Sell", 100)], 2.0),
+        "ic": ([_put("Buy", 90), _put("Sell", 95), _call("Sell", 105), _call("Buy", 110)], 1.5),
+    }
+    legs = pd.DataFrame([{**leg, "ChainID": chain_id} for chain_id, (chain_legs, _) in chains.items()
+                         for leg in chain_legs])
+    table = payoff_table(legs, {chain_id: net for chain_id, (_, net) in chains.items()})
+    for chain_id, (chain_legs, net) in chains.items():
+        single = payoff_profile(chain_legs, net)
+        assert table.loc[chain_id, "BreakEvens"] == single["breakevens"]
+        assert table.loc[chain_id, "MaxLoss"] == pytest.approx(single["max_loss"])
+
+
+def test_empty_legs_return_empty_table():
+    assert payoff_table([]).empty
@@ -0,0 +1,70 @@
+"""Importación de extractos: símbolos de opción y emparejado FIFO de aperturas, cierres y rolls."""
+import pandas as pd
+import pytest
+
+from strikelog.core import COLUMNS, iter_statement_fills, pair_statement_fills, parse_option_symbol
+
+HEADER = "Date,Action,Symbol,Quantity,Price,Fees & Comm,Amount"
+
+OPEN_AND_ROLL = [
+    HEADER,
+    "01/05/2026,Sell to Open,XYZ 02/20/2026 100.00 P,2,2.00,1.30,398.70",
+    "01/05/2026,Buy to Open,XYZ 02/20/2026 95.00 P,2,0.80,1.30,-161.30",
+    "01/20/2026,Buy to Close,XYZ 02/20/2026 100.00 P,2,1.00,1.30,-201.30",
+    "01/20/2026,Sell to Close,XYZ 02/20/2026 95.00 P,2,0.30,1.30,58.70",
+    "01/20/2026,Sell to Open,XYZ 03/20/2026 100.00 P,2,2.50,1.30,498.70",
+    "01/20/2026,Buy to Open,XYZ 03/20/2026 95.00 P,2,1.00,1.30,-201.30",
+]
+
+
+def _import(lines, df=None):
+    return pair_statement_fills(pd.DataFrame(columns=COLUMNS) if df is None else df, iter_statement_fills(lines))
+
+
+@pytest.mark.parametrize("text", ["NFLX 06/18/2026 85.00 P", "NFLX  260618P00085000", "NFLX 18JUN26 85 P"])
+def test_option_symbol_formats(text):
+    option = parse_option_symbol(text)
+    assert (option["Ticker"], option["Expiry"], option["Strike"], option["OptionType"]) == (
+        "NFLX", pd.Timestamp("2026-06-18"), 85.0, "Put")
+
+
+def test_csv_fills_are_streamed():
+    fills = list(iter_statement_fills(iter(OPEN_AND_ROLL)))
+    assert len(fills) == 6
+    assert fills[0]["Side"] == "Sell" and fills[0]["Efecto"] == "open" and fills[0]["Contratos"] == 2
+
+
+def test_same_day_close_and_open_is_a_roll():
+    df, report = _import(OPEN_AND_ROLL)
+    assert (report["opened_legs"], report["closed_legs"], report["chains"], report["rolls"]) == (4, 2, 2, 1)
+
+    rolled = df[df["Estado"] == "Rolada"]
+    opened = df[df["Estado"] == "Abierta"]
+    assert rolled["ChainID"].nunique() == 1 and opened["ChainID"].nunique() == 1
+    assert set(opened["ParentID"]) == set(rolled["ID"])
+    assert set(df["Estrategia"]) == {"Put Credit Spread"}
+
+    # Prima y cierre netos en la primera pata: (1.20 − 0.70) × 2 × 100 − comisiones de las 4 órdenes
+    first = rolled[rolled["Side"] == "Sell"].iloc[0]
+    assert first["PrimaRecibida"] == pytest.approx(1.2)
+    assert first["CostoCierre"] == pytest.approx(0.7)
+    assert first["PnL_USD_Realizado"] == pytest.approx(94.8)
+
+
+def test_closes_match_legs_already_in_the_journal():
+    df, _ = _import(OPEN_AND_ROLL)
+    closes = [HEADER,
+              "02/01/2026,Buy to Close,XYZ 03/20/2026 100.00 P,2,0.50,1.30,-101.30",
+              "02/01/2026,Sell to Close,XYZ 03/20/2026 95.00 P,2,0.10,1.30,18.70"]
+    df, report = _import(closes, df)
+    assert report["closed_legs"] == 2 and not report["unmatched"]
+    assert (df["Estado"] == "Abierta").sum() == 0
+    assert df.loc[df["Estado"] == "Cerrada", "PnL_USD_Realizado"].sum() == pytest.approx(214.8)
+
+
+def test_reimport_is_idempotent_and_reports_unmatched_closes():
+    df, _ = _import(OPEN_AND_ROLL)
+    again, report = _import(OPEN_AND_ROLL + ["02/02/2026,Buy to Close,ABC 02/20/2026 50.00 C,1,0.10,0.65,-10.65"], df)
+    assert report["duplicates"] == 4 and report["opened_legs"] == 0
+    assert len(again) == len(df)
+    assert any("ABC" in line for line in report["unmatched"])
@@ -0,0 +1,121 @@
+"""Motor de almacenamiento: log de mutaciones, deshacer, compactación y restauración de copias."""
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from strikelog.core import BackupStore, JournalManager, SQLiteJournal, get_backup_store, get_journal_store, storage
+
+from conftest import make_journal, make_leg
+
+
+@pytest.fixture
+def saved(workdir):
+    """Journal de dos cadenas ya persistido (primer guardado: escritura completa de la base de datos)."""
+    df = make_journal(make_leg(ID="A", ChainID="C1", Notas="original"),
+                      make_leg(ID="B", ChainID="C2", Ticker="ABC", Strike=50.0))
+    return JournalManager.save_with_backup(df)
+
+
+def _reload():
+    """Journal leído de disco por una instancia nueva del motor (sin el espejo en memoria)."""
+    return SQLiteJournal(get_journal_store().path).load()
+
+
+def test_save_appends_only_changed_cells(saved):
+    store = get_journal_store()
+    df = saved.copy()
+    df.loc[df["ID"] == "A", "Notas"] = "ajuste"
+    JournalManager.save_with_backup(df)
+
+    sets = [r for r in store.log.pending() if r["op"] == "set"]
+    assert {(r["id"], r["col"], r["new"]) for r in sets} == {("A", "Notas", "ajuste")}
+    assert _reload().set_index("ID").loc["A", "Notas"] == "ajuste"
+
+
+def test_unchanged_save_writes_nothing(saved):
+    store = get_journal_store()
+    version = store.version
+    JournalManager.save_with_backup(saved.copy())
+    assert store.log.pending_count() == 0
+    assert store.version == version
+
+
+def test_insert_and_delete_round_trip(saved):
+    df = saved[saved["ID"] != "B"]
+    df = JournalManager.save_with_backup(
+        make_journal(*df.to_dict("records"), make_leg(ID="N", ChainID="C3", Strike=90.0)))
+    ops = sorted((r["op"], r["id"]) for r in get_journal_store().log.pending())
+    assert ops == [("delete", "B"), ("insert", "N")]
+    assert sorted(_reload()["ID"]) == ["A", "N"]
+
+
+def test_undo_reverts_last_transaction_and_is_logged(saved):
+    df = saved.copy()
+    df.loc[df["ID"] == "A", "Estado"] = "Cerrada"
+    df = JournalManager.save_with_backup(df)
+
+    df, reverted = JournalManager.undo_last(df)
+    assert reverted == 1
+    assert df.set_index("ID").loc["A", "Estado"] == "Abierta"
+    assert _reload().set_index("ID").loc["A", "Estado"] == "Abierta"
+    # El deshacer queda en el log y no se vuelve a deshacer
+    assert any(r.get("undo_of") for r in get_journal_store().log.pending())
+    assert JournalManager.undo_last(df)[1] == 0
+
+
+def test_compaction_moves_log_to_database_and_archive(saved, monkeypatch):
+    monkeypatch.setattr(storage, "WAL_COMPACT_EVERY", 2)
+    store = get_journal_store()
+    df = saved.copy()
+    for note in ("uno", "dos"):
+        df.loc[df["ID"] == "B", "Notas"] = note
+        df = JournalManager.save_with_backup(df)
+
+    assert store.log.pending_count() == 0
+    assert [r["new"] for r in store.log.history("B") if r.get("col") == "Notas"] == ["uno", "dos"]
+    assert store.read().set_index("ID").loc["B", "Notas"] == "dos"
+    assert [m["source"] for m in get_backup_store().list_snapshots()][-1] == "compact"
+
+    # El deshacer sigue funcionando con la transacción ya archivada
+    df, reverted = JournalManager.undo_last(df)
+    assert reverted == 1
+    assert _reload().set_index("ID").loc["B", "Notas"] == "uno"
+
+
+def test_restore_replays_log_after_snapshot(saved):
+    backups = get_backup_store()
+    base_ts = datetime.now() - timedelta(hours=1)
+    backups.snapshot(saved, source="manual", ts=base_ts)
+    before_edit = datetime.now()
+    df = saved.copy()
+    df.loc[df["ID"] == "A", "Notas"] = "editada"
+    JournalManager.save_with_backup(df)
+
+    restored = backups.restore(datetime.now() + timedelta(seconds=1))
+    assert restored.set_index("ID").loc["A", "Notas"] == "editada"
+    assert backups.restore(before_edit).set_index("ID").loc["A", "Notas"] == "original"
+
+
+def test_restore_refuses_to_replay_across_a_reset(saved):
+    backups = get_backup_store()
+    backups.snapshot(saved, source="manual", ts=datetime.now() - timedelta(hours=1))
+    get_journal_store().reset(make_journal(make_leg(ID="Z", ChainID="C9")))
+    # Sin el snapshot del reset no hay base válida para lo posterior a la importación
+    for manifest in backups.list_snapshots():
+        if manifest["source"] == "reset":
+            os.remove(os.path.join(backups.snapshots_dir, manifest["name"]))
+    with pytest.raises(ValueError):
+        backups.restore(datetime.now() + timedelta(seconds=1))
+
+
+def test_snapshots_deduplicate_chunks(workdir):
+    backups = BackupStore("copias")
+    df = make_journal(*(make_leg(ID=f"R{i}", ChainID=f"C{i}", Strike=float(i)) for i in range(300)))
+    backups.snapshot(df, ts=datetime.now() - timedelta(minutes=2))
+    objects = sum(len(files) for _, _, files in os.walk(backups.objects_dir))
+    df.loc[df["ID"] == "R5", "Notas"] = "cambio"
+    backups.snapshot(df, ts=datetime.now() - timedelta(minutes=1))
+    # Sólo se reescribe el chunk de la fila cambiada (dos si la fila pasa a ser un corte)
+    assert objects < sum(len(files) for _, _, files in os.walk(backups.objects_dir)) <= objects + 2
+    assert backups.read_snapshot(backups.list_snapshots()[-1]).set_index("ID").loc["R5", "Notas"] == "cambio"
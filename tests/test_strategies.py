@@ -0,0 +1,67 @@
+"""Clasificador de estrategias por firma canónica de las patas."""
+import pandas as pd
+import pytest
+
+from strikelog.core import chain_signature, classify_chains
+
+
+def _leg(chain_id, side, opt_type, strike, qty=1, expiry="2026-02-20"):
+    return {"ChainID": chain_id, "Side": side, "OptionType": opt_type, "Strike": strike,
+            "Contratos": qty, "Expiry": expiry}
+
+
+CHAINS = {
+    "Iron Condor": [("Buy", "Put", 90), ("Sell", "Put", 95), ("Sell", "Call", 105), ("Buy", "Call", 110)],
+    "Iron Fly": [("Buy", "Put", 90), ("Sell", "Put", 100), ("Sell", "Call", 100), ("Buy", "Call", 110)],
+    "Butterfly": [("Buy", "Call", 90), ("Sell", "Call", 100, 2), ("Buy", "Call", 110)],
+    "Broken Wing Butterfly (BWB)": [("Buy", "Put", 90), ("Sell", "Put", 95, 2), ("Buy", "Put", 110)],
+    "Put Credit Spread": [("Sell", "Put", 100, 5), ("Buy", "Put", 95, 5)],
+    "Call Debit Spread": [("Buy", "Call", 100), ("Sell", "Call", 105)],
+    "Strangle": [("Sell", "Put", 95), ("Sell", "Call", 105)],
+    "Ratio Spread": [("Buy", "Put", 100, 2), ("Sell", "Put", 95, 6)],
+    "Backspread": [("Sell", "Call", 100), ("Buy", "Call", 105, 3)],
+    "CC (Covered Call)": [("Buy", "Stock", 50), ("Sell", "Call", 55)],
+    "Collar": [("Buy", "Stock", 50), ("Buy", "Put", 45), ("Sell", "Call", 55)],
+}
+
+
+@pytest.mark.parametrize("expected", list(CHAINS))
+def test_single_expiry_shapes(expected):
+    legs = pd.DataFrame([_leg("c", *leg) for leg in CHAINS[expected]])
+    assert classify_chains(legs)["c"] == expected
+
+
+def test_time_spreads_and_flyagonal():
+    legs = pd.DataFrame([
+        _leg("cal", "Sell", "Put", 100, expiry="2026-02-20"), _leg("cal", "Buy", "Put", 100, expiry="2026-03-20"),
+        _leg("dia", "Sell", "Put", 100, expiry="2026-02-20"), _leg("dia", "Buy", "Put", 95, expiry="2026-03-20"),
+        _leg("fa", "Buy", "Call", 100), _leg("fa", "Sell", "Call", 105, 2), _leg("fa", "Buy", "Call", 110),
+        _leg("fa", "Sell", "Put", 95, expiry="2026-02-20"), _leg("fa", "Buy", "Put", 95, expiry="2026-03-20"),
+    ])
+    assert classify_chains(legs).to_dict() == {"cal": "Calendar", "dia": "Diagonal", "fa": "Flyagonal"}
+
+
+def test_unknown_shape_is_none():
+    legs = pd.DataFrame([_leg("x", "Sell", "Put", k) for k in (80, 90, 100)])
+    assert classify_chains(legs)["x"] is None
+
+
+def test_signature_is_scale_and_order_invariant():
+    small = [("Sell", "Put", 100.0, 1, None), ("Buy", "Put", 95.0, 1, None)]
+    large = [("Buy", "Put", 45.0, 10, None), ("Sell", "Put", 50.0, 10, None)]
+    assert chain_signature(small) == chain_signature(large)
+
+
+def test_repeated_legs_are_merged():
+    # Dos fills de la misma pata vendida cuentan como 2 contratos: ratio 1x2
+    legs = pd.DataFrame([_leg("r", "Buy", "Put", 100), _leg("r", "Sell", "Put", 95), _leg("r", "Sell", "Put", 95)])
+    assert classify_chains(legs)["r"] == "Ratio Spread"
+
+
+def test_form_legs_without_chain_id():
+    legs = [{"Side": "Sell", "Type": "Put", "Strike": 100}, {"Side": "Buy", "Type": "Put", "Strike": 95}]
+    assert classify_chains(legs).tolist() == ["Put Credit Spread"]
+
+
+def test_empty_input():
+    assert classify_chains(pd.DataFrame(columns=["ChainID", "Side", "OptionType", "Strike"])).empty